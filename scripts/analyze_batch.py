@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Batch Runner: analyze every trial under data/trials with one workflow
+Description: Runs a workflow's analyze_trial over many trials in one process with a
+shared client and a global concurrency cap, then writes a run summary.
+Trials whose newest analysis was made from the same inputs (transcript, prompt
+assets, prompt, model and workflow configuration) are skipped unless --force.
+
+Usage: python analyze_batch.py <workflow> [--trials ID ...] [--concurrency N] [--force]
+Example: python analyze_batch.py gemini-25pro-by-theme --concurrency 4
+"""
+
+import sys
+import json
+import time
+import argparse
+import importlib
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from datetime import datetime
+
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent / "lib"))
+from analysis_utils import (
+    get_data_dir,
+    list_trials,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments,
+)
+from input_fingerprint import add_force_arguments
+
+# ========== BATCH CONFIGURATION ==========
+# Workflow ID -> module implementing analyze_trial(trial_id, client=None, force=False)
+WORKFLOW_MODULES = {
+    "gemini-25pro-10x-fresh": "analyze_gemini_fresh",
+    "gemini-25pro-10x-shared": "analyze_gemini_shared",
+    "gemini-25pro-chunked-10min": "analyze_gemini_chunked",
+    "gemini-25pro-by-theme": "analyze_gemini_by_theme",
+    "sonnet-45-3x-shared": "analyze_sonnet_shared",
+}
+DEFAULT_CONCURRENCY = 4
+# =========================================
+
+
+def load_workflow(workflow_id):
+    """Import the workflow module for a workflow ID"""
+    if workflow_id not in WORKFLOW_MODULES:
+        raise ValueError(f"Unknown workflow: {workflow_id}")
+    return importlib.import_module(WORKFLOW_MODULES[workflow_id])
+
+
+def run_one_trial(workflow, trial_id, client, force=False):
+    """Analyze a single trial and return its summary record"""
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+
+    try:
+        analysis_result = workflow.analyze_trial(trial_id, client=client, force=force)
+        if analysis_result.get("skipped"):
+            return {
+                "trialId": trial_id,
+                "status": "skipped",
+                "startedAt": started_at,
+                "latencySeconds": round(time.perf_counter() - start, 3),
+                "issuesFound": len(analysis_result.get("issues", [])),
+                "analysisId": analysis_result.get("analysisId"),
+            }
+        return {
+            "trialId": trial_id,
+            "status": analysis_result.get("status", "completed"),
+            "startedAt": started_at,
+            "latencySeconds": round(time.perf_counter() - start, 3),
+            "issuesFound": len(analysis_result.get("issues", [])),
+            "costUsd": analysis_result.get("metrics", {}).get("performance", {}).get("costUsd"),
+        }
+    except Exception as e:
+        traceback.print_exc()
+        return {
+            "trialId": trial_id,
+            "status": "error",
+            "startedAt": started_at,
+            "latencySeconds": round(time.perf_counter() - start, 3),
+            "error": str(e),
+        }
+
+
+def summarize_run(workflow_id, concurrency, trial_records, wall_seconds):
+    """Build the run summary with throughput, failures and per-trial latency"""
+    failures = [record for record in trial_records if record["status"] == "error"]
+    skipped = [record for record in trial_records if record["status"] == "skipped"]
+    latencies = sorted(record["latencySeconds"] for record in trial_records)
+    costs = [record["costUsd"] for record in trial_records if record.get("costUsd") is not None]
+
+    def percentile(fraction):
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(fraction * (len(latencies) - 1))))]
+
+    return {
+        "workflowId": workflow_id,
+        "timestamp": datetime.now().isoformat(),
+        "concurrency": concurrency,
+        "trialsTotal": len(trial_records),
+        "trialsSucceeded": len(trial_records) - len(failures) - len(skipped),
+        "trialsFailed": len(failures),
+        "trialsSkipped": len(skipped),
+        "wallSeconds": round(wall_seconds, 3),
+        "throughputTrialsPerHour": round(len(trial_records) * 3600 / wall_seconds, 2) if wall_seconds > 0 else None,
+        "latencySeconds": {
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "max": latencies[-1] if latencies else None,
+        },
+        "costUsd": round(sum(costs), 6) if costs else None,
+        "failures": [{"trialId": record["trialId"], "error": record["error"]} for record in failures],
+        "trials": trial_records,
+    }
+
+
+def save_run_summary(summary):
+    """Save the batch summary under data/batch-runs"""
+    runs_dir = get_data_dir() / "batch-runs"
+    runs_dir.mkdir(parents=True, exist_ok=True)
+
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    output_path = runs_dir / f"{summary['workflowId']}-{timestamp}.json"
+
+    with open(output_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    return output_path
+
+
+def analyze_batch(workflow_id, trial_ids, concurrency=DEFAULT_CONCURRENCY, force=False):
+    """Analyze many trials with one workflow, sharing a client across trials
+
+    Trials already analyzed from the same inputs are skipped unless force.
+    """
+    workflow = load_workflow(workflow_id)
+
+    print(f"{'='*60}")
+    print(f"BATCH RUN: {workflow.WORKFLOW_TITLE}")
+    print(f"{'='*60}")
+    print(f"Trials: {len(trial_ids)}")
+    print(f"Concurrency: {concurrency}")
+    print(f"Unchanged Trials: {'redo (--force)' if force else 'skip'}")
+    print(f"{'='*60}\n")
+
+    # One client for the whole batch instead of one per process launch
+    client = workflow.create_client()
+
+    trial_records = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(run_one_trial, workflow, trial_id, client, force): trial_id
+            for trial_id in trial_ids
+        }
+        for future in as_completed(futures):
+            record = future.result()
+            trial_records.append(record)
+            marker = {"error": "✗", "skipped": "-"}.get(record["status"], "✓")
+            print(f"{marker} [{len(trial_records)}/{len(trial_ids)}] {record['trialId']}: "
+                  f"{record['status']} in {record['latencySeconds']}s")
+
+    trial_records.sort(key=lambda record: trial_ids.index(record["trialId"]))
+    summary = summarize_run(workflow_id, concurrency, trial_records, time.perf_counter() - start)
+    output_path = save_run_summary(summary)
+
+    print(f"\n{'='*60}")
+    print("BATCH COMPLETE!")
+    print(f"{'='*60}")
+    print(f"\nSummary:")
+    print(f"  Workflow: {workflow.WORKFLOW_TITLE}")
+    print(f"  Trials: {summary['trialsSucceeded']} succeeded, {summary['trialsFailed']} failed, "
+          f"{summary['trialsSkipped']} skipped (unchanged)")
+    print(f"  Wall Time: {summary['wallSeconds']}s")
+    print(f"  Throughput: {summary['throughputTrialsPerHour']} trials/hour")
+    print(f"  Latency p50/p90: {summary['latencySeconds']['p50']}s / {summary['latencySeconds']['p90']}s")
+    print(f"  Run Summary: {output_path}")
+
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Batch Runner - analyze many trials with one workflow",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"Example: python {Path(__file__).name} gemini-25pro-by-theme --concurrency 4"
+    )
+    parser.add_argument("workflow", choices=sorted(WORKFLOW_MODULES), help="Workflow ID to run")
+    parser.add_argument("--trials", nargs="+", help="Trial IDs to analyze (default: every trial under data/trials)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Maximum number of trials analyzed at once (default: {DEFAULT_CONCURRENCY})")
+    add_force_arguments(parser)
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
+
+    args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    available_trials = list_trials()
+    trial_ids = args.trials or available_trials
+
+    unknown_trials = [trial_id for trial_id in trial_ids if trial_id not in available_trials]
+    if unknown_trials:
+        print(f"Error: Trials not found: {', '.join(unknown_trials)}")
+        print("\nAvailable trials:")
+        for trial_id in available_trials:
+            print(f"  - {trial_id}")
+        sys.exit(1)
+
+    if not trial_ids:
+        print("No trials found under data/trials")
+        sys.exit(1)
+
+    summary = analyze_batch(args.workflow, trial_ids, concurrency=args.concurrency, force=args.force)
+    sys.exit(1 if summary["trialsFailed"] else 0)
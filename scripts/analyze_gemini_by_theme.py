@@ -2,12 +2,22 @@
 """
 Workflow: Gemini 2.5 Pro - Theme-by-Theme Analysis
 Description: 31 focused passes (one per theme) with context caching for cost optimization.
+The guidebook and playbook live in a long-lived cache shared across trials.
+With --batch, the theme passes for every trial given go out as one Gemini
+batch job (half price, higher latency) and are mapped back per trial.
+
+--guidebook-scope narrows the guidebook each pass sees, using the guidebook
+theme index under data/prompt-assets/derived: "theme" sends only the pages
+defining the pass's theme (as text, next to a playbook-only cache), "domain"
+caches one guidebook page subset per domain. Themes the index cannot place
+fall back to the full guidebook.
 """
 
 import os
 import sys
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from google import genai
 from google.genai import types
@@ -19,8 +29,29 @@ sys.path.insert(0, str(Path(__file__).parent / "lib"))
 from analysis_utils import (
     setup_paths,
     load_prompt,
+    prompt_path_for,
     save_analysis,
-    check_required_files
+    check_required_files,
+    start_run,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments
+)
+from upload_registry import get_or_upload
+from tracing import span
+from input_fingerprint import find_current_analysis, add_force_arguments
+from document_pages import load_page_index, load_theme_index, pages_text, write_page_subset
+from model_calls import gemini_generate, gemini_generate_batch
+from gemini_batches import GenAIBatchTransport
+from issue_stream import parse_issues_salvaging, is_complete_issue_response, open_live_sidecar, IssueStream
+from pass_journal import open_journal, completed_pass, record_pass, close_journal, add_resume_arguments
+from context_cache import (
+    get_static_cache,
+    extend_static_caches,
+    new_cache_stats,
+    record_pass_usage,
+    summarize_cache_stats
 )
 
 # Load environment variables
@@ -82,144 +113,237 @@ THEMES = [
 
 NUM_PASSES = len(THEMES)
 
+# Theme passes only share the cached context, so they can run side by side
+DEFAULT_CONCURRENCY = 8
+# Seconds between status polls in --batch mode
+DEFAULT_BATCH_POLL_SECONDS = 30
+# How much of the guidebook each pass sees: all of it, the theme's pages, or its domain's pages
+GUIDEBOOK_SCOPES = ["full", "theme", "domain"]
+DEFAULT_GUIDEBOOK_SCOPE = "full"
 
-def create_cached_context(client, paths):
-    """Create a cached context with PDFs that can be reused across all passes"""
-    print("Creating cached context with PDFs...")
-
-    # Upload files
-    transcript_file = client.files.upload(file=paths['transcript'])
-    print(f"  ✓ Uploaded transcript: {transcript_file.name}")
-
-    guidebook_file = client.files.upload(file=paths['guidebook'])
-    print(f"  ✓ Uploaded guidebook: {guidebook_file.name}")
 
-    playbook_file = client.files.upload(file=paths['playbook'])
-    print(f"  ✓ Uploaded playbook: {playbook_file.name}")
-
-    # Create cached content with these files (cache for 1 hour - enough for 31 passes)
-    print("  ⚡ Creating cache...")
+def create_client():
+    """Create the Gemini client used by this workflow"""
+    print("Initializing Gemini client...")
+    return genai.Client()
 
-    cached_content = client.caches.create(
-        model=MODEL,
-        contents=[
-            guidebook_file,
-            playbook_file,
-            transcript_file
-        ],
-        ttl="3600s",  # 1 hour TTL
-        display_name=f"trial-analysis-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-    )
 
-    print(f"  ✓ Cache created: {cached_content.name}")
-    print(f"  ✓ Cache expires in 1 hour")
+def load_guidebook_scope(run, paths, guidebook_scope=DEFAULT_GUIDEBOOK_SCOPE):
+    """Resolve the guidebook scope a trial actually runs with
 
-    return cached_content
+    Returns {'scope', 'themePages', 'pageIndex'}. "theme" and "domain" need
+    the guidebook's theme index; when it can't be loaded the trial falls back
+    to the full guidebook. The scope used is written to the run's
+    configuration, so the saved analysis, input fingerprint and pass journal
+    all reflect it.
+    """
+    guidebook = {'scope': guidebook_scope, 'themePages': {}, 'pageIndex': None}
+    if guidebook_scope != "full":
+        try:
+            with span(run, "load_guidebook_index", scope=guidebook_scope):
+                guidebook['themePages'] = load_theme_index(paths['guidebook'], [t['name'] for t in THEMES])
+                guidebook['pageIndex'] = load_page_index(paths['guidebook'])
+        except Exception as e:
+            print(f"  ⚠ Guidebook theme index unavailable ({e}), using the full guidebook")
+            guidebook['scope'] = "full"
+    run['configuration']['guidebookScope'] = guidebook['scope']
+    return guidebook
+
+
+def create_cached_context(client, run, paths, cache_stats, guidebook):
+    """Get the static-asset cache(s) for every theme and this trial's transcript upload
+
+    guidebook is the trial's load_guidebook_scope result. Returns
+    (theme_contexts, transcript_file). theme_contexts maps each theme name to
+    {'cachedContext', 'guidebookText', 'guidebookPages'}; the text is only set
+    in "theme" scope, where it is sent with the pass. Caches are long-lived
+    and shared across trials; only per-pass content is sent with each request.
+    """
+    guidebook_scope = guidebook['scope']
+    theme_pages = guidebook['themePages']
+    guidebook_index = guidebook['pageIndex']
+    print(f"Preparing cached context (guidebook scope: {guidebook_scope})...")
+    static_caches = {}
+
+    def static_cache(asset_paths):
+        # Keyed on model and asset hashes, so equal asset sets share one cache
+        cache_id = tuple(sorted((label, str(path)) for label, path in asset_paths.items()))
+        if cache_id not in static_caches:
+            static_caches[cache_id] = get_static_cache(client, MODEL, asset_paths, stats=cache_stats, run=run)
+        return static_caches[cache_id]
+
+    def full_context():
+        return {
+            'cachedContext': static_cache({'guidebook': paths['guidebook'], 'playbook': paths['playbook']}),
+            'guidebookText': None,
+            'guidebookPages': None,
+        }
 
+    theme_contexts = {}
+    if guidebook_scope == "theme":
+        # Playbook-only cache; each pass carries its theme's guidebook pages as text
+        for theme_info in THEMES:
+            pages = theme_pages.get(theme_info['name'])
+            if not pages:
+                theme_contexts[theme_info['name']] = full_context()
+                continue
+            text, included = pages_text(guidebook_index, pages)
+            theme_contexts[theme_info['name']] = {
+                'cachedContext': static_cache({'playbook': paths['playbook']}),
+                'guidebookText': text,
+                'guidebookPages': included,
+            }
+    elif guidebook_scope == "domain":
+        # One cache per domain: the playbook plus the domain's guidebook pages
+        for domain in dict.fromkeys(t['domain'] for t in THEMES):
+            domain_themes = [t['name'] for t in THEMES if t['domain'] == domain]
+            pages = sorted({page for name in domain_themes for page in theme_pages.get(name, [])})
+            if pages and all(theme_pages.get(name) for name in domain_themes):
+                subset_path = write_page_subset(paths['guidebook'], pages)
+                context = {
+                    'cachedContext': static_cache({'guidebook': subset_path, 'playbook': paths['playbook']}),
+                    'guidebookText': None,
+                    'guidebookPages': pages,
+                }
+            else:
+                context = full_context()
+            for name in domain_themes:
+                theme_contexts[name] = context
+    else:
+        context = full_context()
+        theme_contexts = {t['name']: context for t in THEMES}
+
+    # Transcript: per trial (reused from the upload registry when still live)
+    transcript_file = get_or_upload(client, paths['transcript'], run=run)
+
+    return theme_contexts, transcript_file
+
+
+def theme_contents(transcript, theme_context, base_prompt_template, theme_name):
+    """Per-pass contents: the transcript, any guidebook excerpt, then the theme prompt"""
+    contents = [transcript]
+    if theme_context['guidebookText']:
+        contents.append(
+            f"Trial Annotation Guidebook excerpt for this theme "
+            f"(pages {', '.join(map(str, theme_context['guidebookPages']))}):\n\n{theme_context['guidebookText']}"
+        )
+    contents.append(theme_prompt(base_prompt_template, theme_name))
+    return contents
+
+
+def theme_prompt(base_prompt_template, theme_name):
+    """Inject a theme into the by-theme prompt template"""
+    return base_prompt_template.replace("THEME_PLACEHOLDER", theme_name)
+
+
+def theme_pass_result(run, idx, theme_info, response):
+    """Parse a theme pass response into (parsed_issues, pass_detail)
+
+    A truncated response keeps the issues that closed before the cut.
+    """
+    theme_name = theme_info['name']
+    domain = theme_info['domain']
 
-def analyze_trial(trial_id):
-    """Analyze a trial using Gemini API with theme-by-theme passes"""
-    print(f"{'='*60}")
-    print(f"WORKFLOW: {WORKFLOW_TITLE}")
-    print(f"{'='*60}")
-    print(f"Trial: {trial_id}")
-    print(f"Passes: {NUM_PASSES} (one per theme)")
-    print(f"Model: {MODEL}")
-    print(f"Prompt: {PROMPT_ID}")
-    print(f"Context Caching: Enabled")
-    print(f"{'='*60}\n")
+    try:
+        with span(run, "parse", label=f"theme-{idx}"):
+            parsed_issues, truncated = parse_issues_salvaging(response['text'])
+    except json.JSONDecodeError as e:
+        print(f"✗ Warning: Could not parse Pass {idx} ({theme_name}) response as JSON: {e}")
+        return [], {
+            "pass": idx,
+            "theme": theme_name,
+            "domain": domain,
+            "error": f"Invalid JSON response: {str(e)}",
+            "performance": response['performance'],
+            "rawResponse": response['text'][:500] + "..."
+        }
 
-    # Setup paths
-    paths = setup_paths(trial_id)
-    check_required_files(paths)
+    # Add pass metadata to each issue
+    for issue in parsed_issues:
+        issue["analysisPass"] = theme_name
+        issue["domain"] = domain
+
+    issues_found = len(parsed_issues)
+    print(f"✓ Pass {idx} complete: Found {issues_found} issues for '{theme_name}'")
+
+    # Replayed responses did not touch the context cache
+    usage = {} if response['fromCache'] else response['usage']
+    pass_detail = {
+        "pass": idx,
+        "theme": theme_name,
+        "domain": domain,
+        "issuesFound": issues_found,
+        "promptTokens": usage.get('inputTokens', 0),
+        "cachedTokens": usage.get('cachedTokens', 0),
+        "performance": response['performance'],
+        "rawResponse": response['text'][:500] + "..."
+    }
+    if truncated:
+        print(f"⚠ Pass {idx} ({theme_name}) response was cut off ({truncated}); kept the issues that closed")
+        pass_detail["truncated"] = truncated
+    return parsed_issues, pass_detail
 
-    # Initialize Gemini client
-    print("Initializing Gemini client...")
-    client = genai.Client()
 
-    # Load base prompt template
-    base_prompt_template = load_prompt(PROMPT_ID)
+def run_theme_pass(client, run, theme_context, transcript_file, base_prompt_template, idx, theme_info,
+                   journal=None, sidecar=None):
+    """Run a single theme pass against its cached context, checkpointing it to journal.
 
-    # Create cached context with PDFs (reused across all 31 passes)
-    cached_context = create_cached_context(client, paths)
+    Issues are appended to the live sidecar as they stream in.
 
-    # Multi-pass theme analysis
-    all_issues = []
-    pass_responses = []
-    issues_by_theme = {}
+    Returns a tuple of (parsed_issues, pass_detail).
+    """
+    theme_name = theme_info['name']
+    domain = theme_info['domain']
 
-    for idx, theme_info in enumerate(THEMES, 1):
-        theme_name = theme_info['name']
-        domain = theme_info['domain']
+    print(f"PASS {idx}/{NUM_PASSES}: {theme_name} ({domain}) - calling Gemini API...")
 
-        print(f"\n{'='*60}")
-        print(f"PASS {idx}/{NUM_PASSES}: {theme_name}")
-        print(f"Domain: {domain}")
-        print(f"{'='*60}")
+    try:
+        # Generate analysis using cached context (transcript sent per pass)
+        response = gemini_generate(
+            client,
+            MODEL,
+            contents=theme_contents(transcript_file, theme_context, base_prompt_template, theme_name),
+            config=types.GenerateContentConfig(
+                cached_content=theme_context['cachedContext'].name
+            ),
+            run=run,
+            label=f"theme-{idx}",
+            on_text=IssueStream(sidecar, {"analysisPass": theme_name, "domain": domain}),
+            validate=is_complete_issue_response
+        )
+    except Exception as e:
+        print(f"✗ Error in Pass {idx} ({theme_name}): {str(e)}")
+        return [], {
+            "pass": idx,
+            "theme": theme_name,
+            "domain": domain,
+            "error": str(e)
+        }
 
-        # Inject theme into prompt
-        prompt = base_prompt_template.replace("THEME_PLACEHOLDER", theme_name)
+    parsed_issues, pass_detail = theme_pass_result(run, idx, theme_info, response)
+    record_pass(journal, idx, parsed_issues, pass_detail)
+    return parsed_issues, pass_detail
 
-        print(f"Calling Gemini API (Pass {idx})...")
 
-        try:
-            # Generate analysis using cached context
-            response = client.models.generate_content(
-                model=cached_context.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    cached_content=cached_context.name
-                )
-            )
+def finish_trial(trial_id, run, pass_results, cache_stats, concurrency, execution_mode="interactive",
+                 guidebook_scope=DEFAULT_GUIDEBOOK_SCOPE, journal=None):
+    """Compile, save and summarize a trial's analysis from its per-theme results
 
-            # Parse response
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            parsed_issues = json.loads(response_text)
-
-            # Add pass metadata to each issue
-            for issue in parsed_issues:
-                issue["analysisPass"] = theme_name
-                issue["domain"] = domain
-
-            issues_found = len(parsed_issues)
-            print(f"✓ Pass {idx} complete: Found {issues_found} issues for '{theme_name}'")
-
-            all_issues.extend(parsed_issues)
-            issues_by_theme[theme_name] = issues_found
-
-            pass_responses.append({
-                "pass": idx,
-                "theme": theme_name,
-                "domain": domain,
-                "issuesFound": issues_found,
-                "rawResponse": response.text[:500] + "..."
-            })
+    pass_results holds one (parsed_issues, pass_detail) tuple per theme, in
+    THEMES order. The trial's pass journal is removed once every pass succeeded.
+    """
+    all_issues = []
+    pass_responses = []
+    issues_by_theme = {}
 
-        except json.JSONDecodeError as e:
-            print(f"✗ Warning: Could not parse Pass {idx} ({theme_name}) response as JSON: {e}")
-            pass_responses.append({
-                "pass": idx,
-                "theme": theme_name,
-                "domain": domain,
-                "error": f"Invalid JSON response: {str(e)}",
-                "rawResponse": response.text[:500] + "..."
-            })
-        except Exception as e:
-            print(f"✗ Error in Pass {idx} ({theme_name}): {str(e)}")
-            pass_responses.append({
-                "pass": idx,
-                "theme": theme_name,
-                "domain": domain,
-                "error": str(e)
-            })
+    for theme_info, (parsed_issues, pass_detail) in zip(THEMES, pass_results):
+        all_issues.extend(parsed_issues)
+        pass_responses.append(pass_detail)
+        # Resumed passes used the cache in an earlier run, not this one
+        if not pass_detail.get('resumed'):
+            record_pass_usage(cache_stats, pass_detail)
+        if 'issuesFound' in pass_detail:
+            issues_by_theme[theme_info['name']] = pass_detail['issuesFound']
 
     # Group issues by domain for summary
     issues_by_domain = {}
@@ -248,10 +372,14 @@ def analyze_trial(trial_id):
         # Configuration
         "configuration": {
             "passes": NUM_PASSES,
-            "contextStrategy": "cached-per-theme",
+            "contextStrategy": "shared-static-cache-per-theme",
             "promptVariant": PROMPT_ID,
-            "assetsUsed": ["guidebook", "playbook", "transcript"],
+            "assetsUsed": ["guidebook" if guidebook_scope == "full" else "guidebook-pages",
+                           "playbook", "transcript"],
             "cachingEnabled": True,
+            "executionMode": execution_mode,
+            "guidebookScope": guidebook_scope,
+            "concurrency": concurrency,
             "themesCovered": [t['name'] for t in THEMES]
         },
 
@@ -264,12 +392,15 @@ def analyze_trial(trial_id):
         "metrics": {
             "totalIssuesFound": len(all_issues),
             "issuesByTheme": issues_by_theme,
-            "issuesByDomain": issues_by_domain
+            "issuesByDomain": issues_by_domain,
+            "passesResumed": sum(1 for detail in pass_responses if detail.get('resumed')),
+            "contextCache": summarize_cache_stats(cache_stats)
         }
     }
 
     # Save analysis
-    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID)
+    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID, run=run)
+    close_journal(journal, pass_responses)
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETE!")
@@ -291,38 +422,242 @@ def analyze_trial(trial_id):
         if count > 0:
             print(f"  {theme_name}: {count} issues")
 
-    # Clean up cache
-    print(f"\nCleaning up cache...")
-    try:
-        client.caches.delete(name=cached_context.name)
-        print(f"  ✓ Cache deleted")
-    except Exception as e:
-        print(f"  ⚠ Could not delete cache: {e}")
+    # The static cache is shared across trials and expires on its own TTL
+    print(f"\nContext cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es), "
+          f"{cache_stats['cachedTokens']} cached tokens")
 
     return analysis_result
 
 
+def start_trial(trial_id, guidebook_scope=DEFAULT_GUIDEBOOK_SCOPE, force=False):
+    """Start a run for a trial; returns (run, paths, guidebook, current_analysis)
+
+    guidebook is the load_guidebook_scope result. current_analysis is the
+    trial's newest analysis when it was made from the same inputs (never with
+    force), in which case the trial can be skipped.
+    """
+    run = start_run(trial_id, WORKFLOW_ID, {
+        "promptId": PROMPT_ID,
+        "themes": [t['name'] for t in THEMES],
+        "guidebookScope": guidebook_scope
+    })
+
+    # Setup paths
+    with span(run, "setup_paths"):
+        paths = setup_paths(trial_id)
+        check_required_files(paths)
+
+    # Fingerprint with the scope the trial can actually use
+    guidebook = load_guidebook_scope(run, paths, guidebook_scope)
+    current_analysis = find_current_analysis(run, paths, prompt_path_for(PROMPT_ID), MODEL, force=force)
+    return run, paths, guidebook, current_analysis
+
+
+def analyze_trial(trial_id, concurrency=DEFAULT_CONCURRENCY, client=None, guidebook_scope=DEFAULT_GUIDEBOOK_SCOPE,
+                  resume=False, force=False):
+    """Analyze a trial using Gemini API with theme-by-theme passes
+
+    Completed passes are checkpointed; resume reuses those from an earlier
+    run with the same configuration and only runs the rest. The trial is
+    skipped when its newest analysis has the same inputs, unless force.
+    """
+    print(f"{'='*60}")
+    print(f"WORKFLOW: {WORKFLOW_TITLE}")
+    print(f"{'='*60}")
+    print(f"Trial: {trial_id}")
+    print(f"Passes: {NUM_PASSES} (one per theme)")
+    print(f"Model: {MODEL}")
+    print(f"Prompt: {PROMPT_ID}")
+    print(f"Context Caching: Enabled")
+    print(f"Guidebook Scope: {guidebook_scope}")
+    print(f"Concurrency: {concurrency}")
+    print(f"{'='*60}\n")
+
+    # Initialize Gemini client (batch runs share one across trials)
+    if client is None:
+        client = create_client()
+
+    # Load base prompt template
+    base_prompt_template = load_prompt(PROMPT_ID)
+
+    run, paths, guidebook, current_analysis = start_trial(trial_id, guidebook_scope, force=force)
+    if current_analysis:
+        return current_analysis
+
+    # Shared static-asset cache (reused across all 31 passes and across trials)
+    cache_stats = new_cache_stats()
+    theme_contexts, transcript_file = create_cached_context(client, run, paths, cache_stats, guidebook)
+    journal = open_journal(run, resume=resume)
+    sidecar = open_live_sidecar(run)
+
+    # Multi-pass theme analysis (passes are independent, so fan them out)
+    resumed = {idx: completed_pass(journal, idx) for idx in range(1, NUM_PASSES + 1)}
+    for result in resumed.values():
+        if result:
+            sidecar.append(result[0])
+    pending = sum(1 for result in resumed.values() if result is None)
+    print(f"\nRunning {pending} theme passes with concurrency {concurrency}...")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            idx: executor.submit(
+                run_theme_pass, client, run, theme_contexts[theme_info['name']], transcript_file,
+                base_prompt_template, idx, theme_info, journal, sidecar
+            )
+            for idx, theme_info in enumerate(THEMES, 1)
+            if resumed[idx] is None
+        }
+        # Collect in THEMES order so the output is deterministic
+        pass_results = [resumed[idx] or futures[idx].result() for idx in range(1, NUM_PASSES + 1)]
+
+    return finish_trial(trial_id, run, pass_results, cache_stats, concurrency,
+                        guidebook_scope=guidebook['scope'], journal=journal)
+
+
+def analyze_trials_batch(trial_ids, client=None, transport=None, poll_seconds=DEFAULT_BATCH_POLL_SECONDS,
+                         guidebook_scope=DEFAULT_GUIDEBOOK_SCOPE, resume=False, force=False):
+    """Analyze many trials with every theme pass submitted as one Gemini batch job
+
+    transport is a gemini_batches.BatchTransport (defaults to the Gemini Batch
+    API through client). Results are mapped back to each trial's THEMES in
+    order; requests the job did not complete are recorded as pass errors.
+    With resume, passes checkpointed by an earlier run are not resubmitted.
+    Trials whose newest analysis has the same inputs are skipped unless force.
+    """
+    print(f"{'='*60}")
+    print(f"WORKFLOW: {WORKFLOW_TITLE} (Batch)")
+    print(f"{'='*60}")
+    print(f"Trials: {len(trial_ids)}")
+    print(f"Passes: {NUM_PASSES} per trial, {NUM_PASSES * len(trial_ids)} requests in one batch job")
+    print(f"Model: {MODEL}")
+    print(f"Prompt: {PROMPT_ID}")
+    print(f"Context Caching: Enabled")
+    print(f"Guidebook Scope: {guidebook_scope}")
+    print(f"{'='*60}\n")
+
+    if client is None:
+        client = create_client()
+    if transport is None:
+        transport = GenAIBatchTransport(client)
+    base_prompt_template = load_prompt(PROMPT_ID)
+
+    trials = []
+    calls = []
+    cache_names = set()
+    analyses_by_trial = {}
+    for trial_id in trial_ids:
+        run, paths, guidebook, current_analysis = start_trial(trial_id, guidebook_scope, force=force)
+        if current_analysis:
+            analyses_by_trial[trial_id] = current_analysis
+            continue
+
+        trial_index = len(trials)
+        cache_stats = new_cache_stats()
+        theme_contexts, transcript_file = create_cached_context(client, run, paths, cache_stats, guidebook)
+        journal = open_journal(run, resume=resume)
+        trials.append((trial_id, run, cache_stats, journal))
+
+        # Batch requests are serialized, so reference the transcript by URI
+        transcript_part = types.Part.from_uri(file_uri=transcript_file.uri, mime_type=transcript_file.mime_type)
+        for idx, theme_info in enumerate(THEMES, 1):
+            if completed_pass(journal, idx):
+                continue
+            theme_context = theme_contexts[theme_info['name']]
+            cache_names.add(theme_context['cachedContext'].name)
+            calls.append({
+                'customId': f"trial-{trial_index}-theme-{idx}",
+                'run': run,
+                'label': f"theme-{idx}",
+                'contents': theme_contents(transcript_part, theme_context, base_prompt_template, theme_info['name']),
+                'config': types.GenerateContentConfig(cached_content=theme_context['cachedContext'].name),
+            })
+
+    results = {}
+    if calls:
+        print(f"\nSubmitting {len(calls)} theme passes as one batch job...")
+        # The job can queue for longer than the cache TTL, so keep its caches alive while polling
+        results = gemini_generate_batch(transport, MODEL, calls, poll_seconds=poll_seconds,
+                                        display_name=f"{WORKFLOW_ID}-{len(trial_ids)}-trials",
+                                        on_poll=lambda: extend_static_caches(client, cache_names),
+                                        validate=is_complete_issue_response)
+
+    for trial_index, (trial_id, run, cache_stats, journal) in enumerate(trials):
+        print(f"\n{trial_id}:")
+        pass_results = []
+        for idx, theme_info in enumerate(THEMES, 1):
+            resumed = completed_pass(journal, idx)
+            if resumed:
+                pass_results.append(resumed)
+                continue
+            response = results[f"trial-{trial_index}-theme-{idx}"]
+            if 'error' in response:
+                print(f"✗ Pass {idx} ({theme_info['name']}) failed in batch: {response['error']}")
+                pass_results.append(([], {
+                    "pass": idx,
+                    "theme": theme_info['name'],
+                    "domain": theme_info['domain'],
+                    "error": response['error']
+                }))
+            else:
+                parsed_issues, pass_detail = theme_pass_result(run, idx, theme_info, response)
+                record_pass(journal, idx, parsed_issues, pass_detail)
+                pass_results.append((parsed_issues, pass_detail))
+        analyses_by_trial[trial_id] = finish_trial(
+            trial_id, run, pass_results, cache_stats, concurrency=None, execution_mode="batch",
+            guidebook_scope=run['configuration']['guidebookScope'], journal=journal
+        )
+
+    return [analyses_by_trial[trial_id] for trial_id in trial_ids]
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description=f"{WORKFLOW_TITLE} - Trial Analysis Script",
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog=f"Example: python {Path(__file__).name} mousa-g1"
+        epilog=f"Example: python {Path(__file__).name} mousa-g1\n"
+               f"Example: python {Path(__file__).name} mousa-g1 mousa-g2 --batch"
     )
-    parser.add_argument("trial_id", help="Trial ID to analyze")
+    parser.add_argument("trial_ids", nargs="+", help="Trial ID(s) to analyze")
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
+    add_resume_arguments(parser)
+    add_force_arguments(parser)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Number of theme passes to run in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit every theme pass for all trials as one batch job (half price, higher latency)")
+    parser.add_argument("--poll-seconds", type=int, default=DEFAULT_BATCH_POLL_SECONDS,
+                        help=f"Seconds between batch status polls (default: {DEFAULT_BATCH_POLL_SECONDS})")
+    parser.add_argument("--guidebook-scope", choices=GUIDEBOOK_SCOPES, default=DEFAULT_GUIDEBOOK_SCOPE,
+                        help="Guidebook each pass sees: the full PDF, only its theme's pages, "
+                             f"or its domain's pages (default: {DEFAULT_GUIDEBOOK_SCOPE})")
 
     args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
 
-    # Show available trials if trial not found
-    try:
-        paths = setup_paths(args.trial_id)
-    except FileNotFoundError:
-        print(f"Error: Trial '{args.trial_id}' not found")
-        print("\nAvailable trials:")
-        trials_dir = Path(__file__).parent.parent / "data" / "trials"
-        if trials_dir.exists():
-            for trial_dir in sorted(trials_dir.iterdir()):
-                if trial_dir.is_dir():
-                    print(f"  - {trial_dir.name}")
-        sys.exit(1)
-
-    analyze_trial(args.trial_id)
+    # Show available trials if a trial is not found
+    for trial_id in args.trial_ids:
+        try:
+            setup_paths(trial_id)
+        except FileNotFoundError:
+            print(f"Error: Trial '{trial_id}' not found")
+            print("\nAvailable trials:")
+            trials_dir = Path(__file__).parent.parent / "data" / "trials"
+            if trials_dir.exists():
+                for trial_dir in sorted(trials_dir.iterdir()):
+                    if trial_dir.is_dir():
+                        print(f"  - {trial_dir.name}")
+            sys.exit(1)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    client = create_client()
+    if args.batch:
+        analyze_trials_batch(args.trial_ids, client=client, poll_seconds=args.poll_seconds,
+                             guidebook_scope=args.guidebook_scope, resume=args.resume, force=args.force)
+    else:
+        for trial_id in args.trial_ids:
+            analyze_trial(trial_id, concurrency=args.concurrency, client=client,
+                          guidebook_scope=args.guidebook_scope, resume=args.resume, force=args.force)
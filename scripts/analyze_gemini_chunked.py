@@ -2,13 +2,16 @@
 """
 Workflow: Gemini 2.5 Pro - Chunked Analysis (10-minute segments)
 Description: Analyzes transcript in 10-minute segments independently, then aggregates. Better for long trials.
+The transcript PDF is parsed locally and each chunk call only carries its own window's text.
+Chunks run concurrently with a short overlap; duplicates found in an overlap are merged.
+Completed chunks are checkpointed, so --resume redoes only the chunks a failed run missed.
 """
 
 import os
 import sys
 import json
 import argparse
-import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from google import genai
 from datetime import datetime
@@ -19,9 +22,27 @@ sys.path.insert(0, str(Path(__file__).parent / "lib"))
 from analysis_utils import (
     setup_paths,
     load_prompt,
-    upload_files_gemini,
+    prompt_path_for,
     save_analysis,
-    check_required_files
+    check_required_files,
+    start_run,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments
+)
+from upload_registry import get_or_upload
+from tracing import span
+from issue_stream import parse_issues_salvaging, is_complete_issue_response, open_live_sidecar, IssueStream
+from input_fingerprint import find_current_analysis, add_force_arguments
+from pass_journal import open_journal, completed_pass, record_pass, close_journal, add_resume_arguments
+from model_calls import gemini_generate
+from issue_dedupe import merge_boundary_duplicates
+from transcript import (
+    load_transcript_segments,
+    transcript_duration,
+    split_into_windows,
+    format_segments
 )
 
 # Load environment variables
@@ -34,16 +55,18 @@ WORKFLOW_DESCRIPTION = "Analyzes transcript in 10-minute segments independently,
 MODEL = "gemini-2.5-pro"
 PROMPT_ID = "chunked-10min"
 CHUNK_DURATION = 10
+# Adjacent chunks share this many seconds so issues spanning a boundary aren't lost
+CHUNK_OVERLAP_SECONDS = 60
+# Overlap issues within this many seconds with similar quotes are merged
+BOUNDARY_TIMESTAMP_TOLERANCE = 5
+DEFAULT_CONCURRENCY = 8
 # ============================================
 
 
-def parse_timestamp_to_seconds(timestamp_str):
-    """Parse timestamp like [00:05:23,456] to seconds"""
-    match = re.search(r'\[(\d{2}):(\d{2}):(\d{2})', timestamp_str)
-    if match:
-        hours, minutes, seconds = map(int, match.groups())
-        return hours * 3600 + minutes * 60 + seconds
-    return 0
+def create_client():
+    """Create the Gemini client used by this workflow"""
+    print("Initializing Gemini client...")
+    return genai.Client()
 
 
 def get_chunk_range_text(chunk_num, chunk_duration):
@@ -53,8 +76,13 @@ def get_chunk_range_text(chunk_num, chunk_duration):
     return f"{start_minutes:02d}:00 - {end_minutes:02d}:00"
 
 
-def create_chunk_prompt(base_prompt, chunk_num, chunk_range, is_first, is_last):
+def create_chunk_prompt(base_prompt, chunk_num, chunk_range, is_first, is_last, overlap_seconds=0):
     """Create a chunk-specific prompt"""
+    overlap_note = (
+        f"- The last {overlap_seconds} seconds of lines overlap with the next segment; "
+        f"report issues there as usual (duplicates across segments are merged)\n"
+        if overlap_seconds else ""
+    )
     chunk_context = f"""
 IMPORTANT CONTEXT:
 - You are analyzing a SEGMENT of the full trial transcript
@@ -62,130 +90,213 @@ IMPORTANT CONTEXT:
 - This is {'the FIRST' if is_first else 'the LAST' if is_last else 'a MIDDLE'} segment of the trial
 
 Guidelines for chunk analysis:
-- Focus ONLY on issues that occur within this time segment
+- Focus ONLY on issues that occur in the transcript lines given below
 - If an issue spans across chunk boundaries, only report it if the problematic moment is within this chunk
 - Provide timestamps as they appear in the transcript (they will be within the {chunk_range} range)
 - Consider that some context may be missing (earlier or later conversation)
-
+{overlap_note}
 """
     return chunk_context + base_prompt
 
 
-def analyze_trial(trial_id):
-    """Analyze a trial in chunks"""
+def analyze_chunk(client, run, guidebook_file, playbook_file, base_prompt,
+                  chunk_num, num_chunks, window, overlap_seconds, sidecar=None):
+    """Analyze one chunk window; returns a tuple of (parsed_issues, chunk_detail)
+
+    Issues are appended to the live sidecar as they stream in.
+    """
+    chunk_range = get_chunk_range_text(chunk_num, CHUNK_DURATION)
+    is_first = (chunk_num == 1)
+    is_last = (chunk_num == num_chunks)
+
+    if not window['segments']:
+        print(f"CHUNK {chunk_num}/{num_chunks}: no transcript lines in {chunk_range}, skipping")
+        return [], {
+            "chunk": chunk_num,
+            "chunkRange": chunk_range,
+            "transcriptSegments": 0,
+            "issuesFound": 0
+        }
+
+    # Create chunk-specific prompt
+    chunk_prompt = create_chunk_prompt(
+        base_prompt,
+        chunk_num,
+        chunk_range,
+        is_first,
+        is_last,
+        overlap_seconds=0 if is_last else overlap_seconds
+    )
+
+    chunk_text = (
+        f"TRANSCRIPT SEGMENT ({chunk_range}):\n\n"
+        f"{format_segments(window['segments'])}"
+    )
+
+    print(f"CHUNK {chunk_num}/{num_chunks}: analyzing {chunk_range} "
+          f"({len(window['segments'])} segments) - calling Gemini API...")
+
+    # Generate analysis
+    response = gemini_generate(
+        client,
+        MODEL,
+        contents=[
+            guidebook_file,
+            playbook_file,
+            chunk_prompt,
+            chunk_text
+        ],
+        run=run,
+        label=f"chunk-{chunk_num}",
+        on_text=IssueStream(sidecar, {"chunkNumber": chunk_num, "chunkRange": chunk_range}),
+        validate=is_complete_issue_response
+    )
+
+    # Parse response (a truncated response keeps the issues that closed)
+    try:
+        with span(run, "parse", label=f"chunk-{chunk_num}"):
+            parsed_issues, truncated = parse_issues_salvaging(response['text'])
+
+        # Add chunk metadata to each issue
+        for issue in parsed_issues:
+            issue["chunkNumber"] = chunk_num
+            issue["chunkRange"] = chunk_range
+
+        print(f"✓ Chunk {chunk_num} complete: Found {len(parsed_issues)} issues")
+        chunk_detail = {
+            "chunk": chunk_num,
+            "chunkRange": chunk_range,
+            "transcriptSegments": len(window['segments']),
+            "issuesFound": len(parsed_issues),
+            "performance": response['performance'],
+            "rawResponse": response['text'][:500] + "..."
+        }
+        if truncated:
+            print(f"⚠ Chunk {chunk_num} response was cut off ({truncated}); kept the issues that closed")
+            chunk_detail["truncated"] = truncated
+        return parsed_issues, chunk_detail
+
+    except json.JSONDecodeError as e:
+        print(f"✗ Warning: Could not parse Chunk {chunk_num} response as JSON: {e}")
+        return [], {
+            "chunk": chunk_num,
+            "chunkRange": chunk_range,
+            "error": f"Invalid JSON response: {str(e)}",
+            "performance": response['performance'],
+            "rawResponse": response['text'][:500] + "..."
+        }
+
+
+def analyze_chunk_checkpointed(client, run, guidebook_file, playbook_file, base_prompt,
+                               chunk_num, num_chunks, window, overlap_seconds, journal=None, sidecar=None):
+    """analyze_chunk, checkpointing the chunk as soon as it completes
+
+    A failed call is recorded instead of raised, so the other chunks still
+    finish and are written out.
+    """
+    try:
+        parsed_issues, chunk_detail = analyze_chunk(client, run, guidebook_file, playbook_file, base_prompt,
+                                                    chunk_num, num_chunks, window, overlap_seconds, sidecar)
+    except Exception as e:
+        chunk_range = get_chunk_range_text(chunk_num, CHUNK_DURATION)
+        print(f"✗ Error in Chunk {chunk_num} ({chunk_range}): {str(e)}")
+        return [], {"chunk": chunk_num, "chunkRange": chunk_range, "error": str(e)}
+    record_pass(journal, chunk_num, parsed_issues, chunk_detail)
+    return parsed_issues, chunk_detail
+
+
+def analyze_trial(trial_id, client=None, concurrency=DEFAULT_CONCURRENCY, overlap_seconds=CHUNK_OVERLAP_SECONDS,
+                  resume=False, force=False):
+    """Analyze a trial in chunks
+
+    Completed chunks are checkpointed; resume reuses those from an earlier run
+    with the same configuration. The trial is skipped when its newest analysis
+    has the same inputs, unless force.
+    """
     print(f"{'='*60}")
     print(f"WORKFLOW: {WORKFLOW_TITLE}")
     print(f"{'='*60}")
     print(f"Trial: {trial_id}")
     print(f"Chunk Duration: {CHUNK_DURATION} minutes")
+    print(f"Chunk Overlap: {overlap_seconds} seconds")
     print(f"Model: {MODEL}")
     print(f"Prompt: {PROMPT_ID}")
     print(f"{'='*60}\n")
 
+    run = start_run(trial_id, WORKFLOW_ID, {
+        "promptId": PROMPT_ID,
+        "chunkDurationMinutes": CHUNK_DURATION,
+        "chunkOverlapSeconds": overlap_seconds
+    })
+
     # Setup paths
-    paths = setup_paths(trial_id)
-    check_required_files(paths)
+    with span(run, "setup_paths"):
+        paths = setup_paths(trial_id)
+        check_required_files(paths)
 
-    # Initialize Gemini client
-    print("Initializing Gemini client...")
-    client = genai.Client()
+    # Skip the trial if its newest analysis was made from these same inputs
+    current_analysis = find_current_analysis(run, paths, prompt_path_for(PROMPT_ID), MODEL, force=force)
+    if current_analysis:
+        return current_analysis
+
+    # Initialize Gemini client (batch runs share one across trials)
+    if client is None:
+        client = create_client()
 
     # Load base prompt
     base_prompt = load_prompt(PROMPT_ID)
 
-    # Upload files (guidebook and playbook are uploaded for each chunk)
-    # Transcript will be uploaded for each chunk separately
+    # Upload reference files once (reused from the upload registry when still live)
     print("Uploading reference files...")
-    guidebook_file = client.files.upload(file=paths['guidebook'])
-    playbook_file = client.files.upload(file=paths['playbook'])
-
-    # For now, we'll analyze the full transcript in chunks
-    # In a production version, you would parse the PDF and split it
-    # For this implementation, we'll simulate chunking by instructing the model
-
-    # Estimate number of chunks (this is a placeholder - in production, parse PDF)
-    # Assuming a typical 45-minute trial
-    estimated_duration_minutes = 45
-    num_chunks = (estimated_duration_minutes + CHUNK_DURATION - 1) // CHUNK_DURATION
-
-    print(f"\nEstimated chunks: {num_chunks}")
-    print("Note: Chunked analysis is a placeholder implementation.")
-    print("For production, parse PDF to extract and split transcript text.\n")
-
-    # Upload full transcript
-    transcript_file = client.files.upload(file=paths['transcript'])
+    guidebook_file = get_or_upload(client, paths['guidebook'], run=run)
+    playbook_file = get_or_upload(client, paths['playbook'], run=run)
+
+    # Load the pre-parsed transcript (rebuilt only when the PDF changes) and split
+    # it into CHUNK_DURATION windows; each call only carries its own window's text
+    print("Loading transcript segments...")
+    with span(run, "load_transcript"):
+        segments = load_transcript_segments(paths['transcript'])
+    duration_seconds = transcript_duration(segments)
+    windows = split_into_windows(segments, CHUNK_DURATION * 60, overlap_seconds=overlap_seconds)
+    num_chunks = len(windows)
+
+    print(f"  ✓ {len(segments)} segments, {duration_seconds / 60:.1f} minutes")
+    print(f"\nChunks: {num_chunks}")
+
+    # Chunks are independent, so dispatch them concurrently; completed chunks are
+    # checkpointed as they finish and issues stream to a live sidecar
+    journal = open_journal(run, resume=resume)
+    sidecar = open_live_sidecar(run)
+    print(f"Running {num_chunks} chunks with concurrency {concurrency}, overlap {overlap_seconds}s...")
+
+    resumed = {chunk_num: completed_pass(journal, chunk_num) for chunk_num in range(1, num_chunks + 1)}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            chunk_num: executor.submit(
+                analyze_chunk_checkpointed, client, run, guidebook_file, playbook_file, base_prompt,
+                chunk_num, num_chunks, window, overlap_seconds, journal, sidecar
+            )
+            for chunk_num, window in enumerate(windows, 1) if resumed[chunk_num] is None
+        }
+        for result in resumed.values():
+            if result:
+                sidecar.append(result[0])
+        # Collect in chunk order so the output is deterministic
+        chunk_results = [resumed[chunk_num] or futures[chunk_num].result()
+                         for chunk_num in range(1, num_chunks + 1)]
 
     all_issues = []
     chunk_responses = []
+    for parsed_issues, chunk_detail in chunk_results:
+        all_issues.extend(parsed_issues)
+        chunk_responses.append(chunk_detail)
 
-    for chunk_num in range(1, num_chunks + 1):
-        print(f"\n{'='*60}")
-        print(f"CHUNK {chunk_num}/{num_chunks}")
-        print(f"{'='*60}")
-
-        chunk_range = get_chunk_range_text(chunk_num, CHUNK_DURATION)
-        is_first = (chunk_num == 1)
-        is_last = (chunk_num == num_chunks)
-
-        # Create chunk-specific prompt
-        chunk_prompt = create_chunk_prompt(
-            base_prompt,
-            chunk_num,
-            chunk_range,
-            is_first,
-            is_last
-        )
-
-        print(f"Analyzing time range: {chunk_range}")
-        print(f"Calling Gemini API (Chunk {chunk_num})...")
-
-        # Generate analysis
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=[
-                guidebook_file,
-                playbook_file,
-                chunk_prompt,
-                transcript_file
-            ],
-        )
-
-        # Parse response
-        try:
-            # Clean response
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            parsed_issues = json.loads(response_text)
-
-            # Add chunk metadata to each issue
-            for issue in parsed_issues:
-                issue["chunkNumber"] = chunk_num
-                issue["chunkRange"] = chunk_range
-
-            print(f"✓ Chunk {chunk_num} complete: Found {len(parsed_issues)} issues")
-            all_issues.extend(parsed_issues)
-            chunk_responses.append({
-                "chunk": chunk_num,
-                "chunkRange": chunk_range,
-                "issuesFound": len(parsed_issues),
-                "rawResponse": response.text[:500] + "..."
-            })
-
-        except json.JSONDecodeError as e:
-            print(f"✗ Warning: Could not parse Chunk {chunk_num} response as JSON: {e}")
-            chunk_responses.append({
-                "chunk": chunk_num,
-                "chunkRange": chunk_range,
-                "error": f"Invalid JSON response: {str(e)}",
-                "rawResponse": response.text[:500] + "..."
-            })
+    # Issues in the overlap between adjacent chunks can be reported twice
+    all_issues, boundary_duplicates = merge_boundary_duplicates(
+        all_issues, windows, overlap_seconds, BOUNDARY_TIMESTAMP_TOLERANCE
+    )
+    if boundary_duplicates:
+        print(f"\nMerged {boundary_duplicates} duplicate issue(s) found in chunk overlaps")
 
     # Compile final analysis result
     analysis_result = {
@@ -206,9 +317,12 @@ def analyze_trial(trial_id):
         "configuration": {
             "chunkDurationMinutes": CHUNK_DURATION,
             "totalChunks": num_chunks,
+            "transcriptDurationSeconds": duration_seconds,
+            "chunkOverlapSeconds": overlap_seconds,
+            "concurrency": concurrency,
             "contextStrategy": "chunked",
             "promptVariant": PROMPT_ID,
-            "assetsUsed": ["guidebook", "playbook", "transcript"]
+            "assetsUsed": ["guidebook", "playbook", "transcript-text"]
         },
 
         # Results
@@ -219,12 +333,15 @@ def analyze_trial(trial_id):
         # Metrics
         "metrics": {
             "totalIssuesFound": len(all_issues),
-            "issuesByChunk": {str(detail['chunk']): detail['issuesFound'] for detail in chunk_responses if 'issuesFound' in detail}
+            "issuesByChunk": {str(detail['chunk']): detail['issuesFound'] for detail in chunk_responses if 'issuesFound' in detail},
+            "chunksResumed": sum(1 for detail in chunk_responses if detail.get('resumed')),
+            "boundaryDuplicatesMerged": boundary_duplicates
         }
     }
 
     # Save analysis
-    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID)
+    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID, run=run)
+    close_journal(journal, chunk_responses)
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETE!")
@@ -253,8 +370,18 @@ if __name__ == "__main__":
         epilog=f"Example: python {Path(__file__).name} mousa-g1"
     )
     parser.add_argument("trial_id", help="Trial ID to analyze")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Number of chunks to analyze in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_SECONDS,
+                        help=f"Seconds of overlap between adjacent chunks (default: {CHUNK_OVERLAP_SECONDS})")
+    add_resume_arguments(parser)
+    add_force_arguments(parser)
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
 
     # Show available trials if trial not found
     try:
@@ -269,4 +396,10 @@ if __name__ == "__main__":
                     print(f"  - {trial_dir.name}")
         sys.exit(1)
 
-    analyze_trial(args.trial_id)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.overlap < 0:
+        parser.error("--overlap must not be negative")
+
+    analyze_trial(args.trial_id, concurrency=args.concurrency, overlap_seconds=args.overlap,
+                  resume=args.resume, force=args.force)
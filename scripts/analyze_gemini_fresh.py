@@ -2,12 +2,18 @@
 """
 Workflow: Gemini 2.5 Pro - Fresh Context 10x
 Description: 10 independent fresh passes. Each pass starts with clean context for diverse perspectives.
+
+Passes run one after another by default, each told what earlier passes found.
+With --mode parallel they all run at once with the base prompt and their
+outputs are merged and deduped locally; --gap-fill then adds one sequential
+pass given a compact digest of the merged findings.
 """
 
 import os
 import sys
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from google import genai
 from datetime import datetime
@@ -18,10 +24,24 @@ sys.path.insert(0, str(Path(__file__).parent / "lib"))
 from analysis_utils import (
     setup_paths,
     load_prompt,
+    prompt_path_for,
     upload_files_gemini,
     save_analysis,
-    check_required_files
+    check_required_files,
+    start_run,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments
 )
+from model_calls import gemini_generate
+from tracing import span
+from input_fingerprint import find_current_analysis, add_force_arguments
+from early_stopping import new_tracker_for, update_early_stop, add_early_stop_arguments, early_stop_from_arguments
+from issue_dedupe import dedupe_issues
+from findings_digest import build_findings_digest, DEFAULT_TOKEN_BUDGET
+from issue_stream import parse_issues_salvaging, is_complete_issue_response, open_live_sidecar, IssueStream
+from pass_journal import open_journal, completed_pass, record_pass, close_journal, add_resume_arguments
 
 # Load environment variables
 load_dotenv()
@@ -33,11 +53,129 @@ WORKFLOW_DESCRIPTION = "10 independent fresh passes. Each pass starts with clean
 MODEL = "gemini-2.5-pro"
 PROMPT_ID = "standard-multipass"
 NUM_PASSES = 10
+# How later passes learn about earlier findings: "digest" adds a compact
+# timestamp|theme|quote-prefix list under a token budget, "full" pastes every
+# prior issue as JSON, "none" runs each pass independently and relies on the
+# local dedupe after the passes
+PRIOR_FINDINGS_MODES = ("digest", "full", "none")
+DEFAULT_PRIOR_FINDINGS = "digest"
+# "sequential" runs passes one at a time so each can exclude earlier findings;
+# "parallel" runs them all at once with the base prompt
+EXECUTION_MODES = ("sequential", "parallel")
+DEFAULT_MODE = "sequential"
 # ============================================
 
 
-def analyze_trial(trial_id):
-    """Analyze a trial using Gemini API with fresh context per pass"""
+def create_client():
+    """Create the Gemini client used by this workflow"""
+    print("Initializing Gemini client...")
+    return genai.Client()
+
+
+def build_pass_prompt(base_prompt, pass_num, prior_issues, prior_findings, digest_tokens):
+    """Prompt for a pass: the base prompt, plus earlier findings to exclude after pass 1"""
+    if pass_num == 1 or prior_findings == "none":
+        return base_prompt
+
+    # For subsequent passes, add instruction to exclude previous issues
+    if prior_findings == "digest":
+        previous_issues_summary = build_findings_digest(prior_issues, token_budget=digest_tokens)
+    else:
+        previous_issues_summary = json.dumps(prior_issues, indent=2)
+    return f"""{base_prompt}
+
+IMPORTANT: This is Pass {pass_num} of the analysis. You have already identified the following issues in previous passes:
+
+{previous_issues_summary}
+
+DO NOT include any of these previously identified issues again. Find NEW issues that were not identified in previous passes. Focus on finding additional problems that may have been missed.
+"""
+
+
+def run_fresh_pass(client, run, files, prompt, pass_num, sidecar=None):
+    """Run one fresh-context pass; returns (parsed_issues, pass_detail)
+
+    Issues are appended to the live sidecar as they stream in.
+    """
+    print(f"Calling Gemini API (Pass {pass_num})...")
+
+    # Generate analysis with multimodal input
+    response = gemini_generate(
+        client,
+        MODEL,
+        contents=[
+            files['guidebook'],
+            files['playbook'],
+            prompt,
+            files['transcript']
+        ],
+        run=run,
+        cache_salt=pass_num,
+        label=f"pass-{pass_num}",
+        on_text=IssueStream(sidecar, {"analysisPass": pass_num}),
+        validate=is_complete_issue_response
+    )
+
+    # Parse response (a truncated response keeps the issues that closed)
+    try:
+        with span(run, "parse", label=f"pass-{pass_num}"):
+            parsed_issues, truncated = parse_issues_salvaging(response['text'])
+    except json.JSONDecodeError as e:
+        print(f"✗ Warning: Could not parse Pass {pass_num} response as JSON: {e}")
+        return [], {
+            "pass": pass_num,
+            "error": f"Invalid JSON response: {str(e)}",
+            "performance": response['performance'],
+            "rawResponse": response['text'][:500] + "..."
+        }
+
+    # Add pass metadata to each issue
+    for issue in parsed_issues:
+        issue["analysisPass"] = pass_num
+
+    print(f"✓ Pass {pass_num} complete: Found {len(parsed_issues)} new issues")
+    pass_detail = {
+        "pass": pass_num,
+        "issuesFound": len(parsed_issues),
+        "performance": response['performance'],
+        "rawResponse": response['text'][:500] + "..."
+    }
+    if truncated:
+        print(f"⚠ Pass {pass_num} response was cut off ({truncated}); kept the issues that closed")
+        pass_detail["truncated"] = truncated
+    return parsed_issues, pass_detail
+
+
+def run_fresh_pass_safely(client, run, files, prompt, pass_num, journal=None, sidecar=None):
+    """run_fresh_pass for parallel mode: a failed call is recorded instead of raised"""
+    try:
+        parsed_issues, pass_detail = run_fresh_pass(client, run, files, prompt, pass_num, sidecar)
+    except Exception as e:
+        print(f"✗ Error in Pass {pass_num}: {str(e)}")
+        return [], {"pass": pass_num, "error": str(e)}
+    record_pass(journal, pass_num, parsed_issues, pass_detail)
+    return parsed_issues, pass_detail
+
+
+def analyze_trial(trial_id, client=None, prior_findings=DEFAULT_PRIOR_FINDINGS,
+                  digest_tokens=DEFAULT_TOKEN_BUDGET, early_stop=None, mode=DEFAULT_MODE,
+                  concurrency=NUM_PASSES, gap_fill=False, resume=False, force=False):
+    """Analyze a trial using Gemini API with fresh context per pass
+
+    early_stop ({'minNewIssues', 'patience'}) stops once passes stop adding
+    new distinct issues (sequential mode only). In parallel mode every pass
+    runs at once with the base prompt; gap_fill adds one final pass given a
+    digest of what they found. Completed passes are checkpointed; resume
+    reuses those from an earlier run with the same configuration. The trial is
+    skipped when its newest analysis has the same inputs, unless force.
+    """
+    if mode == "parallel":
+        # Parallel passes are independent: nothing to exclude, no yield to track
+        prior_findings = "none"
+        if early_stop:
+            print("⚠ --early-stop has no effect in parallel mode")
+            early_stop = None
+
     print(f"{'='*60}")
     print(f"WORKFLOW: {WORKFLOW_TITLE}")
     print(f"{'='*60}")
@@ -45,92 +183,121 @@ def analyze_trial(trial_id):
     print(f"Passes: {NUM_PASSES}")
     print(f"Model: {MODEL}")
     print(f"Prompt: {PROMPT_ID}")
+    print(f"Mode: {mode}" + (f" (concurrency {concurrency}, gap-fill {'on' if gap_fill else 'off'})"
+                             if mode == "parallel" else ""))
+    print(f"Prior Findings: {prior_findings}")
+    print(f"Early Stop: {early_stop or 'off'}")
     print(f"{'='*60}\n")
 
+    run = start_run(trial_id, WORKFLOW_ID, {
+        "promptId": PROMPT_ID,
+        "passes": NUM_PASSES,
+        "contextStrategy": "fresh",
+        "priorFindings": prior_findings,
+        "digestTokenBudget": digest_tokens,
+        "earlyStop": early_stop,
+        "mode": mode,
+        "gapFill": gap_fill
+    })
+
     # Setup paths
-    paths = setup_paths(trial_id)
-    check_required_files(paths)
+    with span(run, "setup_paths"):
+        paths = setup_paths(trial_id)
+        check_required_files(paths)
 
-    # Initialize Gemini client
-    print("Initializing Gemini client...")
-    client = genai.Client()
+    # Skip the trial if its newest analysis was made from these same inputs
+    current_analysis = find_current_analysis(run, paths, prompt_path_for(PROMPT_ID), MODEL, force=force)
+    if current_analysis:
+        return current_analysis
+
+    # Initialize Gemini client (batch runs share one across trials)
+    if client is None:
+        client = create_client()
 
     # Load base prompt
     base_prompt = load_prompt(PROMPT_ID)
 
+    # Completed passes are checkpointed as they finish; issues stream to a live sidecar
+    journal = open_journal(run, resume=resume)
+    sidecar = open_live_sidecar(run)
+
     # Multi-pass analysis
     all_issues = []
     pass_responses = []
 
-    for pass_num in range(1, NUM_PASSES + 1):
-        print(f"\n{'='*60}")
-        print(f"PASS {pass_num}/{NUM_PASSES}")
-        print(f"{'='*60}")
-
-        # Upload files for this pass (fresh context)
-        files = upload_files_gemini(client, paths, include_playbook=True)
-
-        # Build prompt for this pass
-        if pass_num == 1:
-            prompt = base_prompt
-        else:
-            # For subsequent passes, add instruction to exclude previous issues
-            previous_issues_summary = json.dumps(all_issues, indent=2)
-            prompt = f"""{base_prompt}
-
-IMPORTANT: This is Pass {pass_num} of the analysis. You have already identified the following issues in previous passes:
-
-{previous_issues_summary}
+    if mode == "parallel":
+        # Every pass uses the base prompt, so all of them can run at once;
+        # overlap between passes is merged by the local dedupe below
+        files = upload_files_gemini(client, paths, include_playbook=True, run=run)
+        print(f"\nRunning {NUM_PASSES} passes in parallel (concurrency {concurrency})...")
+        resumed = {pass_num: completed_pass(journal, pass_num) for pass_num in range(1, NUM_PASSES + 1)}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                pass_num: executor.submit(
+                    run_fresh_pass_safely, client, run, files, base_prompt, pass_num, journal, sidecar
+                )
+                for pass_num, result in resumed.items() if result is None
+            }
+            for result in resumed.values():
+                if result:
+                    sidecar.append(result[0])
+            # Collect in pass order so the output is deterministic
+            for pass_num in range(1, NUM_PASSES + 1):
+                parsed_issues, pass_detail = resumed[pass_num] or futures[pass_num].result()
+                all_issues.extend(parsed_issues)
+                pass_responses.append(pass_detail)
+
+        if gap_fill:
+            # One sequential pass told (compactly) what the parallel passes found
+            gap_pass_num = NUM_PASSES + 1
+            print(f"\n{'='*60}")
+            print(f"GAP-FILL PASS ({gap_pass_num})")
+            print(f"{'='*60}")
+            resumed = completed_pass(journal, gap_pass_num)
+            if resumed:
+                parsed_issues, pass_detail = resumed
+                sidecar.append(parsed_issues)
+                print(f"✓ Pass {gap_pass_num} resumed from checkpoint: {len(parsed_issues)} issues")
+            else:
+                found_so_far, _ = dedupe_issues([dict(issue) for issue in all_issues])
+                prompt = build_pass_prompt(base_prompt, gap_pass_num, found_so_far, "digest", digest_tokens)
+                parsed_issues, pass_detail = run_fresh_pass(client, run, files, prompt, gap_pass_num, sidecar)
+                pass_detail["gapFill"] = True
+                record_pass(journal, gap_pass_num, parsed_issues, pass_detail)
+            all_issues.extend(parsed_issues)
+            pass_responses.append(pass_detail)
+    else:
+        yield_tracker = new_tracker_for(early_stop)
+
+        for pass_num in range(1, NUM_PASSES + 1):
+            print(f"\n{'='*60}")
+            print(f"PASS {pass_num}/{NUM_PASSES}")
+            print(f"{'='*60}")
+
+            resumed = completed_pass(journal, pass_num)
+            if resumed:
+                parsed_issues, pass_detail = resumed
+                sidecar.append(parsed_issues)
+                print(f"✓ Pass {pass_num} resumed from checkpoint: {len(parsed_issues)} issues")
+            else:
+                # Files for this pass (fresh context); the upload registry reuses live uploads
+                files = upload_files_gemini(client, paths, include_playbook=True, run=run)
+
+                prompt = build_pass_prompt(base_prompt, pass_num, all_issues, prior_findings, digest_tokens)
+                parsed_issues, pass_detail = run_fresh_pass(client, run, files, prompt, pass_num, sidecar)
+                record_pass(journal, pass_num, parsed_issues, pass_detail)
+            all_issues.extend(parsed_issues)
+            pass_responses.append(pass_detail)
 
-DO NOT include any of these previously identified issues again. Find NEW issues that were not identified in previous passes. Focus on finding additional problems that may have been missed.
-"""
+            stop_reason = None if "error" in pass_detail else update_early_stop(yield_tracker, pass_detail, parsed_issues)
+            if stop_reason:
+                print(f"\n⚠ Stopping early after pass {pass_num}: {stop_reason}")
+                break
 
-        print(f"Calling Gemini API (Pass {pass_num})...")
-
-        # Generate analysis with multimodal input
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=[
-                files['guidebook'],
-                files['playbook'],
-                prompt,
-                files['transcript']
-            ],
-        )
-
-        # Parse response
-        try:
-            # Clean response if it has markdown code blocks
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            parsed_issues = json.loads(response_text)
-
-            # Add pass metadata to each issue
-            for issue in parsed_issues:
-                issue["analysisPass"] = pass_num
-
-            print(f"✓ Pass {pass_num} complete: Found {len(parsed_issues)} new issues")
-            all_issues.extend(parsed_issues)
-            pass_responses.append({
-                "pass": pass_num,
-                "issuesFound": len(parsed_issues),
-                "rawResponse": response.text[:500] + "..."
-            })
-
-        except json.JSONDecodeError as e:
-            print(f"✗ Warning: Could not parse Pass {pass_num} response as JSON: {e}")
-            pass_responses.append({
-                "pass": pass_num,
-                "error": f"Invalid JSON response: {str(e)}",
-                "rawResponse": response.text[:500] + "..."
-            })
+    # Merge issues that several passes reported for the same moment
+    all_issues, duplicates_merged = dedupe_issues(all_issues)
+    if duplicates_merged:
+        print(f"\nMerged {duplicates_merged} duplicate issue(s) across passes")
 
     # Compile final analysis result
     analysis_result = {
@@ -151,6 +318,12 @@ DO NOT include any of these previously identified issues again. Find NEW issues
         "configuration": {
             "passes": NUM_PASSES,
             "contextStrategy": "fresh",
+            "priorFindings": prior_findings,
+            "digestTokenBudget": digest_tokens if prior_findings == "digest" or gap_fill else None,
+            "earlyStop": early_stop,
+            "executionMode": mode,
+            "concurrency": concurrency if mode == "parallel" else 1,
+            "gapFill": gap_fill,
             "promptVariant": PROMPT_ID,
             "assetsUsed": ["guidebook", "playbook", "transcript"]
         },
@@ -163,12 +336,16 @@ DO NOT include any of these previously identified issues again. Find NEW issues
         # Metrics
         "metrics": {
             "totalIssuesFound": len(all_issues),
-            "issuesByPass": {str(detail['pass']): detail['issuesFound'] for detail in pass_responses if 'issuesFound' in detail}
+            "issuesByPass": {str(detail['pass']): detail['issuesFound'] for detail in pass_responses if 'issuesFound' in detail},
+            "passesRun": len(pass_responses),
+            "passesResumed": sum(1 for detail in pass_responses if detail.get('resumed')),
+            "duplicatesMerged": duplicates_merged
         }
     }
 
     # Save analysis
-    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID)
+    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID, run=run)
+    close_journal(journal, pass_responses)
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETE!")
@@ -177,7 +354,9 @@ DO NOT include any of these previously identified issues again. Find NEW issues
     print(f"  Workflow: {WORKFLOW_TITLE}")
     print(f"  Trial ID: {trial_id}")
     print(f"  Output: {output_path}")
-    print(f"  Analysis Method: {NUM_PASSES}-Pass Multi-Pass (Fresh Context)")
+    print(f"  Analysis Method: {NUM_PASSES}-Pass Multi-Pass (Fresh Context, {mode})")
+    if len(pass_responses) < NUM_PASSES:
+        print(f"  Passes Run: {len(pass_responses)} (stopped early)")
     print(f"  Total Issues Found: {len(all_issues)}")
     print(f"\nIssues by Pass:")
     for detail in pass_responses:
@@ -196,8 +375,25 @@ if __name__ == "__main__":
         epilog=f"Example: python {Path(__file__).name} mousa-g1"
     )
     parser.add_argument("trial_id", help="Trial ID to analyze")
+    parser.add_argument("--prior-findings", choices=PRIOR_FINDINGS_MODES, default=DEFAULT_PRIOR_FINDINGS,
+                        help=f"How later passes are told about earlier findings (default: {DEFAULT_PRIOR_FINDINGS})")
+    parser.add_argument("--digest-tokens", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f"Token budget for the prior-findings digest (default: {DEFAULT_TOKEN_BUDGET})")
+    parser.add_argument("--mode", choices=EXECUTION_MODES, default=DEFAULT_MODE,
+                        help=f"Run passes one after another or all at once (default: {DEFAULT_MODE})")
+    parser.add_argument("--concurrency", type=int, default=NUM_PASSES,
+                        help=f"With --mode parallel, passes in flight at once (default: {NUM_PASSES})")
+    parser.add_argument("--gap-fill", action="store_true",
+                        help="With --mode parallel, add one final pass given a digest of the merged findings")
+    add_early_stop_arguments(parser)
+    add_resume_arguments(parser)
+    add_force_arguments(parser)
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
 
     # Show available trials if trial not found
     try:
@@ -212,4 +408,10 @@ if __name__ == "__main__":
                     print(f"  - {trial_dir.name}")
         sys.exit(1)
 
-    analyze_trial(args.trial_id)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    analyze_trial(args.trial_id, prior_findings=args.prior_findings, digest_tokens=args.digest_tokens,
+                  early_stop=early_stop_from_arguments(args), mode=args.mode,
+                  concurrency=args.concurrency, gap_fill=args.gap_fill, resume=args.resume,
+                  force=args.force)
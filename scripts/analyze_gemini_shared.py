@@ -19,10 +19,21 @@ sys.path.insert(0, str(Path(__file__).parent / "lib"))
 from analysis_utils import (
     setup_paths,
     load_prompt,
+    prompt_path_for,
     upload_files_gemini,
     save_analysis,
-    check_required_files
+    check_required_files,
+    start_run,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments
 )
+from model_calls import gemini_generate
+from tracing import span
+from issue_stream import parse_issues_salvaging, is_complete_issue_response, open_live_sidecar, IssueStream
+from input_fingerprint import find_current_analysis, add_force_arguments
+from early_stopping import new_tracker_for, update_early_stop, add_early_stop_arguments, early_stop_from_arguments
 
 # Load environment variables
 load_dotenv()
@@ -37,8 +48,24 @@ NUM_PASSES = 10
 # ============================================
 
 
-def analyze_trial(trial_id):
-    """Analyze a trial using Gemini Chat API with true shared context across passes"""
+def create_client():
+    """Create the Gemini client used by this workflow"""
+    print("Initializing Gemini client...")
+    return genai.Client()
+
+
+def file_part(uploaded_file):
+    """Reference an uploaded file as a message part"""
+    return types.Part.from_uri(file_uri=uploaded_file.uri, mime_type=uploaded_file.mime_type)
+
+
+def analyze_trial(trial_id, client=None, early_stop=None, force=False):
+    """Analyze a trial in one conversation with true shared context across passes
+
+    early_stop ({'minNewIssues', 'patience'}) stops once passes stop adding
+    new distinct issues. The trial is skipped when its newest analysis has
+    the same inputs, unless force.
+    """
     print(f"{'='*60}")
     print(f"WORKFLOW: {WORKFLOW_TITLE}")
     print(f"{'='*60}")
@@ -47,29 +74,47 @@ def analyze_trial(trial_id):
     print(f"Model: {MODEL}")
     print(f"Context: Shared (True Chat Context)")
     print(f"Prompt: {PROMPT_ID}")
+    print(f"Early Stop: {early_stop or 'off'}")
     print(f"{'='*60}\n")
 
+    run = start_run(trial_id, WORKFLOW_ID, {
+        "promptId": PROMPT_ID,
+        "passes": NUM_PASSES,
+        "contextStrategy": "shared",
+        "earlyStop": early_stop
+    })
+
     # Setup paths
-    paths = setup_paths(trial_id)
-    check_required_files(paths)
+    with span(run, "setup_paths"):
+        paths = setup_paths(trial_id)
+        check_required_files(paths)
 
-    # Initialize Gemini client
-    print("Initializing Gemini client...")
-    client = genai.Client()
+    # Skip the trial if its newest analysis was made from these same inputs
+    current_analysis = find_current_analysis(run, paths, prompt_path_for(PROMPT_ID), MODEL, force=force)
+    if current_analysis:
+        return current_analysis
+
+    # Initialize Gemini client (batch runs share one across trials)
+    if client is None:
+        client = create_client()
 
     # Upload files once (they'll stay in context)
-    files = upload_files_gemini(client, paths, include_playbook=True)
+    files = upload_files_gemini(client, paths, include_playbook=True, run=run)
 
     # Load base prompt
     base_prompt = load_prompt(PROMPT_ID)
 
-    # Create chat session
-    print("Creating chat session...")
-    chat = client.chats.create(model=MODEL)
+    # Conversation history (what a chat session keeps client-side); kept
+    # explicitly so each turn can be replayed from the response cache
+    history = []
+
+    # Issues stream to a live sidecar as each pass produces them
+    sidecar = open_live_sidecar(run)
 
     # Multi-pass analysis using true chat context
     all_issues = []
     pass_responses = []
+    yield_tracker = new_tracker_for(early_stop)
 
     for pass_num in range(1, NUM_PASSES + 1):
         print(f"\n{'='*60}")
@@ -80,35 +125,31 @@ def analyze_trial(trial_id):
         if pass_num == 1:
             # First pass: Full prompt with files
             message = [
-                files['guidebook'],
-                files['playbook'],
-                base_prompt,
-                files['transcript']
+                file_part(files['guidebook']),
+                file_part(files['playbook']),
+                types.Part.from_text(text=base_prompt),
+                file_part(files['transcript'])
             ]
         else:
             # Subsequent passes: Simple instruction (chat remembers previous context)
-            message = """Continue analyzing the transcript. Find additional issues that you haven't identified yet.
+            message = [types.Part.from_text(text="""Continue analyzing the transcript. Find additional issues that you haven't identified yet.
 
-IMPORTANT: You have already found issues in previous passes. Do NOT repeat any issues you've already identified. Focus on finding completely NEW issues in different areas that were missed."""
+IMPORTANT: You have already found issues in previous passes. Do NOT repeat any issues you've already identified. Focus on finding completely NEW issues in different areas that were missed.""")]
 
         print(f"Sending message to chat (Pass {pass_num})...")
 
-        # Send message in chat
-        response = chat.send_message(message)
+        # Send message with the full conversation so far
+        history.append(types.Content(role="user", parts=message))
+        response = gemini_generate(client, MODEL, contents=history, run=run, label=f"pass-{pass_num}",
+                                   on_text=IssueStream(sidecar, {"analysisPass": pass_num}),
+                                   validate=is_complete_issue_response)
+        history.append(types.Content(role="model", parts=[types.Part.from_text(text=response['text'])]))
 
-        # Parse response
+        # Parse response (a truncated response keeps the issues that closed)
+        stop_reason = None
         try:
-            # Clean response if it has markdown code blocks
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            parsed_issues = json.loads(response_text)
+            with span(run, "parse", label=f"pass-{pass_num}"):
+                parsed_issues, truncated = parse_issues_salvaging(response['text'])
 
             # Add pass metadata to each issue
             for issue in parsed_issues:
@@ -119,17 +160,27 @@ IMPORTANT: You have already found issues in previous passes. Do NOT repeat any i
             pass_responses.append({
                 "pass": pass_num,
                 "issuesFound": len(parsed_issues),
-                "rawResponse": response.text[:500] + "..."
+                "performance": response['performance'],
+                "rawResponse": response['text'][:500] + "..."
             })
+            if truncated:
+                print(f"⚠ Pass {pass_num} response was cut off ({truncated}); kept the issues that closed")
+                pass_responses[-1]["truncated"] = truncated
+            stop_reason = update_early_stop(yield_tracker, pass_responses[-1], parsed_issues)
 
         except json.JSONDecodeError as e:
             print(f"✗ Warning: Could not parse Pass {pass_num} response as JSON: {e}")
             pass_responses.append({
                 "pass": pass_num,
                 "error": f"Invalid JSON response: {str(e)}",
-                "rawResponse": response.text[:500] + "..."
+                "performance": response['performance'],
+                "rawResponse": response['text'][:500] + "..."
             })
 
+        if stop_reason:
+            print(f"\n⚠ Stopping early after pass {pass_num}: {stop_reason}")
+            break
+
     # Compile final analysis result
     analysis_result = {
         # Workflow metadata
@@ -149,6 +200,7 @@ IMPORTANT: You have already found issues in previous passes. Do NOT repeat any i
         "configuration": {
             "passes": NUM_PASSES,
             "contextStrategy": "shared",
+            "earlyStop": early_stop,
             "promptVariant": PROMPT_ID,
             "assetsUsed": ["guidebook", "playbook", "transcript"]
         },
@@ -161,12 +213,13 @@ IMPORTANT: You have already found issues in previous passes. Do NOT repeat any i
         # Metrics
         "metrics": {
             "totalIssuesFound": len(all_issues),
-            "issuesByPass": {str(detail['pass']): detail['issuesFound'] for detail in pass_responses if 'issuesFound' in detail}
+            "issuesByPass": {str(detail['pass']): detail['issuesFound'] for detail in pass_responses if 'issuesFound' in detail},
+            "passesRun": len(pass_responses)
         }
     }
 
     # Save analysis
-    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID)
+    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID, run=run)
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETE!")
@@ -176,6 +229,8 @@ IMPORTANT: You have already found issues in previous passes. Do NOT repeat any i
     print(f"  Trial ID: {trial_id}")
     print(f"  Output: {output_path}")
     print(f"  Analysis Method: {NUM_PASSES}-Pass Multi-Pass (Shared Context)")
+    if len(pass_responses) < NUM_PASSES:
+        print(f"  Passes Run: {len(pass_responses)} (stopped early)")
     print(f"  Total Issues Found: {len(all_issues)}")
     print(f"\nIssues by Pass:")
     for detail in pass_responses:
@@ -194,8 +249,14 @@ if __name__ == "__main__":
         epilog=f"Example: python {Path(__file__).name} mousa-g1"
     )
     parser.add_argument("trial_id", help="Trial ID to analyze")
+    add_early_stop_arguments(parser)
+    add_force_arguments(parser)
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
 
     # Show available trials if trial not found
     try:
@@ -210,4 +271,4 @@ if __name__ == "__main__":
                     print(f"  - {trial_dir.name}")
         sys.exit(1)
 
-    analyze_trial(args.trial_id)
+    analyze_trial(args.trial_id, early_stop=early_stop_from_arguments(args), force=args.force)
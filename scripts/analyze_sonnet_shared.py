@@ -2,14 +2,24 @@
 """
 Workflow: Claude Sonnet 4.5 - Shared Context 3x
 Description: 3 passes using Claude's superior reasoning in a shared conversation. Efficient and coherent analysis.
+
+With --batch, many trials run through the Message Batches API: one batch per
+pass across all trials, at half the price of synchronous calls.
+
+Documents are uploaded once through the Files API and referenced by file_id
+on every pass; with --no-files-api they are sent as base64, encoded once
+per file version.
+
+The playbook PDF is too large to attach. With --playbook-sections, the
+extracted text of those sections' pages (from the page index under
+data/prompt-assets/derived) is attached instead, up to a character budget;
+without it the workflow runs without the playbook.
 """
 
 import os
 import sys
 import json
 import argparse
-import base64
-import time
 from pathlib import Path
 from anthropic import Anthropic
 from datetime import datetime
@@ -20,9 +30,21 @@ sys.path.insert(0, str(Path(__file__).parent / "lib"))
 from analysis_utils import (
     setup_paths,
     load_prompt,
+    prompt_path_for,
     save_analysis,
-    check_required_files
+    check_required_files,
+    start_run,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments
 )
+from model_calls import claude_message, claude_message_batch
+from claude_files import document_source, FILES_API_BETA
+from document_pages import load_page_index, select_pages, pages_text
+from tracing import span
+from issue_stream import parse_issues_salvaging, is_complete_issue_response, open_live_sidecar, IssueStream
+from input_fingerprint import find_current_analysis, add_force_arguments
 
 # Load environment variables
 load_dotenv()
@@ -34,157 +56,197 @@ WORKFLOW_DESCRIPTION = "3 passes using Claude's superior reasoning in a shared c
 MODEL = "claude-sonnet-4-5-20250929"
 PROMPT_ID = "standard-multipass"
 NUM_PASSES = 3
+# Seconds between status polls in --batch mode
+DEFAULT_BATCH_POLL_SECONDS = 30
+# Cap on the playbook page text attached to the first pass when sections are
+# requested (~30k tokens); 0 disables
+PLAYBOOK_TEXT_BUDGET_CHARS = 120_000
 # ============================================
 
 
-def pdf_to_base64(file_path):
-    """Convert PDF to base64 for Claude API"""
-    with open(file_path, 'rb') as f:
-        return base64.standard_b64encode(f.read()).decode('utf-8')
-
+def create_client(base_url=None):
+    """Create the Anthropic client used by this workflow
 
-def analyze_trial(trial_id):
-    """Analyze a trial using Claude API with shared context across passes"""
-    print(f"{'='*60}")
-    print(f"WORKFLOW: {WORKFLOW_TITLE}")
-    print(f"{'='*60}")
-    print(f"Trial: {trial_id}")
-    print(f"Passes: {NUM_PASSES}")
-    print(f"Model: {MODEL}")
-    print(f"Context: Shared (Messages API)")
-    print(f"Prompt: {PROMPT_ID}")
-    print(f"{'='*60}\n")
-
-    # Setup paths
-    paths = setup_paths(trial_id)
-    check_required_files(paths)
-
-    # Initialize Anthropic client
+    base_url points the client (including its batch endpoint) at another
+    server, e.g. a local stand-in for tests.
+    """
     print("Initializing Anthropic client...")
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    return Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"), base_url=base_url)
+
+
+def build_pass_message(pass_num, base_prompt, guidebook_source, transcript_source, playbook_text=None):
+    """User turn for a pass: documents + prompt first, then a short follow-up"""
+    if pass_num == 1:
+        # First pass: Full prompt with PDFs + prompt caching
+        content = [
+            {
+                "type": "document",
+                "source": guidebook_source,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+        if playbook_text:
+            content.append({
+                "type": "text",
+                "text": f"Trial delivery playbook (selected pages):\n\n{playbook_text}",
+                "cache_control": {"type": "ephemeral"}
+            })
+        content.extend([
+            {
+                "type": "text",
+                "text": base_prompt
+            },
+            {
+                "type": "document",
+                "source": transcript_source,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ])
+        return {"role": "user", "content": content}
 
-    # Load base prompt
-    base_prompt = load_prompt(PROMPT_ID)
+    # Subsequent passes: Simple instruction to continue
+    return {
+        "role": "user",
+        "content": """Continue analyzing the transcript. Find additional issues that you haven't identified yet in previous passes.
 
-    # Encode PDFs to base64
-    # NOTE: Playbook (29MB) exceeds Claude API size limits, so we skip it
-    # This workflow uses guidebook + transcript only
-    print("Encoding files...")
-    transcript_b64 = pdf_to_base64(paths['transcript'])
-    guidebook_b64 = pdf_to_base64(paths['guidebook'])
+IMPORTANT: Do NOT repeat any issues you've already found. Focus on finding NEW issues that were missed in previous passes."""
+    }
 
-    # Multi-pass analysis using messages
-    all_issues = []
-    pass_responses = []
-    message_history = []
 
-    for pass_num in range(1, NUM_PASSES + 1):
-        print(f"\n{'='*60}")
-        print(f"PASS {pass_num}/{NUM_PASSES}")
-        print(f"{'='*60}")
+def load_playbook_text(playbook_path, run, budget_chars, sections=None):
+    """Page text of the playbook sections requested, within budget_chars; returns (text, page_numbers)
 
-        # Build message for this pass
-        if pass_num == 1:
-            # First pass: Full prompt with PDFs + prompt caching
-            user_message = {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": guidebook_b64
-                        },
-                        "cache_control": {"type": "ephemeral"}
-                    },
-                    {
-                        "type": "text",
-                        "text": base_prompt
-                    },
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": transcript_b64
-                        },
-                        "cache_control": {"type": "ephemeral"}
-                    }
-                ]
-            }
-        else:
-            # Subsequent passes: Simple instruction to continue
-            user_message = {
-                "role": "user",
-                "content": """Continue analyzing the transcript. Find additional issues that you haven't identified yet in previous passes.
+    The playbook is opt-in: returns (None, []) when no sections are given, when
+    disabled, or when the page index cannot be built (e.g. pypdf is not
+    installed), so the workflow runs without the playbook.
+    """
+    if not sections or budget_chars <= 0:
+        return None, []
+    try:
+        with span(run, "load_playbook_pages"):
+            index = load_page_index(playbook_path)
+            text, page_numbers = pages_text(index, select_pages(index, sections=sections), max_chars=budget_chars)
+    except Exception as e:
+        print(f"  ⚠ Playbook pages unavailable ({e}), continuing without the playbook")
+        return None, []
+
+    if not page_numbers:
+        print("  ⚠ No playbook pages selected, continuing without the playbook")
+        return None, []
+    print(f"  ✓ Playbook: {len(page_numbers)}/{index['pageCount']} pages ({len(text)} chars)")
+    return text, page_numbers
+
+
+def start_trial(trial_id, playbook_budget=PLAYBOOK_TEXT_BUDGET_CHARS, playbook_sections=None, force=False):
+    """Start a run for a trial; returns (run, paths, current_analysis)
+
+    current_analysis is the trial's newest analysis when it was made from the
+    same inputs (never with force), in which case the trial can be skipped.
+    """
+    run = start_run(trial_id, WORKFLOW_ID, {
+        "promptId": PROMPT_ID,
+        "passes": NUM_PASSES,
+        "contextStrategy": "shared",
+        # The playbook pages attached change what the model sees; the budget
+        # only matters when sections are attached
+        "playbookBudget": playbook_budget if playbook_sections else None,
+        "playbookSections": playbook_sections
+    })
 
-IMPORTANT: Do NOT repeat any issues you've already found. Focus on finding NEW issues that were missed in previous passes."""
-            }
+    # Setup paths
+    with span(run, "setup_paths"):
+        paths = setup_paths(trial_id)
+        check_required_files(paths)
+
+    return run, paths, find_current_analysis(run, paths, prompt_path_for(PROMPT_ID), MODEL, force=force)
+
+
+def prepare_trial(run, paths, client, use_files_api=True, playbook_budget=PLAYBOOK_TEXT_BUDGET_CHARS,
+                  playbook_sections=None):
+    """Resolve a started trial's document sources into its conversation state"""
+    # Upload once and reference by file_id (or fall back to cached base64)
+    # NOTE: Playbook (29MB) exceeds Claude API size limits, so only its page
+    # text is attached
+    print("Preparing documents...")
+    guidebook_source, guidebook_uploaded = document_source(client, paths['guidebook'], run=run,
+                                                           use_files_api=use_files_api)
+    transcript_source, transcript_uploaded = document_source(client, paths['transcript'], run=run,
+                                                             use_files_api=use_files_api)
+    playbook_text, playbook_pages = load_playbook_text(paths['playbook'], run, playbook_budget, playbook_sections)
+
+    return {
+        'trialId': run['trialId'],
+        'run': run,
+        'guidebook_source': guidebook_source,
+        'transcript_source': transcript_source,
+        'playbook_text': playbook_text,
+        'playbook_pages': playbook_pages,
+        # Requests that reference uploaded files need the Files API beta
+        'betas': [FILES_API_BETA] if guidebook_uploaded or transcript_uploaded else [],
+        'message_history': [],
+        'all_issues': [],
+        'pass_responses': [],
+    }
 
-        # Add to message history
-        message_history.append(user_message)
 
-        print(f"Sending request to Claude API (Pass {pass_num})...")
+def record_pass_response(state, pass_num, response):
+    """Add the assistant turn to the conversation and parse the pass's issues
 
-        # Generate response
-        response = client.messages.create(
-            model=MODEL,
-            max_tokens=16000,
-            messages=message_history
-        )
+    A truncated response keeps the issues that closed before the cut.
+    """
+    run = state['run']
+    response_text = response['text']
 
-        # Extract text from response
-        response_text = ""
-        for block in response.content:
-            if block.type == "text":
-                response_text += block.text
+    # Add assistant response to history
+    state['message_history'].append({
+        "role": "assistant",
+        "content": response_text
+    })
 
-        # Add assistant response to history
-        message_history.append({
-            "role": "assistant",
-            "content": response_text
+    # Parse response
+    try:
+        with span(run, "parse", label=f"pass-{pass_num}"):
+            parsed_issues, truncated = parse_issues_salvaging(response_text)
+
+        # Add pass metadata to each issue
+        for issue in parsed_issues:
+            issue["analysisPass"] = pass_num
+
+        print(f"✓ Pass {pass_num} complete: Found {len(parsed_issues)} new issues")
+        state['all_issues'].extend(parsed_issues)
+        state['pass_responses'].append({
+            "pass": pass_num,
+            "issuesFound": len(parsed_issues),
+            "performance": response['performance'],
+            "rawResponse": response_text[:500] + "..."
+        })
+        if truncated:
+            print(f"⚠ Pass {pass_num} response was cut off ({truncated}); kept the issues that closed")
+            state['pass_responses'][-1]["truncated"] = truncated
+
+    except json.JSONDecodeError as e:
+        print(f"✗ Warning: Could not parse Pass {pass_num} response as JSON: {e}")
+        state['pass_responses'].append({
+            "pass": pass_num,
+            "error": f"Invalid JSON response: {str(e)}",
+            "performance": response['performance'],
+            "rawResponse": response_text[:500] + "..."
         })
 
-        # Parse response
-        try:
-            # Clean response if it has markdown code blocks
-            cleaned_text = response_text.strip()
-            if cleaned_text.startswith("```json"):
-                cleaned_text = cleaned_text[7:]
-            if cleaned_text.startswith("```"):
-                cleaned_text = cleaned_text[3:]
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]
-            cleaned_text = cleaned_text.strip()
-
-            parsed_issues = json.loads(cleaned_text)
-
-            # Add pass metadata to each issue
-            for issue in parsed_issues:
-                issue["analysisPass"] = pass_num
-
-            print(f"✓ Pass {pass_num} complete: Found {len(parsed_issues)} new issues")
-            all_issues.extend(parsed_issues)
-            pass_responses.append({
-                "pass": pass_num,
-                "issuesFound": len(parsed_issues),
-                "rawResponse": response_text[:500] + "..."
-            })
 
-        except json.JSONDecodeError as e:
-            print(f"✗ Warning: Could not parse Pass {pass_num} response as JSON: {e}")
-            pass_responses.append({
-                "pass": pass_num,
-                "error": f"Invalid JSON response: {str(e)}",
-                "rawResponse": response_text[:500] + "..."
-            })
+def pass_params(state):
+    """messages.create params for the next pass of a trial's conversation"""
+    params = {"model": MODEL, "max_tokens": 16000, "messages": list(state['message_history'])}
+    if state['betas']:
+        params["betas"] = state['betas']
+    return params
+
 
-        # Small delay between passes (prompt caching handles the heavy lifting)
-        if pass_num < NUM_PASSES:
-            delay = 2  # Brief delay between passes
-            print(f"\nWaiting {delay}s before next pass...")
-            time.sleep(delay)
+def finish_trial(state, execution_mode="messages"):
+    """Compile, save and summarize a trial's analysis"""
+    trial_id = state['trialId']
+    all_issues = state['all_issues']
+    pass_responses = state['pass_responses']
 
     # Compile final analysis result
     analysis_result = {
@@ -206,7 +268,12 @@ IMPORTANT: Do NOT repeat any issues you've already found. Focus on finding NEW i
             "passes": NUM_PASSES,
             "contextStrategy": "shared",
             "promptVariant": PROMPT_ID,
-            "assetsUsed": ["guidebook", "transcript"]  # Playbook excluded due to 29MB size limit
+            "executionMode": execution_mode,
+            "documentTransport": "files-api" if state['betas'] else "base64",
+            # The 29MB playbook PDF is over the size limit; only page text is attached
+            "assetsUsed": ["guidebook", "playbook-pages", "transcript"] if state['playbook_pages']
+                          else ["guidebook", "transcript"],
+            "playbookPages": state['playbook_pages']
         },
 
         # Results
@@ -222,7 +289,7 @@ IMPORTANT: Do NOT repeat any issues you've already found. Focus on finding NEW i
     }
 
     # Save analysis
-    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID)
+    output_path = save_analysis(analysis_result, trial_id, WORKFLOW_ID, run=state['run'])
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETE!")
@@ -243,15 +310,168 @@ IMPORTANT: Do NOT repeat any issues you've already found. Focus on finding NEW i
     return analysis_result
 
 
+def analyze_trial(trial_id, client=None, use_files_api=True, playbook_budget=PLAYBOOK_TEXT_BUDGET_CHARS,
+                  playbook_sections=None, force=False):
+    """Analyze a trial using Claude API with shared context across passes
+
+    The trial is skipped when its newest analysis has the same inputs, unless force.
+    """
+    print(f"{'='*60}")
+    print(f"WORKFLOW: {WORKFLOW_TITLE}")
+    print(f"{'='*60}")
+    print(f"Trial: {trial_id}")
+    print(f"Passes: {NUM_PASSES}")
+    print(f"Model: {MODEL}")
+    print(f"Context: Shared (Messages API)")
+    print(f"Prompt: {PROMPT_ID}")
+    print(f"{'='*60}\n")
+
+    # Initialize Anthropic client (batch runs share one across trials)
+    if client is None:
+        client = create_client()
+
+    run, paths, current_analysis = start_trial(trial_id, playbook_budget, playbook_sections, force=force)
+    if current_analysis:
+        return current_analysis
+
+    state = prepare_trial(run, paths, client, use_files_api=use_files_api, playbook_budget=playbook_budget,
+                          playbook_sections=playbook_sections)
+    sidecar = open_live_sidecar(run)
+
+    # Load base prompt
+    base_prompt = load_prompt(PROMPT_ID)
+
+    # Multi-pass analysis using messages
+    for pass_num in range(1, NUM_PASSES + 1):
+        print(f"\n{'='*60}")
+        print(f"PASS {pass_num}/{NUM_PASSES}")
+        print(f"{'='*60}")
+
+        # Add this pass's user turn to the shared conversation
+        state['message_history'].append(
+            build_pass_message(pass_num, base_prompt, state['guidebook_source'], state['transcript_source'],
+                               state['playbook_text'])
+        )
+
+        print(f"Sending request to Claude API (Pass {pass_num})...")
+
+        # Generate response; no fixed delay between passes, the call scheduler
+        # paces requests against the model's rate limits
+        response = claude_message(
+            client,
+            run=run,
+            label=f"pass-{pass_num}",
+            on_text=IssueStream(sidecar, {"analysisPass": pass_num}),
+            validate=is_complete_issue_response,
+            **pass_params(state)
+        )
+        record_pass_response(state, pass_num, response)
+
+    return finish_trial(state)
+
+
+def analyze_trials_batch(trial_ids, client=None, poll_seconds=DEFAULT_BATCH_POLL_SECONDS, use_files_api=True,
+                         playbook_budget=PLAYBOOK_TEXT_BUDGET_CHARS, playbook_sections=None, force=False):
+    """Analyze many trials through the Message Batches API
+
+    Pass 1 for every trial goes out as one batch; once it ends, each trial's
+    follow-up pass is submitted as the next batch, and so on. Trials whose
+    request fails in a batch stop there and are saved with the passes they have.
+    Trials whose newest analysis has the same inputs are skipped unless force.
+    """
+    print(f"{'='*60}")
+    print(f"WORKFLOW: {WORKFLOW_TITLE} (Message Batches)")
+    print(f"{'='*60}")
+    print(f"Trials: {len(trial_ids)}")
+    print(f"Passes: {NUM_PASSES} (one batch per pass)")
+    print(f"Model: {MODEL}")
+    print(f"Prompt: {PROMPT_ID}")
+    print(f"{'='*60}\n")
+
+    if client is None:
+        client = create_client()
+    base_prompt = load_prompt(PROMPT_ID)
+
+    states = []
+    analyses_by_trial = {}
+    for trial_id in trial_ids:
+        run, paths, current_analysis = start_trial(trial_id, playbook_budget, playbook_sections, force=force)
+        if current_analysis:
+            analyses_by_trial[trial_id] = current_analysis
+            continue
+        states.append(prepare_trial(run, paths, client, use_files_api=use_files_api,
+                                    playbook_budget=playbook_budget, playbook_sections=playbook_sections))
+    active = list(states)
+
+    for pass_num in range(1, NUM_PASSES + 1):
+        if not active:
+            break
+        print(f"\n{'='*60}")
+        print(f"PASS {pass_num}/{NUM_PASSES}: batch of {len(active)} trial(s)")
+        print(f"{'='*60}")
+
+        calls = []
+        for index, state in enumerate(active):
+            state['message_history'].append(
+                build_pass_message(pass_num, base_prompt, state['guidebook_source'], state['transcript_source'],
+                                   state['playbook_text'])
+            )
+            calls.append({
+                # custom_id only allows [A-Za-z0-9_-]; the index keeps it unique
+                'customId': f"trial-{index}-pass-{pass_num}",
+                'run': state['run'],
+                'label': f"pass-{pass_num}",
+                'params': pass_params(state),
+            })
+
+        results = claude_message_batch(client, calls, poll_seconds=poll_seconds,
+                                       validate=is_complete_issue_response)
+
+        still_active = []
+        for call, state in zip(calls, active):
+            response = results[call['customId']]
+            if 'error' in response:
+                print(f"✗ {state['trialId']} pass {pass_num} failed in batch: {response['error']}")
+                state['pass_responses'].append({"pass": pass_num, "error": response['error']})
+                continue
+            print(f"{state['trialId']}: ", end="")
+            record_pass_response(state, pass_num, response)
+            still_active.append(state)
+        active = still_active
+
+    for state in states:
+        analyses_by_trial[state['trialId']] = finish_trial(state, execution_mode="message-batches")
+    return [analyses_by_trial[trial_id] for trial_id in trial_ids]
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description=f"{WORKFLOW_TITLE} - Trial Analysis Script",
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog=f"Example: python {Path(__file__).name} mousa-g1"
+        epilog=f"Example: python {Path(__file__).name} mousa-g1\n"
+               f"Example: python {Path(__file__).name} mousa-g1 mousa-g2 --batch"
     )
-    parser.add_argument("trial_id", help="Trial ID to analyze")
+    parser.add_argument("trial_ids", nargs="+", help="Trial ID(s) to analyze")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit each pass for all trials as one Message Batch (half price, higher latency)")
+    parser.add_argument("--poll-seconds", type=int, default=DEFAULT_BATCH_POLL_SECONDS,
+                        help=f"Seconds between batch status polls (default: {DEFAULT_BATCH_POLL_SECONDS})")
+    parser.add_argument("--base-url", help="Anthropic API base URL (e.g. a local stand-in server)")
+    parser.add_argument("--no-files-api", action="store_true",
+                        help="Send documents inline as base64 instead of uploading them through the Files API")
+    parser.add_argument("--playbook-budget", type=int, default=PLAYBOOK_TEXT_BUDGET_CHARS,
+                        help=f"Most characters of playbook page text to attach with --playbook-sections "
+                             f"(default: {PLAYBOOK_TEXT_BUDGET_CHARS})")
+    parser.add_argument("--playbook-sections", nargs="+",
+                        help="Attach the playbook pages from these sections (substring match); "
+                             "without it the playbook is not attached")
+    add_force_arguments(parser)
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
 
     # Check for API key
     if not os.environ.get("ANTHROPIC_API_KEY"):
@@ -260,17 +480,27 @@ if __name__ == "__main__":
         print("  export ANTHROPIC_API_KEY=your_key_here")
         sys.exit(1)
 
-    # Show available trials if trial not found
-    try:
-        paths = setup_paths(args.trial_id)
-    except FileNotFoundError:
-        print(f"Error: Trial '{args.trial_id}' not found")
-        print("\nAvailable trials:")
-        trials_dir = Path(__file__).parent.parent / "data" / "trials"
-        if trials_dir.exists():
-            for trial_dir in sorted(trials_dir.iterdir()):
-                if trial_dir.is_dir():
-                    print(f"  - {trial_dir.name}")
-        sys.exit(1)
-
-    analyze_trial(args.trial_id)
+    # Show available trials if a trial is not found
+    for trial_id in args.trial_ids:
+        try:
+            setup_paths(trial_id)
+        except FileNotFoundError:
+            print(f"Error: Trial '{trial_id}' not found")
+            print("\nAvailable trials:")
+            trials_dir = Path(__file__).parent.parent / "data" / "trials"
+            if trials_dir.exists():
+                for trial_dir in sorted(trials_dir.iterdir()):
+                    if trial_dir.is_dir():
+                        print(f"  - {trial_dir.name}")
+            sys.exit(1)
+
+    client = create_client(base_url=args.base_url)
+    if args.batch:
+        analyze_trials_batch(args.trial_ids, client=client, poll_seconds=args.poll_seconds,
+                             use_files_api=not args.no_files_api, playbook_budget=args.playbook_budget,
+                             playbook_sections=args.playbook_sections, force=args.force)
+    else:
+        for trial_id in args.trial_ids:
+            analyze_trial(trial_id, client=client, use_files_api=not args.no_files_api,
+                          playbook_budget=args.playbook_budget, playbook_sections=args.playbook_sections,
+                          force=args.force)
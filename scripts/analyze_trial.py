@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 """
 Trial Analysis Script using Gemini 2.5 Pro
-Usage: python analyze_trial.py <trial_id> [--passes N]
+Usage: python analyze_trial.py <trial_id> [--passes N] [--early-stop]
 Example: python analyze_trial.py mousa-g1
 Example: python analyze_trial.py mousa-g1 --passes 10
+Example: python analyze_trial.py mousa-g1 --passes 10 --early-stop --patience 2
+Example: python analyze_trial.py mousa-g1 --passes 10 --resume
+
+Completed passes are checkpointed, so --resume after a failed run redoes only
+the passes it missed. The trial is skipped when ai-analysis.json was made from
+the same inputs (transcript, prompt assets, prompt, model and settings), unless
+--force.
 
 Requirements:
     pip install google-genai
@@ -21,18 +28,47 @@ from google import genai
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent / "lib"))
+from analysis_utils import (
+    get_data_dir,
+    start_run,
+    add_cache_arguments,
+    apply_cache_arguments,
+    add_trace_arguments,
+    apply_trace_arguments,
+    add_performance_metrics,
+    write_trace
+)
+from upload_registry import get_or_upload
+from model_calls import gemini_generate
+from tracing import span
+from early_stopping import new_tracker_for, update_early_stop, add_early_stop_arguments, early_stop_from_arguments
+from issue_dedupe import dedupe_issues
+from findings_digest import build_findings_digest, DEFAULT_TOKEN_BUDGET
+from input_fingerprint import find_current_analysis, add_force_arguments
+from issue_stream import parse_issues_salvaging, is_complete_issue_response, open_live_sidecar, IssueStream
+from pass_journal import open_journal, completed_pass, record_pass, close_journal, add_resume_arguments
+
 # Load environment variables from .env file
 load_dotenv()
 
+# How later passes learn about earlier findings: "digest" adds a compact
+# timestamp|theme|quote-prefix list under a token budget, "full" pastes every
+# prior issue as JSON, "none" runs each pass independently and relies on the
+# local dedupe after the passes
+PRIOR_FINDINGS_MODES = ("digest", "full", "none")
+DEFAULT_PRIOR_FINDINGS = "digest"
+
 # Setup paths
 PROJECT_ROOT = Path(__file__).parent.parent
-DATA_DIR = PROJECT_ROOT / "data"
+DATA_DIR = get_data_dir()
 TRIALS_DIR = DATA_DIR / "trials"
 PROMPT_ASSETS_DIR = DATA_DIR / "prompt-assets"
 
-def load_file_for_gemini(client, file_path):
-    """Upload file to Gemini for processing"""
-    return client.files.upload(file=file_path)
+def load_file_for_gemini(client, file_path, run=None):
+    """Upload file to Gemini for processing (reusing live uploads)"""
+    return get_or_upload(client, file_path, run=run)
 
 def load_prompt():
     """Load the analysis prompt"""
@@ -40,10 +76,25 @@ def load_prompt():
     with open(prompt_path, 'r') as f:
         return f.read()
 
-def analyze_trial(trial_id, num_passes=3):
-    """Analyze a trial using Gemini API"""
+def analyze_trial(trial_id, num_passes=3, prior_findings=DEFAULT_PRIOR_FINDINGS,
+                  digest_tokens=DEFAULT_TOKEN_BUDGET, client=None, early_stop=None, resume=False, force=False):
+    """Analyze a trial using Gemini API
+
+    early_stop ({'minNewIssues', 'patience'}) stops once passes stop adding
+    new distinct issues. Completed passes are checkpointed; resume reuses
+    those from an earlier run with the same configuration. The trial is
+    skipped when its ai-analysis.json has the same inputs, unless force.
+    """
     print(f"Analyzing trial: {trial_id} with {num_passes} passes")
 
+    run = start_run(trial_id, "analyze-trial", {
+        "prompt": "analysis-prompt",
+        "passes": num_passes,
+        "priorFindings": prior_findings,
+        "digestTokenBudget": digest_tokens,
+        "earlyStop": early_stop
+    })
+
     # Check trial directory exists
     trial_dir = TRIALS_DIR / trial_id
     if not trial_dir.exists():
@@ -59,34 +110,65 @@ def analyze_trial(trial_id, num_passes=3):
     # Load prompt assets
     guidebook_path = PROMPT_ASSETS_DIR / "annotation-guidebook-v0.2.pdf"
     playbook_path = PROMPT_ASSETS_DIR / "trial-delivery-playbook-G2-US.pdf"
+    output_path = trial_dir / "ai-analysis.json"
+
+    # Skip the trial if its last analysis was made from these same inputs
+    current_analysis = find_current_analysis(
+        run, {'transcript': transcript_path, 'guidebook': guidebook_path, 'playbook': playbook_path},
+        PROMPT_ASSETS_DIR / "analysis-prompt.txt", "gemini-2.5-pro", force=force, analysis_path=output_path
+    )
+    if current_analysis:
+        return current_analysis
 
-    # Initialize Gemini client
-    print("Initializing Gemini client...")
-    client = genai.Client()
+    # Initialize Gemini client (benchmarks pass in a simulated one)
+    if client is None:
+        print("Initializing Gemini client...")
+        client = genai.Client()
 
     print("Uploading files to Gemini...")
-    transcript_file = load_file_for_gemini(client, transcript_path)
-    guidebook_file = load_file_for_gemini(client, guidebook_path)
-    playbook_file = load_file_for_gemini(client, playbook_path)
+    transcript_file = load_file_for_gemini(client, transcript_path, run=run)
+    guidebook_file = load_file_for_gemini(client, guidebook_path, run=run)
+    playbook_file = load_file_for_gemini(client, playbook_path, run=run)
 
     # Load prompt
     base_prompt = load_prompt()
 
+    # Completed passes are checkpointed as they finish; issues stream to a live sidecar
+    journal = open_journal(run, resume=resume)
+    sidecar = open_live_sidecar(run)
+
     # Multi-pass analysis
     all_issues = []
     pass_responses = []
+    yield_tracker = new_tracker_for(early_stop)
 
     for pass_num in range(1, num_passes + 1):
         print(f"\n{'='*60}")
         print(f"PASS {pass_num}/{num_passes}")
         print(f"{'='*60}")
 
+        resumed = completed_pass(journal, pass_num)
+        if resumed:
+            parsed_issues, pass_detail = resumed
+            sidecar.append(parsed_issues)
+            print(f"✓ Pass {pass_num} resumed from checkpoint: {len(parsed_issues)} issues")
+            all_issues.extend(parsed_issues)
+            pass_responses.append(pass_detail)
+            stop_reason = update_early_stop(yield_tracker, pass_detail, parsed_issues)
+            if stop_reason:
+                print(f"\n⚠ Stopping early after pass {pass_num}: {stop_reason}")
+                break
+            continue
+
         # Build prompt for this pass
-        if pass_num == 1:
+        if pass_num == 1 or prior_findings == "none":
             prompt = base_prompt
         else:
             # For passes 2 and 3, add instruction to exclude previous issues
-            previous_issues_summary = json.dumps(all_issues, indent=2)
+            if prior_findings == "digest":
+                previous_issues_summary = build_findings_digest(all_issues, token_budget=digest_tokens)
+            else:
+                previous_issues_summary = json.dumps(all_issues, indent=2)
             prompt = f"""{base_prompt}
 
 IMPORTANT: This is Pass {pass_num} of the analysis. You have already identified the following issues in previous passes:
@@ -99,29 +181,27 @@ DO NOT include any of these previously identified issues again. Find NEW issues
         print(f"Calling Gemini API (Pass {pass_num})...")
 
         # Generate analysis with multimodal input
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
+        response = gemini_generate(
+            client,
+            "gemini-2.5-pro",
             contents=[
                 guidebook_file,
                 playbook_file,
                 prompt,
                 transcript_file
             ],
+            run=run,
+            cache_salt=pass_num,
+            label=f"pass-{pass_num}",
+            on_text=IssueStream(sidecar, {"analysisPass": pass_num}),
+            validate=is_complete_issue_response
         )
 
-        # Parse response
+        # Parse response (a truncated response keeps the issues that closed)
+        stop_reason = None
         try:
-            # Clean response if it has markdown code blocks
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            parsed_issues = json.loads(response_text)
+            with span(run, "parse", label=f"pass-{pass_num}"):
+                parsed_issues, truncated = parse_issues_salvaging(response['text'])
 
             # Add pass metadata to each issue
             for issue in parsed_issues:
@@ -132,17 +212,33 @@ DO NOT include any of these previously identified issues again. Find NEW issues
             pass_responses.append({
                 "pass": pass_num,
                 "issuesFound": len(parsed_issues),
-                "rawResponse": response.text[:500] + "..."
+                "performance": response['performance'],
+                "rawResponse": response['text'][:500] + "..."
             })
+            if truncated:
+                print(f"⚠ Pass {pass_num} response was cut off ({truncated}); kept the issues that closed")
+                pass_responses[-1]["truncated"] = truncated
+            record_pass(journal, pass_num, parsed_issues, pass_responses[-1])
+            stop_reason = update_early_stop(yield_tracker, pass_responses[-1], parsed_issues)
 
         except json.JSONDecodeError as e:
             print(f"✗ Warning: Could not parse Pass {pass_num} response as JSON: {e}")
             pass_responses.append({
                 "pass": pass_num,
                 "error": f"Invalid JSON response: {str(e)}",
-                "rawResponse": response.text[:500] + "..."
+                "performance": response['performance'],
+                "rawResponse": response['text'][:500] + "..."
             })
 
+        if stop_reason:
+            print(f"\n⚠ Stopping early after pass {pass_num}: {stop_reason}")
+            break
+
+    # Merge issues that several passes reported for the same moment
+    all_issues, duplicates_merged = dedupe_issues(all_issues)
+    if duplicates_merged:
+        print(f"\nMerged {duplicates_merged} duplicate issue(s) across passes")
+
     # Compile final analysis result
     analysis_result = {
         "analysisId": f"analysis-{trial_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
@@ -150,16 +246,33 @@ DO NOT include any of these previously identified issues again. Find NEW issues
         "timestamp": datetime.now().isoformat(),
         "modelVersion": "gemini-2.5-pro",
         "analysisMethod": f"multi-pass-{num_passes}x",
+        "configuration": {
+            "passes": num_passes,
+            "priorFindings": prior_findings,
+            "digestTokenBudget": digest_tokens if prior_findings == "digest" else None,
+            "earlyStop": early_stop
+        },
         "status": "completed" if len(all_issues) > 0 else "failed",
         "issues": all_issues,
-        "passDetails": pass_responses
+        "passDetails": pass_responses,
+        "metrics": {
+            "totalIssuesFound": len(all_issues),
+            "duplicatesMerged": duplicates_merged,
+            "passesRun": len(pass_responses),
+            "passesResumed": sum(1 for detail in pass_responses if detail.get('resumed'))
+        },
+        "inputFingerprint": run['inputFingerprint']
     }
 
+    add_performance_metrics(analysis_result, run)
+
     # Save analysis
-    output_path = trial_dir / "ai-analysis.json"
     print(f"Saving analysis to: {output_path}")
-    with open(output_path, 'w') as f:
-        json.dump(analysis_result, f, indent=2)
+    with span(run, "save", file=output_path.name):
+        with open(output_path, 'w') as f:
+            json.dump(analysis_result, f, indent=2)
+    write_trace(run, output_path)
+    close_journal(journal, pass_responses)
 
     print(f"\n{'='*60}")
     print("ANALYSIS COMPLETE!")
@@ -168,6 +281,8 @@ DO NOT include any of these previously identified issues again. Find NEW issues
     print(f"  Trial ID: {trial_id}")
     print(f"  Output: {output_path}")
     print(f"  Analysis Method: {num_passes}-Pass Multi-Pass")
+    if len(pass_responses) < num_passes:
+        print(f"  Passes Run: {len(pass_responses)} (stopped early)")
     print(f"  Total Issues Found: {len(all_issues)}")
     print(f"\nIssues by Pass:")
     for detail in pass_responses:
@@ -183,12 +298,23 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Trial Analysis Script using Gemini 2.5 Pro",
         formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="Example: python analyze_trial.py mousa-g1 --passes 10"
+        epilog="Example: python analyze_trial.py mousa-g1 --passes 10 --early-stop"
     )
     parser.add_argument("trial_id", help="Trial ID to analyze")
     parser.add_argument("--passes", type=int, default=3, help="Number of analysis passes (default: 3)")
+    parser.add_argument("--prior-findings", choices=PRIOR_FINDINGS_MODES, default=DEFAULT_PRIOR_FINDINGS,
+                        help=f"How later passes are told about earlier findings (default: {DEFAULT_PRIOR_FINDINGS})")
+    parser.add_argument("--digest-tokens", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f"Token budget for the prior-findings digest (default: {DEFAULT_TOKEN_BUDGET})")
+    add_early_stop_arguments(parser)
+    add_resume_arguments(parser)
+    add_force_arguments(parser)
+    add_cache_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    apply_cache_arguments(args)
+    apply_trace_arguments(args)
 
     # Show available trials if trial not found
     trial_dir = TRIALS_DIR / args.trial_id
@@ -201,4 +327,6 @@ if __name__ == "__main__":
                     print(f"  - {trial_dir.name}")
         sys.exit(1)
 
-    analyze_trial(args.trial_id, args.passes)
+    analyze_trial(args.trial_id, args.passes, prior_findings=args.prior_findings,
+                  digest_tokens=args.digest_tokens, early_stop=early_stop_from_arguments(args), resume=args.resume,
+                  force=args.force)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Benchmark: run every workflow offline against simulated model clients
+Description: Runs each workflow over synthetic trials with fake Gemini/Anthropic
+clients (configurable latency, rate-limit errors, canned JSON responses) at each
+concurrency setting, and reports wall time, throughput, peak memory and model
+calls per trial. No network access or API spend.
+
+Usage: python benchmark_workflows.py [--workflows ID ...] [--concurrency N ...] [--trials N]
+Example: python benchmark_workflows.py --workflows gemini-25pro-by-theme --concurrency 1 4 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import tracemalloc
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import datetime
+
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent / "lib"))
+from analysis_utils import get_data_dir
+from fake_clients import FakeBehavior, LatencyModel, FakeGeminiClient, FakeAnthropicClient
+from transcript import write_transcript_index
+import response_cache
+import tracing
+import call_scheduler
+from analyze_batch import run_one_trial, summarize_run
+
+# ========== BENCHMARK CONFIGURATION ==========
+# Workflow ID -> module implementing analyze_trial(trial_id, client=None)
+BENCHMARK_WORKFLOWS = {
+    "analyze-trial": "analyze_trial",
+    "gemini-25pro-10x-fresh": "analyze_gemini_fresh",
+    "gemini-25pro-10x-shared": "analyze_gemini_shared",
+    "gemini-25pro-chunked-10min": "analyze_gemini_chunked",
+    "gemini-25pro-by-theme": "analyze_gemini_by_theme",
+    "sonnet-45-3x-shared": "analyze_sonnet_shared",
+}
+DEFAULT_CONCURRENCY = [1, 4]
+DEFAULT_TRIALS = 4
+# Simulated quota ceiling per model; high so the workflows, not the quota, are measured
+DEFAULT_REQUESTS_PER_MINUTE = 6000
+# Seconds between synthetic transcript segments
+SEGMENT_SECONDS = 10
+# Operations that count as model calls (as opposed to uploads/cache management)
+MODEL_CALL_OPERATIONS = (
+    "models.generate_content",
+    "models.generate_content_stream",
+    "messages.create",
+    "messages.stream",
+)
+# =============================================
+
+
+def minimal_pdf(lines):
+    """Bytes of a valid one-page PDF showing lines of text
+
+    Fixtures must parse cleanly: a malformed PDF makes pypdf log recovery
+    warnings and slows whichever workflow reads it, skewing timings.
+    """
+    def escape(line):
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    stream = "BT /F1 12 Tf 14 TL 72 720 Td " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{obj}\nendobj\n".encode('latin-1')
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def create_fake_data_dir(root, scenario_id, num_trials, transcript_minutes, requests_per_minute):
+    """Lay out synthetic trials and prompt assets under root
+
+    File contents include the scenario ID so every scenario starts cold (its
+    own uploads and static cache) instead of reusing an earlier scenario's.
+    """
+    assets_dir = root / "prompt-assets"
+    assets_dir.mkdir(parents=True)
+
+    # Quota ceiling picked up by the call scheduler for every model
+    with open(root / "quota-limits.json", 'w') as f:
+        json.dump({model_prefix: {'requestsPerMinute': requests_per_minute}
+                   for model_prefix in call_scheduler.MODEL_LIMITS}, f)
+    for asset_name in ("annotation-guidebook-v0.2.pdf", "trial-delivery-playbook-G2-US.pdf"):
+        (assets_dir / asset_name).write_bytes(minimal_pdf(["1. Overview", f"benchmark {scenario_id} {asset_name}"]))
+
+    # The legacy analyze_trial.py reads its prompt from the prompt assets
+    real_prompt = get_data_dir() / "prompt-assets" / "analysis-prompt.txt"
+    (assets_dir / "analysis-prompt.txt").write_text(
+        real_prompt.read_text() if real_prompt.exists() else "Return a JSON array of issues."
+    )
+
+    segments = [
+        {
+            'startTime': start,
+            'endTime': start + SEGMENT_SECONDS,
+            'speaker': "Tutor" if (start // SEGMENT_SECONDS) % 2 == 0 else "Student",
+            'text': "so what do you think happens when we carry the one over to the tens column",
+        }
+        for start in range(0, transcript_minutes * 60, SEGMENT_SECONDS)
+    ]
+
+    trial_ids = [f"bench-{index + 1:03d}" for index in range(num_trials)]
+    for trial_id in trial_ids:
+        trial_dir = root / "trials" / trial_id
+        trial_dir.mkdir(parents=True)
+        transcript_path = trial_dir / "transcript.pdf"
+        transcript_path.write_bytes(minimal_pdf([f"benchmark {scenario_id} {trial_id}"]))
+        # Pre-built segment index, so the chunked workflow never needs pypdf here
+        write_transcript_index(transcript_path, segments)
+
+    return trial_ids
+
+
+def _run_trials(workflow_id, concurrency, trial_ids, args):
+    """Run the workflow over trial_ids with a fresh fake client, measuring time and memory"""
+    # analyze_trial.py resolves its data paths at import time
+    workflow = importlib.reload(importlib.import_module(BENCHMARK_WORKFLOWS[workflow_id]))
+
+    behavior = FakeBehavior(
+        latency=LatencyModel(args.latency_ms / 1000, args.latency_sigma),
+        rate_limit_rate=args.rate_limit_rate,
+        issues_per_response=args.issues_per_response,
+        transcript_seconds=args.transcript_minutes * 60,
+        seed=args.seed,
+    )
+    client_class = FakeAnthropicClient if workflow_id.startswith("sonnet") else FakeGeminiClient
+    client = client_class(behavior)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(sys.stdout if args.verbose else devnull):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            trial_records = list(executor.map(
+                lambda trial_id: run_one_trial(workflow, trial_id, client), trial_ids
+            ))
+    wall_seconds = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return trial_records, wall_seconds, peak_memory, behavior
+
+
+def run_scenario(workflow_id, concurrency, args, scenario_id):
+    """Run one workflow at one concurrency over fresh synthetic trials"""
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as data_root:
+        data_root = Path(data_root)
+        trial_ids = create_fake_data_dir(data_root, scenario_id, args.trials, args.transcript_minutes,
+                                         args.requests_per_minute)
+        os.environ["ANALYSIS_DATA_DIR"] = str(data_root)
+        # Each scenario starts with fresh concurrency limits and retry budget
+        call_scheduler.reset()
+        try:
+            trial_records, wall_seconds, peak_memory, behavior = _run_trials(
+                workflow_id, concurrency, trial_ids, args
+            )
+        finally:
+            os.environ.pop("ANALYSIS_DATA_DIR", None)
+
+    summary = summarize_run(workflow_id, concurrency, trial_records, wall_seconds)
+    model_calls = sum(behavior.counts.get(operation, 0) for operation in MODEL_CALL_OPERATIONS)
+    return {
+        "workflowId": workflow_id,
+        "concurrency": concurrency,
+        "trials": len(trial_ids),
+        "trialsFailed": summary["trialsFailed"],
+        "wallSeconds": summary["wallSeconds"],
+        "throughputTrialsPerHour": summary["throughputTrialsPerHour"],
+        "latencySeconds": summary["latencySeconds"],
+        "peakMemoryMB": round(peak_memory / (1024 * 1024), 2),
+        "modelCallsPerTrial": round(model_calls / len(trial_ids), 2),
+        "rateLimitedCalls": behavior.counts.get("rateLimited", 0),
+        "issuesFound": sum(record.get("issuesFound", 0) for record in trial_records),
+        "clientOperations": dict(sorted(behavior.counts.items())),
+        "failures": summary["failures"],
+    }
+
+
+def save_benchmark(results, settings, results_dir):
+    """Save benchmark results under data/benchmarks"""
+    results_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    output_path = results_dir / f"benchmark-{timestamp}.json"
+
+    with open(output_path, 'w') as f:
+        json.dump({"timestamp": datetime.now().isoformat(), "settings": settings, "results": results}, f, indent=2)
+
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark - run workflows offline against simulated model clients",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"Example: python {Path(__file__).name} --workflows gemini-25pro-by-theme --concurrency 1 4 8"
+    )
+    parser.add_argument("--workflows", nargs="+", choices=sorted(BENCHMARK_WORKFLOWS),
+                        default=list(BENCHMARK_WORKFLOWS), help="Workflows to benchmark (default: all)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Trial concurrency settings to compare (default: {' '.join(map(str, DEFAULT_CONCURRENCY))})")
+    parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS,
+                        help=f"Synthetic trials per scenario (default: {DEFAULT_TRIALS})")
+    parser.add_argument("--transcript-minutes", type=int, default=60,
+                        help="Length of each synthetic transcript (default: 60)")
+    parser.add_argument("--latency-ms", type=float, default=50,
+                        help="Median simulated call latency in milliseconds (default: 50)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Log-normal spread of the call latency (default: 0.5)")
+    parser.add_argument("--requests-per-minute", type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"Simulated quota ceiling per model (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fraction of calls that fail with a simulated 429 (default: 0)")
+    parser.add_argument("--issues-per-response", type=int, default=3,
+                        help="Issues in each canned response (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--verbose", action="store_true", help="Show the workflows' own output")
+
+    args = parser.parse_args()
+
+    if min(args.concurrency) < 1 or args.trials < 1:
+        parser.error("--concurrency and --trials must be at least 1")
+
+    # Measure the workflows, not the response cache or tracing
+    response_cache.configure(enabled=False, refresh=False)
+    tracing.configure(enabled=False)
+    results_dir = get_data_dir() / "benchmarks"
+
+    print(f"{'='*60}")
+    print("BENCHMARK: simulated model clients")
+    print(f"{'='*60}")
+    print(f"Workflows: {len(args.workflows)}")
+    print(f"Concurrency: {', '.join(map(str, args.concurrency))}")
+    print(f"Trials per scenario: {args.trials}")
+    print(f"Latency: {args.latency_ms}ms median (sigma {args.latency_sigma})")
+    print(f"Rate-limit rate: {args.rate_limit_rate}")
+    print(f"{'='*60}\n")
+
+    results = []
+    for workflow_id in args.workflows:
+        for concurrency in args.concurrency:
+            scenario_id = f"{workflow_id}-c{concurrency}"
+            result = run_scenario(workflow_id, concurrency, args, scenario_id)
+            results.append(result)
+            marker = "✗" if result["trialsFailed"] else "✓"
+            print(f"{marker} {workflow_id} @ {concurrency}: {result['wallSeconds']}s, "
+                  f"{result['throughputTrialsPerHour']} trials/h, {result['peakMemoryMB']} MB peak, "
+                  f"{result['modelCallsPerTrial']} calls/trial"
+                  + (f", {result['trialsFailed']} failed" if result["trialsFailed"] else ""))
+
+    output_path = save_benchmark(results, vars(args), results_dir)
+
+    print(f"\n{'='*60}")
+    print("BENCHMARK COMPLETE!")
+    print(f"{'='*60}")
+    print(f"Results saved to: {output_path}")
+
+    sys.exit(1 if any(result["trialsFailed"] for result in results) else 0)
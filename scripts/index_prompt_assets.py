@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Prompt-Asset Ingestion: per-page text and section indexes for the asset PDFs
+Description: Writes <stem>.pages.json under data/prompt-assets/derived for the
+playbook and guidebook, so workflows can attach only the pages they need.
+Assets whose index already matches the PDF hash are skipped.
+
+Usage: python index_prompt_assets.py [--sections SECTION ...] [--subset-pdf]
+Example: python index_prompt_assets.py --sections "Warm Up" --subset-pdf
+
+Requirements:
+    pip install pypdf
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent / "lib"))
+from analysis_utils import get_data_dir
+from document_pages import ensure_page_index, load_page_index, select_pages, write_page_subset
+
+ASSET_FILENAMES = ["trial-delivery-playbook-G2-US.pdf", "annotation-guidebook-v0.2.pdf"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prompt-Asset Ingestion - build page indexes for the prompt-asset PDFs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"Example: python {Path(__file__).name} --sections \"Warm Up\" --subset-pdf"
+    )
+    parser.add_argument("--sections", nargs="+", help="Sections to select when writing a subset PDF")
+    parser.add_argument("--subset-pdf", action="store_true",
+                        help="Also write a PDF of the selected pages (all pages without --sections)")
+    parser.add_argument("--drop-images", action="store_true",
+                        help="Strip images from the subset PDF")
+
+    args = parser.parse_args()
+
+    assets_dir = get_data_dir() / "prompt-assets"
+    failures = 0
+    for asset_filename in ASSET_FILENAMES:
+        asset_path = assets_dir / asset_filename
+        if not asset_path.exists():
+            print(f"⚠ {asset_filename}: not found, skipping")
+            continue
+        try:
+            rebuilt = ensure_page_index(asset_path)
+            index = load_page_index(asset_path)
+            status = "indexed" if rebuilt else "up to date"
+            print(f"✓ {asset_filename}: {status} ({index['pageCount']} pages, {len(index['sections'])} sections)")
+            for section, pages in index['sections'].items():
+                print(f"    {section}: pages {', '.join(str(page) for page in pages)}")
+
+            if args.subset_pdf:
+                page_numbers = select_pages(index, sections=args.sections)
+                if not page_numbers:
+                    failures += 1
+                    print(f"✗ {asset_filename}: no section matches {', '.join(args.sections)}; "
+                          f"available sections: {', '.join(index['sections']) or 'none'}")
+                    continue
+                subset_path = write_page_subset(asset_path, page_numbers, drop_images=args.drop_images)
+                print(f"  ✓ Subset of {len(page_numbers)} pages: {subset_path} "
+                      f"({subset_path.stat().st_size / (1024 * 1024):.1f} MB)")
+        except Exception as e:
+            failures += 1
+            print(f"✗ {asset_filename}: {e}")
+
+    sys.exit(1 if failures else 0)
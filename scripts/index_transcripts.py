@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Transcript Ingestion: pre-parse transcript.pdf for every trial
+Description: Writes transcript.segments.json and transcript.segments.idx next to
+each trial's transcript. Trials whose artifacts already match the PDF hash are skipped.
+
+Usage: python index_transcripts.py [trial_id ...]
+Example: python index_transcripts.py mousa-g1
+
+Requirements:
+    pip install pypdf
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add lib to path
+sys.path.insert(0, str(Path(__file__).parent / "lib"))
+from analysis_utils import setup_paths, list_trials
+from transcript import ensure_transcript_index, load_transcript_segments, transcript_duration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Transcript Ingestion - build transcript segment indexes",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"Example: python {Path(__file__).name} mousa-g1"
+    )
+    parser.add_argument("trial_ids", nargs="*", help="Trial IDs to index (default: every trial under data/trials)")
+
+    args = parser.parse_args()
+
+    trial_ids = args.trial_ids or list_trials()
+    if not trial_ids:
+        print("No trials found under data/trials")
+        sys.exit(1)
+
+    failures = 0
+    for trial_id in trial_ids:
+        try:
+            paths = setup_paths(trial_id)
+            rebuilt = ensure_transcript_index(paths['transcript'])
+            segments = load_transcript_segments(paths['transcript'])
+            status = "indexed" if rebuilt else "up to date"
+            print(f"✓ {trial_id}: {status} ({len(segments)} segments, "
+                  f"{transcript_duration(segments) / 60:.1f} minutes)")
+        except Exception as e:
+            failures += 1
+            print(f"✗ {trial_id}: {e}")
+
+    sys.exit(1 if failures else 0)
@@ -2,15 +2,45 @@
 Shared utilities for trial analysis scripts
 """
 
+import os
 import json
+import hashlib
+import threading
 from pathlib import Path
 from datetime import datetime
 
+_hash_memo = {}
+_hash_memo_lock = threading.Lock()
+
+
+def get_data_dir():
+    """Get the root data directory (trials, prompt assets, run outputs)
+
+    ANALYSIS_DATA_DIR overrides the default <project>/data, e.g. for benchmarks.
+    """
+    if os.environ.get("ANALYSIS_DATA_DIR"):
+        return Path(os.environ["ANALYSIS_DATA_DIR"])
+    PROJECT_ROOT = Path(__file__).parent.parent.parent
+    return PROJECT_ROOT / "data"
+
+
+def list_trials():
+    """List the IDs of all trials under data/trials that have a transcript"""
+    TRIALS_DIR = get_data_dir() / "trials"
+    if not TRIALS_DIR.exists():
+        return []
+
+    return [
+        trial_dir.name
+        for trial_dir in sorted(TRIALS_DIR.iterdir())
+        if trial_dir.is_dir() and (trial_dir / "transcript.pdf").exists()
+    ]
+
 
 def setup_paths(trial_id):
     """Get all relevant paths for a trial"""
     PROJECT_ROOT = Path(__file__).parent.parent.parent
-    DATA_DIR = PROJECT_ROOT / "data"
+    DATA_DIR = get_data_dir()
     TRIALS_DIR = DATA_DIR / "trials"
     PROMPT_ASSETS_DIR = DATA_DIR / "prompt-assets"
 
@@ -30,12 +60,16 @@ def setup_paths(trial_id):
     }
 
 
-def load_prompt(prompt_id):
-    """Load a prompt by its ID"""
+def prompt_path_for(prompt_id):
+    """Path of the prompt file for a prompt ID"""
     PROJECT_ROOT = Path(__file__).parent.parent.parent
     PROMPTS_DIR = PROJECT_ROOT / "prompts"
+    return PROMPTS_DIR / f"prompt-{prompt_id}.txt"
 
-    prompt_path = PROMPTS_DIR / f"prompt-{prompt_id}.txt"
+
+def load_prompt(prompt_id):
+    """Load a prompt by its ID"""
+    prompt_path = prompt_path_for(prompt_id)
 
     if not prompt_path.exists():
         raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
@@ -44,25 +78,139 @@ def load_prompt(prompt_id):
         return f.read()
 
 
-def upload_files_gemini(client, paths, include_playbook=True):
-    """Upload files to Gemini"""
+def file_sha256(file_path):
+    """SHA-256 of a file's contents, memoized per (path, size, mtime)"""
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    memo_key = (str(file_path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    with _hash_memo_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+def upload_files_gemini(client, paths, include_playbook=True, run=None):
+    """Upload files to Gemini, reusing live uploads from the upload registry"""
+    from upload_registry import get_or_upload
+
     print("Uploading files to Gemini...")
 
     files = {
-        'transcript': client.files.upload(file=paths['transcript']),
-        'guidebook': client.files.upload(file=paths['guidebook'])
+        'transcript': get_or_upload(client, paths['transcript'], run=run),
+        'guidebook': get_or_upload(client, paths['guidebook'], run=run)
     }
 
     if include_playbook:
-        files['playbook'] = client.files.upload(file=paths['playbook'])
+        files['playbook'] = get_or_upload(client, paths['playbook'], run=run)
 
     return files
 
 
-def save_analysis(analysis_result, trial_id, workflow_id):
-    """Save analysis with proper naming convention"""
+def start_run(trial_id, workflow_id, configuration):
+    """Describe one workflow run on one trial; passed to every model call"""
+    from tracing import new_tracer
+
+    return {
+        'trialId': trial_id,
+        'workflowId': workflow_id,
+        'configuration': configuration,
+        'calls': [],
+        'tracer': new_tracer(f"{workflow_id} {trial_id}"),
+    }
+
+
+def parse_issues_json(response_text):
+    """Strip markdown code fences from a model response and parse the issue list"""
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    response_text = response_text.strip()
+
+    return json.loads(response_text)
+
+
+def add_cache_arguments(parser):
+    """Add the response cache switches shared by every workflow script"""
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the on-disk response cache entirely")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached responses, but store the fresh ones")
+
+
+def apply_cache_arguments(args):
+    """Configure the response cache from parsed command line arguments"""
+    import response_cache
+    response_cache.configure(enabled=not args.no_cache, refresh=args.refresh)
+
+
+def add_trace_arguments(parser):
+    """Add the --trace switch shared by every workflow script"""
+    parser.add_argument("--trace", action="store_true",
+                        help="Write stage timing spans to <analysis>.trace.json (Chrome trace format)")
+
+
+def apply_trace_arguments(args):
+    """Enable tracing from parsed command line arguments"""
+    import tracing
+    tracing.configure(enabled=args.trace)
+
+
+def write_trace(run, output_path):
+    """Write the run's spans next to output_path; returns the trace path or None"""
+    from tracing import trace_path_for
+
+    if run is None or run.get('tracer') is None:
+        return None
+    trace_path = run['tracer'].write(trace_path_for(Path(output_path)))
+    print(f"Trace saved to: {trace_path}")
+    return trace_path
+
+
+def add_performance_metrics(analysis_result, run):
+    """Sum the run's per-call records into analysis_result['metrics']['performance']"""
+    from performance import summarize_performance
+
+    issues_found = len(analysis_result.get('issues', []))
+    performance = summarize_performance(run.get('calls', []), issues_found)
+    analysis_result.setdefault('metrics', {})['performance'] = performance
+
+    if performance['costUsd'] is not None:
+        print(f"Cost: ${performance['costUsd']:.4f} over {performance['calls']} calls "
+              f"({performance['modelSeconds']:.1f}s model time)")
+    return performance
+
+
+def save_analysis(analysis_result, trial_id, workflow_id, run=None):
+    """Save analysis with proper naming convention
+
+    With the run passed in, its per-call records are summed into
+    metrics.performance and its input fingerprint (if taken) is recorded
+    before writing, and a traced run's spans are written alongside as
+    <analysis>.trace.json.
+    """
+    from tracing import span
+
     paths = setup_paths(trial_id)
 
+    if run is not None:
+        add_performance_metrics(analysis_result, run)
+        # Lets later runs skip this trial while its inputs stay the same
+        if run.get('inputFingerprint'):
+            analysis_result['inputFingerprint'] = run['inputFingerprint']
+
     # Create analyses directory if it doesn't exist
     paths['analyses_dir'].mkdir(exist_ok=True)
 
@@ -72,13 +220,16 @@ def save_analysis(analysis_result, trial_id, workflow_id):
     output_path = paths['analyses_dir'] / filename
 
     # Save JSON
-    with open(output_path, 'w') as f:
-        json.dump(analysis_result, f, indent=2)
+    with span(run, "save", file=filename):
+        with open(output_path, 'w') as f:
+            json.dump(analysis_result, f, indent=2)
 
     print(f"\n{'='*60}")
     print(f"Analysis saved to: {output_path}")
     print(f"{'='*60}")
 
+    write_trace(run, output_path)
+
     return output_path
 
 
@@ -0,0 +1,211 @@
+"""
+Shared scheduler for rate-limited model calls
+
+Every model call goes through run_call(model, fn), which
+- waits on the model's token bucket (requests per minute), shared with every
+  other process on this machine through quota.SharedTokenBucket,
+- holds one slot of a per-model AIMD concurrency limit that halves on
+  throttling errors (429/503/529) and grows by one slot per window of
+  successful calls,
+- retries throttling and transient errors with full-jitter exponential
+  backoff, as long as the process-wide retry budget allows.
+The concurrency limit is per process; the request rate is shared across
+processes, so batch runs and simultaneous workflow scripts together stay just
+under quota instead of failing passes.
+"""
+
+import time
+import random
+import threading
+
+from quota import SharedTokenBucket, load_limit_overrides, normalize_model_name
+
+# Per-model limits, matched on model name prefix
+MODEL_LIMITS = {
+    'gemini-2.5-pro': {'requestsPerMinute': 150, 'initialConcurrency': 8, 'maxConcurrency': 32},
+    'claude-sonnet-4-5': {'requestsPerMinute': 50, 'initialConcurrency': 4, 'maxConcurrency': 16},
+}
+DEFAULT_LIMITS = {'requestsPerMinute': 60, 'initialConcurrency': 4, 'maxConcurrency': 16}
+
+THROTTLE_STATUS_CODES = {429, 503, 529}
+TRANSIENT_STATUS_CODES = {500, 502, 504}
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Retries allowed per successful call, plus a floor so a cold start can retry
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MINIMUM = 10
+
+
+def error_status(error):
+    """HTTP-ish status code of an SDK error (google-genai .code, anthropic .status_code)"""
+    for attribute in ('status_code', 'code'):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_throttle_error(error):
+    return error_status(error) in THROTTLE_STATUS_CODES
+
+
+def is_retryable_error(error):
+    """Throttling, 5xx and connection/timeout errors are worth retrying"""
+    status = error_status(error)
+    if status is not None:
+        return status in THROTTLE_STATUS_CODES or status in TRANSIENT_STATUS_CODES
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    error_name = type(error).__name__
+    return 'Connection' in error_name or 'Timeout' in error_name
+
+
+class AIMDLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease"""
+
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, outcome):
+        """Free a slot; outcome is 'success', 'throttled' or 'error'"""
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == 'success':
+                # +1 slot after roughly `limit` successful calls
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == 'throttled':
+                # Calls already in flight when the quota ran out fail together;
+                # halve once per burst rather than once per failure
+                now = time.monotonic()
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+
+class RetryBudget:
+    """Caps retries at a fraction of successful calls (plus a small floor)"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MINIMUM):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.successes = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+
+    def try_spend(self):
+        with self._lock:
+            if self.retries >= self.minimum + self.ratio * self.successes:
+                return False
+            self.retries += 1
+            return True
+
+
+class ModelScheduler:
+    """Token bucket plus AIMD limiter for one model"""
+
+    def __init__(self, model, limits):
+        self.model = model
+        self.bucket = SharedTokenBucket(
+            model,
+            rate=limits['requestsPerMinute'] / 60,
+            capacity=max(1, limits['initialConcurrency'])
+        )
+        self.limiter = AIMDLimiter(limits['initialConcurrency'], limits['maxConcurrency'])
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+_retry_budget = RetryBudget()
+
+
+def limits_for(model):
+    """Limits for a model: MODEL_LIMITS defaults plus data/quota-limits.json overrides"""
+    model = normalize_model_name(model)
+    limits = next(
+        (limits for model_prefix, limits in MODEL_LIMITS.items() if model_prefix in model),
+        DEFAULT_LIMITS
+    )
+    overrides = next(
+        (override for model_prefix, override in load_limit_overrides().items() if model_prefix in model),
+        {}
+    )
+    return {**limits, **overrides}
+
+
+def get_scheduler(model):
+    """The one scheduler for a model, however the caller spells its name"""
+    model = normalize_model_name(model)
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = ModelScheduler(model, limits_for(model))
+        return _schedulers[model]
+
+
+def reset():
+    """Forget per-model limiter state and the retry budget (e.g. between benchmark scenarios)"""
+    global _retry_budget
+    with _schedulers_lock:
+        _schedulers.clear()
+        _retry_budget = RetryBudget()
+
+
+def backoff_seconds(attempt):
+    """Full-jitter exponential backoff for the given (1-based) retry"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+def run_call(model, fn):
+    """Run fn() under the model's rate limits, retrying retryable errors
+
+    Returns (result, stats) where stats has 'attempts' and 'waitSeconds'
+    (time spent queued or backing off). Non-retryable errors, and retryable
+    ones once attempts or the retry budget run out, are raised.
+    """
+    scheduler = get_scheduler(model)
+    waited = 0.0
+    attempt = 0
+
+    while True:
+        attempt += 1
+        queued = time.perf_counter()
+        scheduler.limiter.acquire()
+        scheduler.bucket.acquire()
+        waited += time.perf_counter() - queued
+
+        try:
+            result = fn()
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            scheduler.limiter.release('throttled' if throttled else 'error')
+            if throttled:
+                scheduler.bucket.drain()
+            if not is_retryable_error(e) or attempt >= MAX_ATTEMPTS or not _retry_budget.try_spend():
+                raise
+            delay = backoff_seconds(attempt)
+            print(f"  ⚠ {model} call failed ({error_status(e) or type(e).__name__}), "
+                  f"retry {attempt}/{MAX_ATTEMPTS - 1} in {delay:.1f}s")
+            time.sleep(delay)
+            waited += delay
+            continue
+
+        scheduler.limiter.release('success')
+        _retry_budget.record_success()
+        return result, {'attempts': attempt, 'waitSeconds': round(waited, 3)}
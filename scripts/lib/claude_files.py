@@ -0,0 +1,154 @@
+"""
+Documents for Claude: Files API uploads with a base64 fallback
+
+Documents are uploaded once through Anthropic's Files API (beta) and referred
+to by file_id, so a multi-pass conversation does not re-send the PDF bytes
+on every pass. Uploads are recorded by SHA-256 in
+data/.cache/claude-files.json and reused across passes, workflows and
+processes. When the Files API is unavailable, the base64 encoding is read
+from data/.cache/base64/<sha256>.b64 (encoded once per file version).
+"""
+
+import json
+import base64
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from analysis_utils import get_data_dir, file_sha256
+from file_lock import locked
+from tracing import span
+
+FILES_API_BETA = "files-api-2025-04-14"
+
+# Uploads and encodings already resolved in this process, keyed by SHA-256
+_file_ids = {}
+_base64_memo = {}
+_upload_locks = {}
+_upload_locks_guard = threading.Lock()
+
+
+def _registry_path():
+    return get_data_dir() / ".cache" / "claude-files.json"
+
+
+def _base64_path(sha256):
+    return get_data_dir() / ".cache" / "base64" / f"{sha256}.b64"
+
+
+def _load_registry():
+    registry_path = _registry_path()
+    if not registry_path.exists():
+        return {}
+    try:
+        with open(registry_path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def _save_registry(registry):
+    registry_path = _registry_path()
+    tmp_path = registry_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(registry, f, indent=2)
+    tmp_path.replace(registry_path)
+
+
+def registered_file_hash(file_id):
+    """Look up the SHA-256 of a document uploaded in this process by its file_id, if known"""
+    for sha256, known_id in list(_file_ids.items()):
+        if known_id == file_id:
+            return sha256
+    return None
+
+
+def cached_base64(file_path):
+    """Base64 encoding of a file, encoded at most once per file version"""
+    sha256 = file_sha256(file_path)
+    if sha256 in _base64_memo:
+        return _base64_memo[sha256]
+
+    cache_path = _base64_path(sha256)
+    try:
+        encoded = cache_path.read_text()
+    except OSError:
+        with open(file_path, 'rb') as f:
+            encoded = base64.standard_b64encode(f.read()).decode('utf-8')
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(encoded)
+        tmp_path.replace(cache_path)
+
+    _base64_memo[sha256] = encoded
+    return encoded
+
+
+def get_or_upload_claude(client, file_path, run=None):
+    """Return the Files API file_id for file_path, uploading only when needed"""
+    file_path = Path(file_path)
+    with span(run, "upload", file=file_path.name) as span_args:
+        file_id, span_args['outcome'] = _get_or_upload_claude(client, file_path)
+    return file_id
+
+
+def _get_or_upload_claude(client, file_path):
+    """get_or_upload_claude without tracing; returns (file_id, outcome)"""
+    sha256 = file_sha256(file_path)
+
+    with _upload_locks_guard:
+        upload_lock = _upload_locks.setdefault(sha256, threading.Lock())
+
+    # Serialize per hash so concurrent trials share one upload of the guidebook
+    with upload_lock:
+        if sha256 in _file_ids:
+            return _file_ids[sha256], "memory"
+
+        with locked(_registry_path().with_suffix(".lock")):
+            entry = _load_registry().get(sha256)
+
+        if entry:
+            try:
+                client.beta.files.retrieve_metadata(entry['id'], betas=[FILES_API_BETA])
+                _file_ids[sha256] = entry['id']
+                print(f"  ↺ Reusing upload of {file_path.name}: {entry['id']}")
+                return entry['id'], "registry"
+            except Exception as e:
+                print(f"  ⚠ Registered upload of {file_path.name} is unusable ({e}), re-uploading")
+
+        with open(file_path, 'rb') as f:
+            uploaded = client.beta.files.upload(
+                file=(file_path.name, f, "application/pdf"),
+                betas=[FILES_API_BETA]
+            )
+
+        with locked(_registry_path().with_suffix(".lock")):
+            registry = _load_registry()
+            registry[sha256] = {
+                'id': uploaded.id,
+                'localPath': str(file_path),
+                'sizeBytes': file_path.stat().st_size,
+                'uploadedAt': datetime.now(timezone.utc).isoformat(),
+            }
+            _save_registry(registry)
+
+        _file_ids[sha256] = uploaded.id
+        print(f"  ✓ Uploaded {file_path.name}: {uploaded.id}")
+        return uploaded.id, "uploaded"
+
+
+def document_source(client, file_path, run=None, use_files_api=True):
+    """Source block for a PDF document: a Files API reference, else cached base64
+
+    Returns (source, uses_files_api); requests with Files API sources must
+    be sent with betas=[FILES_API_BETA].
+    """
+    if use_files_api:
+        try:
+            return {"type": "file", "file_id": get_or_upload_claude(client, file_path, run=run)}, True
+        except Exception as e:
+            print(f"  ⚠ Files API upload of {Path(file_path).name} failed ({e}), sending base64 instead")
+
+    with span(run, "encode_document", file=Path(file_path).name):
+        data = cached_base64(file_path)
+    return {"type": "base64", "media_type": "application/pdf", "data": data}, False
@@ -0,0 +1,211 @@
+"""
+Long-lived Gemini context caches for static prompt assets
+
+The guidebook and playbook never change between trials, so one cache per
+(model, asset hashes) is kept alive across trials and workflows, recorded in
+data/.cache/gemini-caches.json. Each acquisition extends the TTL when it is
+running low, so the cache stays warm for as long as a batch keeps using it;
+extend_static_caches does the same for callers that wait on a cache without
+acquiring it, such as a queued batch job.
+Per-trial content (the transcript) is sent with each request instead.
+"""
+
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.genai import types
+
+from analysis_utils import get_data_dir, file_sha256
+from file_lock import locked
+from upload_registry import get_or_upload
+from tracing import span
+
+STATIC_CACHE_TTL = timedelta(hours=2)
+# Extend the TTL whenever less than this much is left at acquisition time
+REFRESH_THRESHOLD = timedelta(minutes=45)
+# Gemini bills cached input tokens at 25% of the regular input price
+CACHED_TOKEN_DISCOUNT = 0.75
+
+_acquire_locks = {}
+_acquire_locks_guard = threading.Lock()
+
+
+def _registry_path():
+    return get_data_dir() / ".cache" / "gemini-caches.json"
+
+
+def _load_registry():
+    registry_path = _registry_path()
+    if not registry_path.exists():
+        return {}
+    try:
+        with open(registry_path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def _save_registry(registry):
+    registry_path = _registry_path()
+    tmp_path = registry_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(registry, f, indent=2)
+    tmp_path.replace(registry_path)
+
+
+def _update_registry(cache_key, entry):
+    with locked(_registry_path().with_suffix(".lock")):
+        registry = _load_registry()
+        now = datetime.now(timezone.utc)
+        registry = {
+            key: value for key, value in registry.items()
+            if datetime.fromisoformat(value['expiresAt']) > now
+        }
+        registry[cache_key] = entry
+        _save_registry(registry)
+
+
+def _ttl_string(ttl):
+    return f"{int(ttl.total_seconds())}s"
+
+
+def new_cache_stats():
+    """Fresh counters for one analysis run, reported under metrics.contextCache"""
+    return {
+        'cacheName': None,
+        'hits': 0,
+        'misses': 0,
+        'refreshes': 0,
+        'promptTokens': 0,
+        'cachedTokens': 0,
+    }
+
+
+def record_pass_usage(stats, pass_detail):
+    """Add a pass's prompt/cached token counts to the run's cache stats"""
+    stats['promptTokens'] += pass_detail.get('promptTokens', 0)
+    stats['cachedTokens'] += pass_detail.get('cachedTokens', 0)
+
+
+def summarize_cache_stats(stats):
+    """Cache stats with the cached-token savings filled in"""
+    summary = dict(stats)
+    summary['inputTokensSaved'] = int(stats['cachedTokens'] * CACHED_TOKEN_DISCOUNT)
+    summary['cachedTokenShare'] = (
+        round(stats['cachedTokens'] / stats['promptTokens'], 4) if stats['promptTokens'] else 0.0
+    )
+    return summary
+
+
+def cached_asset_hashes(cache_name):
+    """Look up the asset hashes behind a registered cache name, if known"""
+    with locked(_registry_path().with_suffix(".lock")):
+        registry = _load_registry()
+    for entry in registry.values():
+        if entry['name'] == cache_name:
+            return entry['assets']
+    return None
+
+
+def get_static_cache(client, model, asset_paths, stats=None, run=None):
+    """Get (or create) the shared cache holding the given static assets
+
+    asset_paths maps a label (e.g. 'guidebook') to a local file path. The cache
+    is keyed on the model and the SHA-256 of every asset.
+    """
+    with span(run, "cache_create", model=model, assets=sorted(asset_paths)) as span_args:
+        cached_content, span_args['outcome'] = _get_static_cache(client, model, asset_paths, stats, run)
+    return cached_content
+
+
+def _get_static_cache(client, model, asset_paths, stats, run):
+    """get_static_cache without tracing; returns (cached_content, outcome)"""
+    asset_hashes = {label: file_sha256(path) for label, path in sorted(asset_paths.items())}
+    cache_key = hashlib.sha256(
+        json.dumps({'model': model, 'assets': asset_hashes}, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+    with _acquire_locks_guard:
+        acquire_lock = _acquire_locks.setdefault(cache_key, threading.Lock())
+
+    with acquire_lock:
+        with locked(_registry_path().with_suffix(".lock")):
+            entry = _load_registry().get(cache_key)
+
+        now = datetime.now(timezone.utc)
+        if entry and datetime.fromisoformat(entry['expiresAt']) > now + timedelta(minutes=1):
+            try:
+                cached_content = client.caches.get(name=entry['name'])
+
+                refreshed = datetime.fromisoformat(entry['expiresAt']) - now < REFRESH_THRESHOLD
+                if refreshed:
+                    cached_content = client.caches.update(
+                        name=entry['name'],
+                        config=types.UpdateCachedContentConfig(ttl=_ttl_string(STATIC_CACHE_TTL))
+                    )
+                    entry['expiresAt'] = (now + STATIC_CACHE_TTL).isoformat()
+                    _update_registry(cache_key, entry)
+                    if stats is not None:
+                        stats['refreshes'] += 1
+                    print(f"  ↻ Extended static cache TTL: {entry['name']}")
+
+                print(f"  ✓ Static cache hit: {entry['name']}")
+                if stats is not None:
+                    stats['hits'] += 1
+                    stats['cacheName'] = entry['name']
+                return cached_content, "refreshed" if refreshed else "hit"
+            except Exception as e:
+                print(f"  ⚠ Registered cache {entry['name']} is unusable ({e}), recreating")
+
+        print(f"  ⚡ Creating static cache ({', '.join(asset_hashes)})...")
+        cached_content = client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[get_or_upload(client, path, run=run) for _, path in sorted(asset_paths.items())],
+                ttl=_ttl_string(STATIC_CACHE_TTL),
+                display_name=f"static-assets-{cache_key[:12]}"
+            )
+        )
+        _update_registry(cache_key, {
+            'name': cached_content.name,
+            'model': model,
+            'assets': asset_hashes,
+            'createdAt': now.isoformat(),
+            'expiresAt': (now + STATIC_CACHE_TTL).isoformat(),
+        })
+
+        print(f"  ✓ Static cache created: {cached_content.name}")
+        if stats is not None:
+            stats['misses'] += 1
+            stats['cacheName'] = cached_content.name
+        return cached_content, "created"
+
+
+def extend_static_caches(client, cache_names):
+    """Extend the TTL of the given registered caches when it is running low
+
+    For long waits that never acquire the caches, e.g. polling a batch job
+    that can sit in the queue for hours while its requests reference them.
+    """
+    with locked(_registry_path().with_suffix(".lock")):
+        registry = _load_registry()
+
+    now = datetime.now(timezone.utc)
+    for cache_key, entry in registry.items():
+        if entry['name'] not in cache_names:
+            continue
+        if datetime.fromisoformat(entry['expiresAt']) - now >= REFRESH_THRESHOLD:
+            continue
+        try:
+            client.caches.update(
+                name=entry['name'],
+                config=types.UpdateCachedContentConfig(ttl=_ttl_string(STATIC_CACHE_TTL))
+            )
+        except Exception as e:
+            print(f"  ⚠ Could not extend static cache {entry['name']} ({e})")
+            continue
+        entry['expiresAt'] = (now + STATIC_CACHE_TTL).isoformat()
+        _update_registry(cache_key, entry)
+        print(f"  ↻ Extended static cache TTL: {entry['name']}")
@@ -0,0 +1,279 @@
+"""
+Page-level subsets of the prompt-asset PDFs
+
+The playbook PDF is too large to attach whole for some providers (29MB, over
+Claude's request limits). This module splits a PDF into per-page text,
+indexes the pages by section, and caches the derived artifacts under
+data/prompt-assets/derived so workflows can attach only the pages (or page
+text) they need:
+
+- <stem>.pages.json: per-page text and section, plus a section -> pages map
+- <stem>.pages-<key>.pdf: a PDF holding only selected pages (optionally
+  without images), for providers that take documents rather than text
+- <stem>.themes-<key>.json: the pages defining and illustrating each theme
+  (guidebook), so per-theme passes can carry just those pages
+
+Artifacts record the source PDF's SHA-256 and are rebuilt when it changes.
+
+Requirements:
+    pip install pypdf
+"""
+
+import re
+import json
+import hashlib
+from pathlib import Path
+
+from analysis_utils import file_sha256
+
+DERIVED_DIRNAME = "derived"
+
+# Numbered or labelled headings ("3. Warm Up", "2.1 Slide Flow", "Section 4: ...")
+# and short ALL-CAPS lines count as section headings
+SECTION_HEADING_PATTERN = re.compile(
+    r'^\s*(?:(?:section|part|chapter)\s+\d+[.:]?\s+\S.*|\d+(?:\.\d+)*\.?\s+[A-Z]\S.*)$',
+    re.IGNORECASE
+)
+MAX_HEADING_CHARS = 80
+UNTITLED_SECTION = "Front Matter"
+# Pages kept per theme: where the theme is defined plus the pages that follow
+# (examples usually run onto the next page)
+MAX_THEME_PAGES = 3
+# Bumped when theme page selection changes, so cached theme indexes are rebuilt
+THEME_INDEX_VERSION = 2
+# A page titled "Contents", or where this share of its lines end in a page
+# number, is a contents page and never a theme's definition page
+CONTENTS_TITLE_PATTERN = re.compile(r'^\s*(?:table\s+of\s+)?contents\s*$', re.IGNORECASE)
+CONTENTS_ENTRY_SHARE = 0.4
+
+
+def _load_reader(pdf_path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("Page subsetting requires pypdf: pip install pypdf")
+    return PdfReader(str(pdf_path))
+
+
+def derived_dir(pdf_path):
+    """Directory for artifacts derived from a prompt-asset PDF"""
+    return Path(pdf_path).parent / DERIVED_DIRNAME
+
+
+def _index_path(pdf_path):
+    return derived_dir(pdf_path) / f"{Path(pdf_path).stem}.pages.json"
+
+
+def find_section_heading(page_text):
+    """First heading-like line on a page, or None"""
+    for line in page_text.splitlines():
+        line = line.strip()
+        if not line or len(line) > MAX_HEADING_CHARS:
+            continue
+        if SECTION_HEADING_PATTERN.match(line):
+            return line
+        letters = [char for char in line if char.isalpha()]
+        if len(letters) >= 4 and all(char.isupper() for char in letters):
+            return line.title()
+    return None
+
+
+def build_page_index(pdf_path):
+    """Extract per-page text and sections from a PDF and write <stem>.pages.json"""
+    reader = _load_reader(pdf_path)
+
+    pages = []
+    sections = {}
+    section = UNTITLED_SECTION
+    for page_number, page in enumerate(reader.pages, 1):
+        text = (page.extract_text() or "").strip()
+        # Pages without their own heading continue the previous section
+        section = find_section_heading(text) or section
+        pages.append({'page': page_number, 'section': section, 'chars': len(text), 'text': text})
+        sections.setdefault(section, []).append(page_number)
+
+    index = {
+        'source': Path(pdf_path).name,
+        'sourceSha256': file_sha256(pdf_path),
+        'pageCount': len(pages),
+        'sections': sections,
+        'pages': pages,
+    }
+
+    index_path = _index_path(pdf_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    tmp_path.replace(index_path)
+    return index
+
+
+def ensure_page_index(pdf_path):
+    """Build the page index unless it is current; returns True if rebuilt"""
+    index_path = _index_path(pdf_path)
+    if index_path.exists():
+        try:
+            with open(index_path, 'r') as f:
+                if json.load(f).get('sourceSha256') == file_sha256(pdf_path):
+                    return False
+        except (json.JSONDecodeError, OSError):
+            pass
+    build_page_index(pdf_path)
+    return True
+
+
+def load_page_index(pdf_path):
+    """Load a PDF's page index, re-extracting only when the PDF hash changed"""
+    ensure_page_index(pdf_path)
+    with open(_index_path(pdf_path), 'r') as f:
+        return json.load(f)
+
+
+def select_pages(index, sections=None, pages=None):
+    """Page numbers for the given sections (case-insensitive substring match) and/or pages
+
+    With neither, every page is selected.
+    """
+    if not sections and not pages:
+        return [entry['page'] for entry in index['pages']]
+
+    selected = set(pages or [])
+    for wanted in sections or []:
+        for section, section_pages in index['sections'].items():
+            if wanted.lower() in section.lower():
+                selected.update(section_pages)
+    return sorted(selected)
+
+
+def pages_text(index, page_numbers, max_chars=None):
+    """Text of the selected pages, each under a page/section header
+
+    Pages are added in order until max_chars would be exceeded. Returns
+    (text, included_page_numbers).
+    """
+    entries = {entry['page']: entry for entry in index['pages']}
+    blocks = []
+    included = []
+    total = 0
+    for page_number in page_numbers:
+        entry = entries.get(page_number)
+        if entry is None or not entry['text']:
+            continue
+        block = f"--- {index['source']} page {page_number} ({entry['section']}) ---\n{entry['text']}"
+        if max_chars is not None and total + len(block) > max_chars:
+            break
+        blocks.append(block)
+        included.append(page_number)
+        total += len(block) + 2
+    return "\n\n".join(blocks), included
+
+
+def write_page_subset(pdf_path, page_numbers, drop_images=False):
+    """Write (or reuse) a PDF holding only the given pages; returns its path"""
+    key = hashlib.sha256(json.dumps({
+        'source': file_sha256(pdf_path),
+        'pages': sorted(page_numbers),
+        'dropImages': drop_images,
+    }).encode('utf-8')).hexdigest()[:16]
+    subset_path = derived_dir(pdf_path) / f"{Path(pdf_path).stem}.pages-{key}.pdf"
+    if subset_path.exists():
+        return subset_path
+
+    from pypdf import PdfWriter
+
+    reader = _load_reader(pdf_path)
+    writer = PdfWriter()
+    for page_number in sorted(page_numbers):
+        writer.add_page(reader.pages[page_number - 1])
+    if drop_images:
+        writer.remove_images()
+    writer.compress_identical_objects()
+
+    subset_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = subset_path.with_suffix(".pdf.tmp")
+    with open(tmp_path, 'wb') as f:
+        writer.write(f)
+    tmp_path.replace(subset_path)
+    return subset_path
+
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', text.replace('\ufb01', 'fi').replace('\ufb02', 'fl')).strip().lower()
+
+
+def _theme_variants(theme_name):
+    """The full theme name, without any parenthetical, and its '/'-separated halves"""
+    variants = [theme_name, re.sub(r'\s*\(.*?\)', '', theme_name)]
+    variants.extend(part for part in re.split(r'\s*/\s*', variants[-1]) if len(part) >= 8)
+    return list(dict.fromkeys(_normalize(variant) for variant in variants if variant.strip()))
+
+
+def _is_theme_heading(line, variants):
+    """A line that starts with the theme name and is not a contents entry ("... 12")"""
+    line = _normalize(re.sub(r'^\s*(?:theme\s*)?[\d.:)\-]*\s*', '', line, flags=re.IGNORECASE))
+    return (any(line.startswith(variant) for variant in variants)
+            and len(line) <= MAX_HEADING_CHARS and not re.search(r'\d\s*$', line))
+
+
+def _is_contents_page(page_text):
+    """A table of contents page: titled "Contents", or mostly "<entry> ... <page>" lines"""
+    lines = [line.strip() for line in page_text.splitlines() if line.strip()]
+    if any(CONTENTS_TITLE_PATTERN.match(line) for line in lines):
+        return True
+    entries = sum(1 for line in lines if re.search(r'\D\s+\d{1,3}$', line))
+    return len(lines) >= 3 and entries >= CONTENTS_ENTRY_SHARE * len(lines)
+
+
+def find_theme_pages(index, theme_name, max_pages=MAX_THEME_PAGES):
+    """Pages for one theme: where it is defined, plus the following pages up to max_pages
+
+    The definition page is the first with the theme name as a heading line,
+    falling back to the first page that mentions it at all. Contents pages
+    are never picked.
+    """
+    variants = _theme_variants(theme_name)
+    page_count = index['pageCount']
+    body_pages = [entry for entry in index['pages'] if not _is_contents_page(entry['text'])]
+    heading_page = next(
+        (entry['page'] for entry in body_pages
+         if any(_is_theme_heading(line, variants) for line in entry['text'].splitlines())),
+        None
+    )
+    mention_page = heading_page or next(
+        (entry['page'] for entry in body_pages
+         if any(variant in _normalize(entry['text']) for variant in variants)),
+        None
+    )
+    if mention_page is None:
+        return []
+    return list(range(mention_page, min(page_count, mention_page + max_pages - 1) + 1))
+
+
+def load_theme_index(pdf_path, theme_names, max_pages=MAX_THEME_PAGES):
+    """Map each theme name to its pages in the PDF, cached in <stem>.themes-<key>.json
+
+    Themes the PDF never names map to an empty list.
+    """
+    index = load_page_index(pdf_path)
+    key = hashlib.sha256(json.dumps({
+        'source': index['sourceSha256'],
+        'themes': list(theme_names),
+        'maxPages': max_pages,
+        'version': THEME_INDEX_VERSION,
+    }).encode('utf-8')).hexdigest()[:16]
+    theme_index_path = derived_dir(pdf_path) / f"{Path(pdf_path).stem}.themes-{key}.json"
+
+    if theme_index_path.exists():
+        try:
+            with open(theme_index_path, 'r') as f:
+                return json.load(f)['themes']
+        except (json.JSONDecodeError, OSError, KeyError):
+            pass
+
+    themes = {theme_name: find_theme_pages(index, theme_name, max_pages) for theme_name in theme_names}
+    tmp_path = theme_index_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': index['source'], 'sourceSha256': index['sourceSha256'], 'themes': themes}, f, indent=2)
+    tmp_path.replace(theme_index_path)
+    return themes
@@ -0,0 +1,85 @@
+"""
+Yield-based early stopping for multi-pass workflows
+
+After each pass, its issues are deduped against everything found so far and
+the number of new distinct issues (the pass's yield) is recorded. Once the
+yield stays below a threshold for `patience` consecutive passes, further
+passes are unlikely to pay for themselves and the workflow stops. Passes
+that fail to parse are not counted either way.
+"""
+
+from issue_dedupe import dedupe_issues
+
+DEFAULT_MIN_NEW_ISSUES = 1
+DEFAULT_PATIENCE = 2
+
+
+def new_yield_tracker(min_new_issues=DEFAULT_MIN_NEW_ISSUES, patience=DEFAULT_PATIENCE):
+    """Fresh yield state for one analysis run"""
+    return {
+        'minNewIssues': min_new_issues,
+        'patience': patience,
+        'distinctIssues': [],
+        'lowYieldStreak': 0,
+    }
+
+
+def record_pass_yield(tracker, issues):
+    """Dedupe a pass's issues against earlier ones; returns its number of new distinct issues"""
+    # Copies, so dedupe bookkeeping (duplicateSources) stays off the real issues
+    new_issues, _ = dedupe_issues([dict(issue) for issue in issues], existing=tracker['distinctIssues'])
+    tracker['distinctIssues'].extend(new_issues)
+    if len(new_issues) < tracker['minNewIssues']:
+        tracker['lowYieldStreak'] += 1
+    else:
+        tracker['lowYieldStreak'] = 0
+    return len(new_issues)
+
+
+def early_stop_reason(tracker):
+    """Why the run should stop now, or None to keep going"""
+    if tracker['lowYieldStreak'] < tracker['patience']:
+        return None
+    return (f"fewer than {tracker['minNewIssues']} new distinct issue(s) "
+            f"for {tracker['patience']} consecutive pass(es)")
+
+
+def update_early_stop(tracker, pass_detail, issues):
+    """Record a parsed pass's yield on its pass detail; returns the stop reason, if any
+
+    pass_detail gets 'newDistinctIssues' and, when the run should stop,
+    'stopReason'. A None tracker (early stopping disabled) does nothing.
+    """
+    if tracker is None:
+        return None
+    pass_detail['newDistinctIssues'] = record_pass_yield(tracker, issues)
+    stop_reason = early_stop_reason(tracker)
+    if stop_reason:
+        pass_detail['stopReason'] = stop_reason
+    return stop_reason
+
+
+def new_tracker_for(early_stop):
+    """A yield tracker for {'minNewIssues', 'patience'} settings, or None when disabled"""
+    if not early_stop:
+        return None
+    return new_yield_tracker(early_stop['minNewIssues'], early_stop['patience'])
+
+
+def add_early_stop_arguments(parser):
+    """Add --early-stop, --min-new-issues and --patience to a workflow's CLI"""
+    parser.add_argument("--early-stop", action="store_true",
+                        help="Stop once passes stop finding new distinct issues")
+    parser.add_argument("--min-new-issues", type=int, default=DEFAULT_MIN_NEW_ISSUES,
+                        help=f"With --early-stop, a pass must add at least this many new distinct issues "
+                             f"(default: {DEFAULT_MIN_NEW_ISSUES})")
+    parser.add_argument("--patience", type=int, default=DEFAULT_PATIENCE,
+                        help=f"With --early-stop, low-yield passes in a row before stopping "
+                             f"(default: {DEFAULT_PATIENCE})")
+
+
+def early_stop_from_arguments(args):
+    """The (min_new_issues, patience) settings from the CLI, or None when disabled"""
+    if not args.early_stop:
+        return None
+    return {'minNewIssues': args.min_new_issues, 'patience': args.patience}
@@ -0,0 +1,431 @@
+"""
+Simulated Gemini and Anthropic clients for offline benchmarks
+
+FakeGeminiClient and FakeAnthropicClient implement the slice of the
+google-genai and anthropic SDKs the workflows use (file uploads, context
+caches, streamed and non-streamed generation, batches, the Claude Files
+API). Calls sleep for a sampled latency, can fail with rate-limit errors,
+and answer with canned issue JSON, so scheduling and parsing can be
+exercised without network access or spend.
+"""
+
+import json
+import math
+import time
+import random
+import itertools
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+from gemini_batches import BatchTransport, JOB_RUNNING, JOB_SUCCEEDED
+
+# Rough size of an uploaded PDF in prompt tokens
+FILE_TOKENS = 20_000
+CHARS_PER_TOKEN = 4
+
+SAMPLE_THEMES = [
+    "Incorrect Subject Matter Explanation",
+    "Missed Student Misconception",
+    "Pacing Too Fast",
+    "Grammatical Errors",
+    "Insufficient Praise or Encouragement",
+]
+SAMPLE_QUOTES = [
+    "so you just carry the one over here and that's it",
+    "okay let's move on to the next one quickly",
+    "no that's wrong, try again",
+    "we doesn't need to do that part today",
+    "um so like, basically, you know, the answer is five",
+]
+
+
+class FakeRateLimitError(Exception):
+    """Stand-in for the SDKs' 429 errors (exposes both .code and .status_code)"""
+
+    def __init__(self, message="Simulated rate limit (429 RESOURCE_EXHAUSTED)"):
+        super().__init__(message)
+        self.code = 429
+        self.status_code = 429
+
+
+class LatencyModel:
+    """Log-normal call latency: a median plus a spread (sigma of the log)
+
+    time_to_first_token is the fraction of the total spent before the first
+    streamed chunk.
+    """
+
+    def __init__(self, median_seconds=0.05, sigma=0.5, time_to_first_token=0.3):
+        self.median_seconds = median_seconds
+        self.sigma = sigma
+        self.time_to_first_token = time_to_first_token
+
+    def sample(self, rng):
+        if self.sigma <= 0:
+            return self.median_seconds
+        return self.median_seconds * math.exp(rng.gauss(0, self.sigma))
+
+
+class FakeBehavior:
+    """Shared latency, failure and response settings plus call counters"""
+
+    def __init__(self, latency=None, rate_limit_rate=0.0, issues_per_response=3,
+                 transcript_seconds=3600, seed=0):
+        self.latency = latency or LatencyModel()
+        self.rate_limit_rate = rate_limit_rate
+        self.issues_per_response = issues_per_response
+        self.transcript_seconds = transcript_seconds
+        self.counts = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def count(self, operation):
+        with self._lock:
+            self.counts[operation] = self.counts.get(operation, 0) + 1
+
+    def next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def draw(self):
+        """Sample (latency_seconds, rate_limited, issues_json) for one call"""
+        with self._lock:
+            latency = self.latency.sample(self._rng)
+            rate_limited = self._rng.random() < self.rate_limit_rate
+            issues = [
+                {
+                    "timestamp": "[{:02d}:{:02d}:{:02d}]".format(*_hms(self._rng.randrange(self.transcript_seconds))),
+                    "theme": self._rng.choice(SAMPLE_THEMES),
+                    "quote": self._rng.choice(SAMPLE_QUOTES),
+                    "context": "Simulated issue",
+                    "justification": "Simulated response from the benchmark client",
+                }
+                for _ in range(self.issues_per_response)
+            ]
+        return latency, rate_limited, json.dumps(issues, indent=2)
+
+    def call(self, operation):
+        """Sleep for a sampled latency (failing fast on a simulated 429)"""
+        self.count(operation)
+        latency, rate_limited, text = self.draw()
+        if rate_limited:
+            self.count("rateLimited")
+            time.sleep(latency * self.latency.time_to_first_token)
+            raise FakeRateLimitError()
+        return latency, text
+
+
+class ScriptedBehavior(FakeBehavior):
+    """FakeBehavior that answers with the given texts in order, without latency
+
+    A None entry fails that call with a simulated rate limit (a per-request
+    error in batches).
+    """
+
+    def __init__(self, texts, latency_seconds=0.0):
+        super().__init__(latency=LatencyModel(median_seconds=latency_seconds, sigma=0))
+        self.texts = list(texts)
+
+    def draw(self):
+        with self._lock:
+            text = self.texts.pop(0)
+        return self.latency.median_seconds, text is None, text
+
+
+def _hms(seconds):
+    return seconds // 3600, (seconds % 3600) // 60, seconds % 60
+
+
+def _estimate_tokens(value):
+    """Prompt token estimate for strings, SDK content objects and uploaded files"""
+    if isinstance(value, str):
+        return len(value) // CHARS_PER_TOKEN
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_tokens(item) for item in value)
+    if isinstance(value, dict):
+        if value.get("type") == "document":
+            return FILE_TOKENS
+        return sum(_estimate_tokens(item) for item in value.values())
+    parts = getattr(value, "parts", None)
+    if parts is not None:
+        return sum(_estimate_tokens(part) for part in parts)
+    if getattr(value, "file_data", None) is not None or getattr(value, "uri", None):
+        return FILE_TOKENS
+    text = getattr(value, "text", None)
+    return len(text) // CHARS_PER_TOKEN if isinstance(text, str) else 0
+
+
+def _split_stream(text, pieces=4):
+    size = max(1, -(-len(text) // pieces))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# ---------- Gemini ----------
+
+class _FakeGeminiFiles:
+    def __init__(self, behavior):
+        self._behavior = behavior
+        self._files = {}
+
+    def upload(self, file, config=None):
+        self._behavior.count("files.upload")
+        file_id = self._behavior.next_id()
+        remote_file = SimpleNamespace(
+            name=f"files/fake-{file_id}",
+            uri=f"https://fake.invalid/files/fake-{file_id}",
+            mime_type="application/pdf",
+            state="ACTIVE",
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+        )
+        self._files[remote_file.name] = remote_file
+        return remote_file
+
+    def get(self, name):
+        self._behavior.count("files.get")
+        if name not in self._files:
+            raise KeyError(f"File not found: {name}")
+        return self._files[name]
+
+
+class _FakeGeminiCaches:
+    def __init__(self, behavior):
+        self._behavior = behavior
+        self._caches = {}
+
+    def create(self, model, config=None):
+        self._behavior.count("caches.create")
+        cache = SimpleNamespace(
+            name=f"cachedContents/fake-{self._behavior.next_id()}",
+            model=model,
+            cached_tokens=_estimate_tokens(getattr(config, "contents", None) or []),
+        )
+        self._caches[cache.name] = cache
+        return cache
+
+    def get(self, name):
+        self._behavior.count("caches.get")
+        if name not in self._caches:
+            raise KeyError(f"Cache not found: {name}")
+        return self._caches[name]
+
+    def update(self, name, config=None):
+        self._behavior.count("caches.update")
+        return self.get(name)
+
+
+class _FakeGeminiModels:
+    def __init__(self, behavior, caches):
+        self._behavior = behavior
+        self._caches = caches
+
+    def _usage(self, contents, config, text):
+        cached_tokens = 0
+        cache_name = getattr(config, "cached_content", None)
+        if cache_name and cache_name in self._caches._caches:
+            cached_tokens = self._caches._caches[cache_name].cached_tokens
+        return SimpleNamespace(
+            prompt_token_count=_estimate_tokens(contents) + cached_tokens,
+            cached_content_token_count=cached_tokens,
+            candidates_token_count=len(text) // CHARS_PER_TOKEN,
+            thoughts_token_count=0,
+        )
+
+    def generate_content(self, model, contents, config=None):
+        latency, text = self._behavior.call("models.generate_content")
+        time.sleep(latency)
+        return SimpleNamespace(text=text, usage_metadata=self._usage(contents, config, text))
+
+    def generate_content_stream(self, model, contents, config=None):
+        latency, text = self._behavior.call("models.generate_content_stream")
+        time_to_first_token = latency * self._behavior.latency.time_to_first_token
+        time.sleep(time_to_first_token)
+
+        pieces = _split_stream(text)
+        for position, piece in enumerate(pieces):
+            if position:
+                time.sleep((latency - time_to_first_token) / len(pieces))
+            last = position == len(pieces) - 1
+            yield SimpleNamespace(
+                text=piece,
+                usage_metadata=self._usage(contents, config, text) if last else None,
+            )
+
+
+class FakeGeminiClient:
+    """Offline stand-in for google.genai.Client"""
+
+    def __init__(self, behavior=None):
+        self.behavior = behavior or FakeBehavior()
+        self.files = _FakeGeminiFiles(self.behavior)
+        self.caches = _FakeGeminiCaches(self.behavior)
+        self.models = _FakeGeminiModels(self.behavior, self.caches)
+
+
+class FakeGeminiBatchTransport(BatchTransport):
+    """Offline stand-in for gemini_batches.GenAIBatchTransport
+
+    A job succeeds one sampled latency (the slowest request's) after
+    submission; rate-limited requests come back as per-request errors.
+    """
+
+    def __init__(self, client=None, behavior=None):
+        self.client = client or FakeGeminiClient(behavior)
+        self.behavior = self.client.behavior
+        self._jobs = {}
+
+    def submit(self, model, requests, display_name):
+        self.behavior.count("batches.create")
+        results = []
+        longest = 0.0
+        for request in requests:
+            self.behavior.count("batches.request")
+            latency, rate_limited, text = self.behavior.draw()
+            longest = max(longest, latency)
+            if rate_limited:
+                results.append({'error': "Simulated RESOURCE_EXHAUSTED"})
+            else:
+                usage = self.client.models._usage(request['contents'], request.get('config'), text)
+                results.append({'text': text, 'usageMetadata': usage})
+
+        job_name = f"batches/fake-{self.behavior.next_id()}"
+        self._jobs[job_name] = {'readyAt': time.monotonic() + longest, 'results': results}
+        return job_name
+
+    def state(self, job_name):
+        self.behavior.count("batches.get")
+        return JOB_SUCCEEDED if time.monotonic() >= self._jobs[job_name]['readyAt'] else JOB_RUNNING
+
+    def results(self, job_name):
+        return list(self._jobs[job_name]['results'])
+
+
+# ---------- Anthropic ----------
+
+class _FakeMessageStream:
+    def __init__(self, behavior, params):
+        self._behavior = behavior
+        self._params = params
+        self._latency, self._text = behavior.call("messages.stream")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        time_to_first_token = self._latency * self._behavior.latency.time_to_first_token
+        time.sleep(time_to_first_token)
+        pieces = _split_stream(self._text)
+        for position, piece in enumerate(pieces):
+            if position:
+                time.sleep((self._latency - time_to_first_token) / len(pieces))
+            yield piece
+
+    def get_final_message(self):
+        return _fake_message(self._params, self._text)
+
+
+def _fake_message(params, text):
+    return SimpleNamespace(
+        content=[SimpleNamespace(type="text", text=text)],
+        usage=SimpleNamespace(
+            input_tokens=_estimate_tokens(params.get("messages", [])),
+            cache_read_input_tokens=0,
+            cache_creation_input_tokens=0,
+            output_tokens=len(text) // CHARS_PER_TOKEN,
+        ),
+        stop_reason="end_turn",
+    )
+
+
+class _FakeMessageBatches:
+    """Message Batches stand-in: a batch ends one sampled latency after creation"""
+
+    def __init__(self, behavior):
+        self._behavior = behavior
+        self._batches = {}
+
+    def create(self, requests, betas=None):
+        self._behavior.count("messages.batches.create")
+        results = []
+        longest = 0.0
+        for request in requests:
+            self._behavior.count("messages.batch_request")
+            latency, rate_limited, text = self._behavior.draw()
+            longest = max(longest, latency)
+            if rate_limited:
+                result = SimpleNamespace(type="errored", error="Simulated overloaded_error")
+            else:
+                result = SimpleNamespace(type="succeeded", message=_fake_message(request["params"], text))
+            results.append(SimpleNamespace(custom_id=request["custom_id"], result=result))
+
+        batch_id = f"msgbatch_fake{self._behavior.next_id()}"
+        self._batches[batch_id] = {'readyAt': time.monotonic() + longest, 'results': results}
+        return self._status(batch_id)
+
+    def retrieve(self, batch_id, betas=None):
+        self._behavior.count("messages.batches.retrieve")
+        return self._status(batch_id)
+
+    def _status(self, batch_id):
+        batch = self._batches[batch_id]
+        ended = time.monotonic() >= batch['readyAt']
+        succeeded = sum(entry.result.type == "succeeded" for entry in batch['results'])
+        return SimpleNamespace(
+            id=batch_id,
+            processing_status="ended" if ended else "in_progress",
+            request_counts=SimpleNamespace(
+                processing=0 if ended else len(batch['results']),
+                succeeded=succeeded if ended else 0,
+                errored=len(batch['results']) - succeeded if ended else 0,
+            ),
+        )
+
+    def results(self, batch_id, betas=None):
+        return iter(self._batches[batch_id]['results'])
+
+
+class _FakeMessages:
+    def __init__(self, behavior):
+        self._behavior = behavior
+        self.batches = _FakeMessageBatches(behavior)
+
+    def create(self, **params):
+        latency, text = self._behavior.call("messages.create")
+        time.sleep(latency)
+        return _fake_message(params, text)
+
+    def stream(self, **params):
+        return _FakeMessageStream(self._behavior, params)
+
+
+class _FakeClaudeFiles:
+    def __init__(self, behavior):
+        self._behavior = behavior
+        self._files = {}
+
+    def upload(self, file, betas=None):
+        self._behavior.count("beta.files.upload")
+        file_id = f"file_fake{self._behavior.next_id()}"
+        self._files[file_id] = SimpleNamespace(id=file_id, filename=file[0])
+        return self._files[file_id]
+
+    def retrieve_metadata(self, file_id, betas=None):
+        self._behavior.count("beta.files.retrieve_metadata")
+        if file_id not in self._files:
+            raise KeyError(f"File not found: {file_id}")
+        return self._files[file_id]
+
+
+class FakeAnthropicClient:
+    """Offline stand-in for anthropic.Anthropic"""
+
+    def __init__(self, behavior=None):
+        self.behavior = behavior or FakeBehavior()
+        self.messages = _FakeMessages(self.behavior)
+        # Beta endpoints share the regular fakes; betas= is accepted and ignored
+        self.beta = SimpleNamespace(messages=self.messages, files=_FakeClaudeFiles(self.behavior))
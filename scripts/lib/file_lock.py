@@ -0,0 +1,33 @@
+"""
+Cross-process file locking for shared state under data/.cache
+"""
+
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def locked(lock_path):
+    """Hold an exclusive lock on lock_path across threads and processes (not re-entrant)"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(str(lock_path), threading.Lock())
+
+    with thread_lock:
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
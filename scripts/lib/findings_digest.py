@@ -0,0 +1,69 @@
+"""
+Compact digest of prior findings for later-pass prompts
+
+Instead of pasting full issue JSON (context, justification, alternative...)
+into every later pass, earlier issues are packed one per line as
+`timestamp|theme|quote-prefix` under a fixed token budget, so input tokens
+per pass stay flat as the pass number grows.
+"""
+
+from issue_dedupe import issue_seconds
+
+DEFAULT_TOKEN_BUDGET = 1500
+# Quote prefix lengths tried in order until the digest fits the budget
+QUOTE_PREFIX_STEPS = (60, 30, 0)
+# Rough chars-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+DIGEST_HEADER = "Previously identified issues (one per line: timestamp|theme|quote prefix):"
+
+
+def estimate_tokens(text):
+    """Cheap token estimate; good enough for budgeting prompt additions"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def digest_line(issue, quote_prefix_chars):
+    """One issue as `timestamp|theme|quote-prefix`"""
+    quote = " ".join((issue.get("quote") or "").split())
+    if len(quote) > quote_prefix_chars:
+        quote = quote[:quote_prefix_chars].rstrip() + "…"
+    fields = [issue.get("timestamp") or "?", issue.get("theme") or "?"]
+    if quote_prefix_chars:
+        fields.append(quote)
+    return "|".join(fields)
+
+
+def build_findings_digest(issues, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Pack issues into a digest of at most token_budget (estimated) tokens
+
+    Quote prefixes are shortened before any issue is dropped; if even bare
+    `timestamp|theme` lines don't fit, the latest issues in transcript order
+    are cut and counted in a trailing note.
+    """
+    if not issues:
+        return ""
+
+    ordered = sorted(issues, key=lambda issue: (issue_seconds(issue) is None, issue_seconds(issue) or 0))
+
+    for quote_prefix_chars in QUOTE_PREFIX_STEPS:
+        lines = [DIGEST_HEADER] + [digest_line(issue, quote_prefix_chars) for issue in ordered]
+        digest = "\n".join(lines)
+        if estimate_tokens(digest) <= token_budget:
+            return digest
+
+    # Still too long: keep as many bare lines as fit and note the rest
+    kept = [DIGEST_HEADER]
+    used = estimate_tokens(DIGEST_HEADER)
+    note_reserve = estimate_tokens("(+99999 more earlier findings not listed)")
+    for issue in ordered:
+        line = digest_line(issue, 0)
+        cost = estimate_tokens(line) + 1
+        if used + cost + note_reserve > token_budget:
+            break
+        kept.append(line)
+        used += cost
+
+    omitted = len(ordered) - (len(kept) - 1)
+    kept.append(f"(+{omitted} more earlier findings not listed)")
+    return "\n".join(kept)
@@ -0,0 +1,76 @@
+"""
+Gemini batch prediction transports
+
+A transport submits a list of generate_content requests as one batch job,
+reports the job's state and returns one result per request, in request
+order. GenAIBatchTransport talks to the real Batch API through
+client.batches; fake_clients.FakeGeminiBatchTransport stands in offline.
+model_calls.gemini_generate_batch drives either one.
+"""
+
+from abc import ABC, abstractmethod
+
+# Normalized job states
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+_FINISHED_STATES = {
+    'JOB_STATE_SUCCEEDED': JOB_SUCCEEDED,
+    'JOB_STATE_PARTIALLY_SUCCEEDED': JOB_SUCCEEDED,
+    'JOB_STATE_FAILED': JOB_FAILED,
+    'JOB_STATE_CANCELLED': JOB_FAILED,
+    'JOB_STATE_EXPIRED': JOB_FAILED,
+}
+
+
+class BatchTransport(ABC):
+    """Interface for submitting generate_content requests as a batch job"""
+
+    @abstractmethod
+    def submit(self, model, requests, display_name):
+        """Submit [{'contents', 'config'}, ...]; returns a job name"""
+
+    @abstractmethod
+    def state(self, job_name):
+        """JOB_RUNNING, JOB_SUCCEEDED or JOB_FAILED"""
+
+    @abstractmethod
+    def results(self, job_name):
+        """One dict per request, in order: {'text', 'usageMetadata'} or {'error'}"""
+
+
+class GenAIBatchTransport(BatchTransport):
+    """Batch jobs through google-genai's client.batches with inlined requests"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, model, requests, display_name):
+        from google.genai import types
+
+        job = self.client.batches.create(
+            model=model,
+            src=[
+                types.InlinedRequest(contents=request['contents'], config=request.get('config'))
+                for request in requests
+            ],
+            config=types.CreateBatchJobConfig(display_name=display_name)
+        )
+        return job.name
+
+    def state(self, job_name):
+        job = self.client.batches.get(name=job_name)
+        state_name = getattr(job.state, 'name', str(job.state))
+        return _FINISHED_STATES.get(state_name, JOB_RUNNING)
+
+    def results(self, job_name):
+        job = self.client.batches.get(name=job_name)
+        results = []
+        for inlined in job.dest.inlined_responses:
+            if inlined.error is not None or inlined.response is None:
+                results.append({'error': str(inlined.error or "no response")})
+            else:
+                results.append({'text': inlined.response.text or "",
+                                'usageMetadata': inlined.response.usage_metadata})
+        return results
@@ -0,0 +1,88 @@
+"""
+Input fingerprints for incremental re-analysis
+
+An analysis depends on the transcript, the guidebook and playbook PDFs, the
+prompt file, the model and the workflow configuration. Each run hashes those
+into a fingerprint that save_analysis records on its output. Before running,
+a workflow compares the fingerprint with the newest analysis of the same
+workflow in the trial's analyses dir. If they match, and that analysis
+completed without failed passes or chunks, the trial is skipped (unless --force).
+Re-running the whole corpus after a prompt change then only redoes the
+workflows that use that prompt.
+"""
+
+import re
+import json
+import hashlib
+
+from analysis_utils import file_sha256
+
+
+def input_fingerprint(paths, prompt_path, model, workflow_id, configuration):
+    """Hashes of everything an analysis depends on, plus a single key over them"""
+    inputs = {
+        'transcript': file_sha256(paths['transcript']),
+        'guidebook': file_sha256(paths['guidebook']),
+        'playbook': file_sha256(paths['playbook']),
+        'prompt': file_sha256(prompt_path),
+        'model': model,
+        'workflowId': workflow_id,
+        'configuration': configuration,
+    }
+    key = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return {'key': key, 'inputs': inputs}
+
+
+def newest_analysis_path(analyses_dir, workflow_id):
+    """The most recent <workflow_id>-<timestamp>.json in analyses_dir, or None"""
+    if not analyses_dir.exists():
+        return None
+    pattern = re.compile(rf'^{re.escape(workflow_id)}-\d{{8}}-\d{{6}}\.json$')
+    # Timestamps in the names sort chronologically
+    candidates = sorted(path for path in analyses_dir.iterdir() if pattern.match(path.name))
+    return candidates[-1] if candidates else None
+
+
+def run_details(analysis):
+    """Per-pass details of an analysis (the chunked workflow records chunkDetails)"""
+    return analysis.get('passDetails', []) + analysis.get('chunkDetails', [])
+
+
+def find_current_analysis(run, paths, prompt_path, model, force=False, analysis_path=None):
+    """Fingerprint the run's inputs; returns the newest analysis if it has the same inputs
+
+    The fingerprint is stored on the run for save_analysis. The newest
+    analysis is the latest one for the workflow in the trial's analyses dir,
+    or analysis_path for scripts that always write the same file. It is
+    returned (marked 'skipped') only if it completed with no failed passes or
+    chunks; otherwise, or with force, None is returned and the trial should be
+    analyzed.
+    """
+    fingerprint = input_fingerprint(paths, prompt_path, model, run['workflowId'], run['configuration'])
+    run['inputFingerprint'] = fingerprint
+    if force:
+        return None
+
+    newest_path = analysis_path or newest_analysis_path(paths['analyses_dir'], run['workflowId'])
+    if newest_path is None or not newest_path.exists():
+        return None
+    try:
+        with open(newest_path, 'r') as f:
+            analysis = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+    if analysis.get('inputFingerprint', {}).get('key') != fingerprint['key']:
+        return None
+    if analysis.get('status') == "failed" or any('error' in detail for detail in run_details(analysis)):
+        return None
+
+    print(f"✓ {run['trialId']}: {newest_path.name} already has these inputs, skipping (--force to redo)")
+    return dict(analysis, skipped=True)
+
+
+def add_force_arguments(parser):
+    """Add the --force switch to a workflow's CLI"""
+    parser.add_argument("--force", action="store_true",
+                        help="Analyze even if the newest analysis already has the same inputs "
+                             "(cached responses are still replayed; add --refresh for new model output)")
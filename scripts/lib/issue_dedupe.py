@@ -0,0 +1,158 @@
+"""
+Local dedupe of issues found across passes
+
+Two issues are duplicates when they share a theme, their timestamps fall
+within a small window of each other and their quotes are similar (one
+contains the other, or a difflib ratio above a threshold). Running this after
+the passes replaces stuffing every prior issue into later prompts.
+"""
+
+import re
+from difflib import SequenceMatcher
+
+from transcript import parse_timestamp_to_seconds
+
+DEFAULT_WINDOW_SECONDS = 10
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+
+def normalize_quote(quote):
+    """Lowercase a quote and collapse punctuation/whitespace for comparison"""
+    return " ".join(re.sub(r"[^\w\s]", " ", (quote or "").lower()).split())
+
+
+def normalize_theme(theme):
+    return " ".join((theme or "").lower().split())
+
+
+def issue_seconds(issue):
+    """Issue timestamp in seconds, or None when it has no parseable timestamp"""
+    timestamp = issue.get("timestamp") or ""
+    if not re.search(r"\d+:\d{2}", timestamp):
+        return None
+    return parse_timestamp_to_seconds(timestamp)
+
+
+def quote_similarity(quote_a, quote_b):
+    """Similarity of two normalized quotes in [0, 1]; containment counts as 1"""
+    if not quote_a or not quote_b:
+        return 0.0
+    if quote_a in quote_b or quote_b in quote_a:
+        return 1.0
+    return SequenceMatcher(None, quote_a, quote_b).ratio()
+
+
+def issue_fingerprint(issue, window_seconds=DEFAULT_WINDOW_SECONDS):
+    """Coarse fingerprint: (theme, timestamp window, quote prefix)"""
+    seconds = issue_seconds(issue)
+    window = int(seconds // window_seconds) if seconds is not None else None
+    return (normalize_theme(issue.get("theme")), window, normalize_quote(issue.get("quote"))[:40])
+
+
+def is_duplicate_issue(issue_a, issue_b, window_seconds=DEFAULT_WINDOW_SECONDS,
+                       similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """Whether two issues describe the same moment under the same theme"""
+    if normalize_theme(issue_a.get("theme")) != normalize_theme(issue_b.get("theme")):
+        return False
+
+    seconds_a, seconds_b = issue_seconds(issue_a), issue_seconds(issue_b)
+    if seconds_a is not None and seconds_b is not None and abs(seconds_a - seconds_b) > window_seconds:
+        return False
+
+    similarity = quote_similarity(normalize_quote(issue_a.get("quote")), normalize_quote(issue_b.get("quote")))
+    return similarity >= similarity_threshold
+
+
+def dedupe_issues(issues, existing=None, source_field="analysisPass",
+                  window_seconds=DEFAULT_WINDOW_SECONDS,
+                  similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """Merge duplicate issues, keeping the first occurrence
+
+    existing issues (e.g. from earlier passes) are matched against but not
+    returned. Each kept issue records the source_field values of the copies
+    merged into it under 'duplicateSources'.
+    Returns a tuple of (unique_new_issues, duplicates_merged).
+    """
+    kept_by_theme = {}
+    kept_by_fingerprint = {}
+    for issue in existing or []:
+        kept_by_theme.setdefault(normalize_theme(issue.get("theme")), []).append(issue)
+        kept_by_fingerprint.setdefault(issue_fingerprint(issue, window_seconds), issue)
+
+    unique = []
+    duplicates = 0
+
+    for issue in issues:
+        fingerprint = issue_fingerprint(issue, window_seconds)
+        candidates = kept_by_theme.setdefault(normalize_theme(issue.get("theme")), [])
+
+        # Exact fingerprint hits skip the pairwise quote comparison
+        match = kept_by_fingerprint.get(fingerprint) if fingerprint[2] else None
+        if match is None:
+            match = next(
+                (kept for kept in candidates
+                 if is_duplicate_issue(kept, issue, window_seconds, similarity_threshold)),
+                None
+            )
+
+        if match is not None:
+            if source_field in issue:
+                match.setdefault("duplicateSources", []).append(issue[source_field])
+            duplicates += 1
+        else:
+            candidates.append(issue)
+            kept_by_fingerprint[fingerprint] = issue
+            unique.append(issue)
+
+    return unique, duplicates
+
+
+def merge_boundary_duplicates(issues, windows, overlap_seconds, tolerance_seconds):
+    """Merge issues reported by two adjacent chunks inside their overlap
+
+    Two issues are the same when they come from different chunks, fall in the
+    same overlap region and the dedupe engine matches them (same theme,
+    timestamps within tolerance_seconds, similar quotes).
+    The earlier chunk's copy is kept.
+    Returns a tuple of (merged_issues, duplicates_removed).
+    """
+    if overlap_seconds <= 0:
+        return issues, 0
+
+    overlap_regions = [
+        (window['endTime'], window['endTime'] + overlap_seconds)
+        for window in windows[:-1]
+    ]
+
+    def overlap_region(issue):
+        seconds = parse_timestamp_to_seconds(issue.get("timestamp", ""))
+        for region_index, (start, end) in enumerate(overlap_regions):
+            if start <= seconds < end:
+                return region_index
+        return None
+
+    merged = []
+    kept_in_region = {}
+    duplicates = 0
+
+    for issue in issues:
+        region_index = overlap_region(issue)
+        if region_index is None:
+            merged.append(issue)
+            continue
+
+        duplicate_of = next(
+            (kept for kept in kept_in_region.get(region_index, [])
+             if kept["chunkNumber"] != issue["chunkNumber"]
+             and is_duplicate_issue(kept, issue, window_seconds=tolerance_seconds)),
+            None
+        )
+
+        if duplicate_of is not None:
+            duplicate_of.setdefault("alsoFoundInChunks", []).append(issue["chunkNumber"])
+            duplicates += 1
+        else:
+            kept_in_region.setdefault(region_index, []).append(issue)
+            merged.append(issue)
+
+    return merged, duplicates
@@ -0,0 +1,174 @@
+"""
+Incremental issue extraction from streamed model responses
+
+Passes answer with a JSON array of issue objects, and a long pass can stream
+for minutes. IssueArrayParser picks each issue object out of the array as
+soon as its closing brace arrives, instead of waiting to json.loads the whole
+response. Workflows pass an IssueStream as the model call's on_text callback
+to append each issue to a live NDJSON sidecar in the trial's analyses dir:
+
+    <workflow_id>.live.ndjson
+
+so annotators can start on the first findings while the run continues. The
+same parser salvages the closed issues from a response cut off mid-array.
+"""
+
+import json
+import threading
+
+from analysis_utils import setup_paths, parse_issues_json
+
+LIVE_SUFFIX = ".live.ndjson"
+
+
+class IssueArrayParser:
+    """Incremental parser for a JSON array of objects, fed text as it arrives
+
+    Text before the array (e.g. a ```json fence or "[see below]" in prose)
+    is skipped: the array starts at the first '[' followed by '{' or ']'.
+    Elements that are not objects are ignored.
+    """
+
+    def __init__(self):
+        self.issues = []
+        self._text = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._start = None
+
+    def feed(self, text):
+        """Add streamed text; returns the objects that closed in it"""
+        text = self._text + text
+        closed = []
+        while self._pos < len(text) and not self._done:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif not self._in_array:
+                if char == '[':
+                    following = text[self._pos + 1:].lstrip()
+                    if not following:
+                        # Can't tell yet whether this bracket opens the array
+                        break
+                    self._in_array = following[0] in '{]'
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # The array itself closed
+                    self._done = char == ']'
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        try:
+                            element = json.loads(text[self._start:self._pos + 1])
+                        except json.JSONDecodeError:
+                            element = None
+                        if isinstance(element, dict):
+                            closed.append(element)
+                        self._start = None
+            self._pos += 1
+
+        # Keep only the text an unfinished element still needs
+        if self._done:
+            self._text, self._pos = "", 0
+        else:
+            keep_from = self._start if self._start is not None else self._pos
+            self._text = text[keep_from:]
+            self._pos -= keep_from
+            if self._start is not None:
+                self._start = 0
+
+        self.issues.extend(closed)
+        return closed
+
+
+def is_complete_issue_response(response_text):
+    """Whether a response parses as a whole issue list (validate callback for model calls)"""
+    try:
+        return isinstance(parse_issues_json(response_text), list)
+    except json.JSONDecodeError:
+        return False
+
+
+def parse_issues_salvaging(response_text):
+    """parse_issues_json, but a response cut off mid-array keeps the issues that closed
+
+    Returns (issues, truncation_error): truncation_error is the parse error
+    when issues were salvaged from a broken response, otherwise None. Raises
+    json.JSONDecodeError when there is nothing to salvage.
+    """
+    try:
+        return parse_issues_json(response_text), None
+    except json.JSONDecodeError as e:
+        parser = IssueArrayParser()
+        parser.feed(response_text)
+        if not parser.issues:
+            raise
+        return parser.issues, str(e)
+
+
+class IssueSidecar:
+    """NDJSON file that streamed issues are appended to, one per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Each run starts its sidecar over
+        path.write_text("")
+
+    def append(self, issues):
+        lines = "".join(json.dumps(issue, ensure_ascii=False) + "\n" for issue in issues)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(lines)
+
+
+def open_live_sidecar(run):
+    """Start the run's live issue sidecar in the trial's analyses dir"""
+    path = setup_paths(run['trialId'])['analyses_dir'] / f"{run['workflowId']}{LIVE_SUFFIX}"
+    print(f"Live issues: {path}")
+    return IssueSidecar(path)
+
+
+class IssueStream:
+    """on_text callback for model calls: appends issues to a sidecar as they close
+
+    metadata (e.g. {'analysisPass': 3}) is added to each issue written, to
+    match the issues the workflow saves. A sidecar of None only parses.
+    """
+
+    def __init__(self, sidecar, metadata=None):
+        self.sidecar = sidecar
+        self.metadata = metadata or {}
+        self._parser = IssueArrayParser()
+        self._written = set()
+
+    def __call__(self, text):
+        if text is None:
+            # A retried attempt restarts the response from scratch
+            self._parser = IssueArrayParser()
+            return
+        new_issues = []
+        for issue in self._parser.feed(text):
+            # Issues already written by an earlier attempt are not written twice
+            key = json.dumps(issue, sort_keys=True)
+            if key not in self._written:
+                self._written.add(key)
+                new_issues.append(issue)
+        if new_issues and self.sidecar is not None:
+            self.sidecar.append([dict(issue, **self.metadata) for issue in new_issues])
@@ -0,0 +1,425 @@
+"""
+Model call wrappers shared by all workflows
+
+Every Gemini generate_content and Anthropic messages.create call goes through
+here, so the on-disk response cache applies uniformly. Each call returns a
+dict with the response 'text', token 'usage', whether it came 'fromCache' and
+its 'performance' record (wall time, time-to-first-token, tokens, cost).
+Calls are streamed so time-to-first-token can be measured; each record is
+also appended to run['calls'] for save_analysis to summarize. Live calls are
+rate limited and retried by the shared call scheduler.
+
+Only complete responses are cached: non-empty, and accepted by the caller's
+validate callback when one is given (e.g. the issue JSON parses), so a
+truncated or malformed response is asked for again on the next run instead
+of being replayed. An on_text callback receives the response text as it
+streams in (a cached response arrives as one piece). If a retried attempt restarts the response,
+on_text is called with None first so the consumer can drop partial state.
+"""
+
+import time
+import hashlib
+
+import response_cache
+from upload_registry import registered_hash
+from claude_files import registered_file_hash
+from performance import estimate_cost, BATCH_PRICE_FACTOR
+from tracing import record_span
+from call_scheduler import run_call
+
+
+def _describe_gemini_contents(value):
+    """Describe Gemini contents for cache keying, with files replaced by their hashes"""
+    if isinstance(value, str):
+        return {'text': value}
+    if isinstance(value, (list, tuple)):
+        return [_describe_gemini_contents(item) for item in value]
+    if hasattr(value, 'parts') and hasattr(value, 'role'):  # types.Content
+        return {'role': value.role, 'parts': [_describe_gemini_contents(part) for part in value.parts or []]}
+    if hasattr(value, 'file_data'):  # types.Part
+        if value.file_data is not None:
+            file_uri = value.file_data.file_uri
+            return {'file': registered_hash(file_uri) or file_uri}
+        return {'text': value.text}
+    name = getattr(value, 'name', None)  # Uploaded file
+    if name:
+        return {'file': registered_hash(name) or name}
+    return {'value': str(value)}
+
+
+def _describe_gemini_config(config):
+    """Describe a GenerateContentConfig, keying cached content on its asset hashes"""
+    if config is None:
+        return None
+
+    description = config.model_dump(exclude_none=True, mode='json')
+    cached_content = description.pop('cached_content', None)
+    if cached_content:
+        from context_cache import cached_asset_hashes
+        description['cachedAssets'] = cached_asset_hashes(cached_content) or cached_content
+    return description
+
+
+def _describe_claude_value(value):
+    """Describe Claude message content for cache keying, hashing inline and uploaded documents"""
+    if isinstance(value, list):
+        return [_describe_claude_value(item) for item in value]
+    if isinstance(value, dict):
+        if value.get('type') == 'file' and 'file_id' in value:
+            return {'type': 'file', 'sha256': registered_file_hash(value['file_id']) or value['file_id']}
+        if value.get('type') == 'base64' and 'data' in value:
+            return {
+                'type': 'base64',
+                'media_type': value.get('media_type'),
+                'sha256': hashlib.sha256(value['data'].encode('utf-8')).hexdigest(),
+            }
+        return {key: _describe_claude_value(item) for key, item in value.items()}
+    return value
+
+
+def _scaled_cost(cost, factor):
+    return round(cost * factor, 6) if cost is not None else None
+
+
+def _record_call(run, provider, model, label, usage, wall_seconds, first_token_seconds, from_cache,
+                 schedule=None, cost_factor=1.0):
+    """Build the per-call performance record and append it to the run
+
+    wall_seconds covers the final attempt only; time spent queued on rate
+    limits or backing off between retries is reported as waitSeconds.
+    """
+    schedule = schedule or {'attempts': 0 if from_cache else 1, 'waitSeconds': 0.0}
+    record = {
+        'provider': provider,
+        'model': model,
+        'label': label,
+        'fromCache': from_cache,
+        'wallSeconds': round(wall_seconds, 3),
+        'timeToFirstTokenSeconds': round(first_token_seconds, 3) if first_token_seconds is not None else None,
+        'inputTokens': usage.get('inputTokens', 0),
+        'cachedTokens': usage.get('cachedTokens', 0),
+        'cacheWriteTokens': usage.get('cacheWriteTokens', 0),
+        'outputTokens': usage.get('outputTokens', 0),
+        'costUsd': 0.0 if from_cache else _scaled_cost(estimate_cost(model, usage), cost_factor),
+        'attempts': schedule['attempts'],
+        'waitSeconds': schedule['waitSeconds'],
+    }
+    if run is not None:
+        run.setdefault('calls', []).append(record)
+        record_span(run, "generate", time.perf_counter() - wall_seconds, **record)
+    return record
+
+
+def _gemini_cache_key(model, contents, config, cache_salt):
+    # Only what is sent: runs that differ in settings the request doesn't carry
+    # (pass count, early stopping, ...) still share identical calls
+    return response_cache.make_key({
+        'provider': 'gemini',
+        'model': model,
+        'contents': _describe_gemini_contents(contents),
+        'config': _describe_gemini_config(config),
+        'salt': cache_salt,
+    })
+
+
+def _gemini_usage(usage_metadata):
+    if usage_metadata is None:
+        return {'inputTokens': 0, 'cachedTokens': 0, 'outputTokens': 0}
+    return {
+        'inputTokens': usage_metadata.prompt_token_count or 0,
+        'cachedTokens': usage_metadata.cached_content_token_count or 0,
+        # Thinking tokens are billed as output
+        'outputTokens': (usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0),
+    }
+
+
+def _cacheable(text, validate):
+    """Whether a response is complete enough to replay from the cache"""
+    if not text or not text.strip():
+        return False
+    return validate is None or validate(text)
+
+
+def _attempt_text_callback(on_text):
+    """Wrap on_text so every attempt after the first starts with on_text(None)"""
+    attempts = []
+
+    def start_attempt():
+        if on_text is not None and attempts:
+            on_text(None)
+        attempts.append(True)
+        return on_text or (lambda text: None)
+
+    return start_attempt
+
+
+def gemini_generate(client, model, contents, config=None, run=None, cache_salt=None, label=None, on_text=None,
+                    validate=None):
+    """Call models.generate_content (streamed) through the response cache
+
+    cache_salt distinguishes otherwise identical calls that should be sampled
+    separately (e.g. parallel passes with the same prompt). label names the
+    call (e.g. "pass-2") in the run's performance records. on_text receives
+    the text as it streams. validate(text) decides whether the response is
+    cached.
+    """
+    cache_key = _gemini_cache_key(model, contents, config, cache_salt)
+
+    started = time.perf_counter()
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        usage = cached.get('usage', {})
+        performance = _record_call(run, 'gemini', model, label, usage,
+                                   time.perf_counter() - started, None, True)
+        if on_text is not None:
+            on_text(cached['text'])
+        return {'text': cached['text'], 'usage': usage, 'fromCache': True, 'performance': performance}
+
+    start_attempt = _attempt_text_callback(on_text)
+
+    def stream_response():
+        emit_text = start_attempt()
+        attempt_started = time.perf_counter()
+        text_parts = []
+        usage_metadata = None
+        first_token_seconds = None
+        for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+            if chunk.text:
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - attempt_started
+                text_parts.append(chunk.text)
+                emit_text(chunk.text)
+            # Usage metadata is cumulative; the last chunk carries the totals
+            if chunk.usage_metadata is not None:
+                usage_metadata = chunk.usage_metadata
+        return "".join(text_parts), usage_metadata, first_token_seconds, time.perf_counter() - attempt_started
+
+    (text, usage_metadata, first_token_seconds, wall_seconds), schedule = run_call(model, stream_response)
+
+    usage = _gemini_usage(usage_metadata)
+
+    if _cacheable(text, validate):
+        response_cache.put(cache_key, {'model': model, 'text': text, 'usage': usage})
+    performance = _record_call(run, 'gemini', model, label, usage, wall_seconds, first_token_seconds, False,
+                               schedule)
+    return {'text': text, 'usage': usage, 'fromCache': False, 'performance': performance}
+
+
+def _claude_cache_key(params, cache_salt):
+    return response_cache.make_key({
+        'provider': 'anthropic',
+        'params': _describe_claude_value(params),
+        'salt': cache_salt,
+    })
+
+
+def _claude_usage(message_usage):
+    cache_read_tokens = getattr(message_usage, 'cache_read_input_tokens', 0) or 0
+    cache_write_tokens = getattr(message_usage, 'cache_creation_input_tokens', 0) or 0
+    return {
+        # input_tokens excludes cache reads/writes; report the full prompt size
+        'inputTokens': (message_usage.input_tokens or 0) + cache_read_tokens + cache_write_tokens,
+        'cachedTokens': cache_read_tokens,
+        'cacheWriteTokens': cache_write_tokens,
+        'outputTokens': message_usage.output_tokens or 0,
+    }
+
+
+def claude_message(client, run=None, cache_salt=None, label=None, on_text=None, validate=None, **params):
+    """Call messages.create (streamed) through the response cache; params are passed through
+
+    Params with 'betas' (e.g. Files API document references) go through
+    client.beta.messages. on_text receives the text as it streams.
+    validate(text) decides whether the response is cached.
+    """
+    cache_key = _claude_cache_key(params, cache_salt)
+    model = params.get('model')
+
+    started = time.perf_counter()
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        usage = cached.get('usage', {})
+        performance = _record_call(run, 'anthropic', model, label, usage,
+                                   time.perf_counter() - started, None, True)
+        if on_text is not None:
+            on_text(cached['text'])
+        return {'text': cached['text'], 'usage': usage, 'fromCache': True, 'performance': performance}
+
+    start_attempt = _attempt_text_callback(on_text)
+
+    def stream_response():
+        emit_text = start_attempt()
+        attempt_started = time.perf_counter()
+        text_parts = []
+        first_token_seconds = None
+        messages_api = client.beta.messages if params.get('betas') else client.messages
+        with messages_api.stream(**params) as stream:
+            for text_delta in stream.text_stream:
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - attempt_started
+                text_parts.append(text_delta)
+                emit_text(text_delta)
+            response = stream.get_final_message()
+        return "".join(text_parts), response, first_token_seconds, time.perf_counter() - attempt_started
+
+    (text, response, first_token_seconds, wall_seconds), schedule = run_call(model, stream_response)
+    usage = _claude_usage(response.usage)
+
+    if _cacheable(text, validate):
+        response_cache.put(cache_key, {'model': model, 'text': text, 'usage': usage})
+    performance = _record_call(run, 'anthropic', model, label, usage, wall_seconds, first_token_seconds, False,
+                               schedule)
+    return {'text': text, 'usage': usage, 'fromCache': False, 'performance': performance}
+
+
+def claude_message_batch(client, calls, poll_seconds=30, validate=None):
+    """Run many messages.create calls as one Message Batch through the response cache
+
+    calls is a list of dicts with 'customId', 'params' and optionally 'run',
+    'label' and 'cacheSalt'. Cached calls are answered from disk; the rest are
+    submitted together and polled until the batch ends. Returns a dict of
+    customId -> result shaped like claude_message's, or {'error': ...} for
+    requests the batch did not complete. Batch calls are billed at
+    BATCH_PRICE_FACTOR of the synchronous price. 'betas' in the params are
+    applied to the whole batch through client.beta.messages.batches.
+    validate(text) decides whether each response is cached.
+    """
+    results = {}
+    pending = []
+
+    for call in calls:
+        run = call.get('run')
+        params = call['params']
+        cache_key = _claude_cache_key(params, call.get('cacheSalt'))
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            usage = cached.get('usage', {})
+            performance = _record_call(run, 'anthropic', params.get('model'), call.get('label'), usage, 0.0, None, True)
+            results[call['customId']] = {'text': cached['text'], 'usage': usage, 'fromCache': True,
+                                         'performance': performance}
+        else:
+            pending.append((call, cache_key))
+
+    if not pending:
+        return results
+
+    model = pending[0][0]['params'].get('model')
+    betas = sorted({beta for call, _ in pending for beta in call['params'].get('betas', [])})
+    requests = [
+        {'custom_id': call['customId'],
+         'params': {key: value for key, value in call['params'].items() if key != 'betas'}}
+        for call, _ in pending
+    ]
+    if betas:
+        batches_api = client.beta.messages.batches
+        beta_args = {'betas': betas}
+    else:
+        batches_api = client.messages.batches
+        beta_args = {}
+
+    started = time.perf_counter()
+    batch, schedule = run_call(model, lambda: batches_api.create(requests=requests, **beta_args))
+    print(f"  Submitted message batch {batch.id} ({len(pending)} requests)")
+
+    while batch.processing_status != "ended":
+        time.sleep(poll_seconds)
+        batch = batches_api.retrieve(batch.id, **beta_args)
+        counts = getattr(batch, 'request_counts', None)
+        if counts is not None:
+            print(f"  Batch {batch.id}: {counts.processing} processing, {counts.succeeded} succeeded, "
+                  f"{counts.errored} errored")
+    wall_seconds = time.perf_counter() - started
+
+    batch_results = {entry.custom_id: entry.result for entry in batches_api.results(batch.id, **beta_args)}
+
+    for call, cache_key in pending:
+        run = call.get('run')
+        result = batch_results.get(call['customId'])
+        if result is None or result.type != "succeeded":
+            error = getattr(result, 'error', None) if result is not None else "missing from batch results"
+            results[call['customId']] = {'error': f"{getattr(result, 'type', 'missing')}: {error}"}
+            continue
+
+        text = "".join(block.text for block in result.message.content if block.type == "text")
+        usage = _claude_usage(result.message.usage)
+        if _cacheable(text, validate):
+            response_cache.put(cache_key, {'model': model, 'text': text, 'usage': usage})
+        performance = _record_call(run, 'anthropic', model, call.get('label'), usage, wall_seconds, None, False,
+                                   schedule, cost_factor=BATCH_PRICE_FACTOR)
+        results[call['customId']] = {'text': text, 'usage': usage, 'fromCache': False, 'performance': performance}
+
+    return results
+
+
+def gemini_generate_batch(transport, model, calls, poll_seconds=30, display_name=None, on_poll=None,
+                          validate=None):
+    """Run many generate_content calls as one Gemini batch job through the response cache
+
+    transport is a gemini_batches.BatchTransport. calls is a list of dicts
+    with 'customId', 'contents' and optionally 'config', 'run', 'label' and
+    'cacheSalt'. Cached calls are answered from disk; the rest are submitted
+    as one job and polled until it finishes. Returns a dict of customId ->
+    result shaped like gemini_generate's, or {'error': ...} for requests the
+    job did not complete. Batch calls are billed at BATCH_PRICE_FACTOR of the
+    synchronous price. on_poll, if given, is called after every status poll
+    while the job runs (e.g. to keep the context caches it uses alive).
+    validate(text) decides whether each response is cached.
+    """
+    from gemini_batches import JOB_RUNNING, JOB_FAILED
+
+    results = {}
+    pending = []
+
+    for call in calls:
+        run = call.get('run')
+        cache_key = _gemini_cache_key(model, call['contents'], call.get('config'), call.get('cacheSalt'))
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            usage = cached.get('usage', {})
+            performance = _record_call(run, 'gemini', model, call.get('label'), usage, 0.0, None, True)
+            results[call['customId']] = {'text': cached['text'], 'usage': usage, 'fromCache': True,
+                                         'performance': performance}
+        else:
+            pending.append((call, cache_key))
+
+    if not pending:
+        return results
+
+    started = time.perf_counter()
+    job_name, schedule = run_call(model, lambda: transport.submit(
+        model,
+        [{'contents': call['contents'], 'config': call.get('config')} for call, _ in pending],
+        display_name or f"batch-{len(pending)}-requests"
+    ))
+    print(f"  Submitted Gemini batch {job_name} ({len(pending)} requests)")
+
+    state = transport.state(job_name)
+    while state == JOB_RUNNING:
+        time.sleep(poll_seconds)
+        state = transport.state(job_name)
+        print(f"  Batch {job_name}: {state}")
+        if on_poll is not None and state == JOB_RUNNING:
+            on_poll()
+    wall_seconds = time.perf_counter() - started
+
+    if state == JOB_FAILED:
+        for call, _ in pending:
+            results[call['customId']] = {'error': f"batch job {job_name} failed"}
+        return results
+
+    job_results = transport.results(job_name)
+    for position, (call, cache_key) in enumerate(pending):
+        result = job_results[position] if position < len(job_results) else {'error': "missing from batch results"}
+        if 'error' in result:
+            results[call['customId']] = {'error': result['error']}
+            continue
+
+        text = result['text']
+        usage = _gemini_usage(result.get('usageMetadata'))
+        if _cacheable(text, validate):
+            response_cache.put(cache_key, {'model': model, 'text': text, 'usage': usage})
+        performance = _record_call(call.get('run'), 'gemini', model, call.get('label'), usage, wall_seconds, None,
+                                   False, schedule, cost_factor=BATCH_PRICE_FACTOR)
+        results[call['customId']] = {'text': text, 'usage': usage, 'fromCache': False, 'performance': performance}
+
+    return results
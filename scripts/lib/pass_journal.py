@@ -0,0 +1,115 @@
+"""
+Per-pass checkpoints for resumable workflow runs
+
+save_analysis only writes once a run finishes, so a run that dies partway
+(network drop, quota, Ctrl-C) loses every pass it completed. Workflows append
+each completed pass - its parsed issues and pass detail - as one line to a
+journal in the trial's analyses dir:
+
+    <workflow_id>-<config_key>.journal.jsonl
+
+The key hashes the run configuration and its input fingerprint, so --resume
+only reuses passes from a run set up the same way on the same transcript,
+assets, prompt and model. Passes that failed are not journaled, so a resumed
+run redoes them along with the passes it never reached. The journal is
+removed once a run saves with every pass succeeding.
+"""
+
+import json
+import hashlib
+
+from analysis_utils import setup_paths
+from file_lock import locked
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+
+def config_key(configuration, fingerprint_key=None):
+    """Short hash of a run configuration and the key of its input fingerprint"""
+    return hashlib.sha256(
+        json.dumps([configuration, fingerprint_key], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()[:16]
+
+
+def _read_entries(journal_path):
+    entries = {}
+    if not journal_path.exists():
+        return entries
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short when the run died
+                continue
+            entries[str(entry['pass'])] = entry
+    return entries
+
+
+def open_journal(run, resume=False):
+    """Journal for a run; with resume, loads the passes an earlier run completed
+
+    Call after find_current_analysis, which sets the run's input fingerprint.
+    Without resume, any journal left by an earlier run with the same
+    configuration and inputs is discarded.
+    """
+    analyses_dir = setup_paths(run['trialId'])['analyses_dir']
+    key = config_key(run['configuration'], run.get('inputFingerprint', {}).get('key'))
+    journal_path = analyses_dir / f"{run['workflowId']}-{key}{JOURNAL_SUFFIX}"
+
+    completed = {}
+    if resume:
+        completed = _read_entries(journal_path)
+        if journal_path.exists():
+            # Rewrite without any partial last line, so new entries start on a line of their own
+            with open(journal_path, 'w') as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in completed.values())
+        if completed:
+            print(f"✓ Resuming {len(completed)} completed pass(es) from {journal_path.name}")
+        else:
+            print(f"⚠ No checkpointed passes to resume for this configuration and inputs")
+    elif journal_path.exists():
+        journal_path.unlink()
+
+    return {'path': journal_path, 'completed': completed}
+
+
+def completed_pass(journal, pass_id):
+    """(parsed_issues, pass_detail) of a pass an earlier run completed, or None"""
+    if journal is None:
+        return None
+    entry = journal['completed'].get(str(pass_id))
+    if entry is None:
+        return None
+    return entry['issues'], dict(entry['passDetail'], resumed=True)
+
+
+def record_pass(journal, pass_id, parsed_issues, pass_detail):
+    """Checkpoint a completed pass; failed passes are left out so --resume redoes them"""
+    if journal is None or 'error' in pass_detail:
+        return
+    line = json.dumps({'pass': pass_id, 'issues': parsed_issues, 'passDetail': pass_detail}) + "\n"
+
+    journal['path'].parent.mkdir(parents=True, exist_ok=True)
+    with locked(journal['path'].with_suffix(".lock")):
+        with open(journal['path'], 'a') as f:
+            f.write(line)
+
+
+def close_journal(journal, pass_details):
+    """Remove the journal after a fully successful run; keep it if any pass failed"""
+    if journal is None:
+        return
+    failed = [detail for detail in pass_details if 'error' in detail]
+    if failed:
+        print(f"⚠ {len(failed)} pass(es) failed; rerun with --resume to redo only those")
+        return
+    journal['path'].unlink(missing_ok=True)
+    journal['path'].with_suffix(".lock").unlink(missing_ok=True)
+
+
+def add_resume_arguments(parser):
+    """Add the --resume switch to a workflow's CLI"""
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse passes checkpointed by an earlier run with the same configuration; "
+                             "redo only failed or missing ones")
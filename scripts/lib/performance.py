@@ -0,0 +1,98 @@
+"""
+Per-call latency, token and cost accounting
+
+model_calls records one entry per model call on the run; save_analysis sums
+them into metrics.performance so workflows can be compared on cost and
+latency per issue found.
+"""
+
+# USD per 1M tokens. Gemini 2.5 Pro bills prompts above 200k tokens at the
+# higher tier; Claude cache writes cost more than plain input.
+MODEL_PRICING = {
+    'gemini-2.5-pro': {
+        'input': 1.25, 'cachedInput': 0.31, 'output': 10.00,
+        'longContextThreshold': 200_000,
+        'longContext': {'input': 2.50, 'cachedInput': 0.625, 'output': 15.00},
+    },
+    'claude-sonnet-4-5': {
+        'input': 3.00, 'cachedInput': 0.30, 'cacheWrite': 3.75, 'output': 15.00,
+    },
+}
+
+
+# Batch APIs bill at half the synchronous price
+BATCH_PRICE_FACTOR = 0.5
+
+
+def _pricing_for(model):
+    for model_prefix, pricing in MODEL_PRICING.items():
+        if model_prefix in (model or ""):
+            return pricing
+    return None
+
+
+def estimate_cost(model, usage):
+    """Estimated USD cost of one call from its normalized usage, or None if unpriced"""
+    pricing = _pricing_for(model)
+    if pricing is None:
+        return None
+
+    input_tokens = usage.get('inputTokens', 0)
+    if input_tokens > pricing.get('longContextThreshold', float('inf')):
+        pricing = {**pricing, **pricing['longContext']}
+
+    cached_tokens = usage.get('cachedTokens', 0)
+    cache_write_tokens = usage.get('cacheWriteTokens', 0)
+    uncached_tokens = max(0, input_tokens - cached_tokens - cache_write_tokens)
+
+    cost = (
+        uncached_tokens * pricing['input']
+        + cached_tokens * pricing['cachedInput']
+        + cache_write_tokens * pricing.get('cacheWrite', pricing['input'])
+        + usage.get('outputTokens', 0) * pricing['output']
+    ) / 1_000_000
+    return round(cost, 6)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize_performance(calls, issues_found=None):
+    """Sum per-call records into the metrics.performance block"""
+    live_calls = [call for call in calls if not call['fromCache']]
+    costs = [call['costUsd'] for call in live_calls if call['costUsd'] is not None]
+    latencies = [call['wallSeconds'] for call in live_calls]
+    first_token_latencies = [
+        call['timeToFirstTokenSeconds'] for call in live_calls
+        if call['timeToFirstTokenSeconds'] is not None
+    ]
+
+    total_cost = round(sum(costs), 6) if costs else None
+    summary = {
+        'calls': len(calls),
+        'cachedResponses': len(calls) - len(live_calls),
+        'modelSeconds': round(sum(latencies), 3),
+        'waitSeconds': round(sum(call.get('waitSeconds', 0) for call in live_calls), 3),
+        'retries': sum(max(0, call.get('attempts', 1) - 1) for call in live_calls),
+        'latencySeconds': {
+            'p50': _percentile(latencies, 0.5),
+            'p90': _percentile(latencies, 0.9),
+            'max': max(latencies) if latencies else None,
+        },
+        'timeToFirstTokenSeconds': {
+            'p50': _percentile(first_token_latencies, 0.5),
+            'p90': _percentile(first_token_latencies, 0.9),
+        },
+        'inputTokens': sum(call['inputTokens'] for call in live_calls),
+        'cachedTokens': sum(call['cachedTokens'] for call in live_calls),
+        'outputTokens': sum(call['outputTokens'] for call in live_calls),
+        'costUsd': total_cost,
+    }
+    if issues_found:
+        summary['costPerIssueUsd'] = round(total_cost / issues_found, 6) if total_cost is not None else None
+        summary['modelSecondsPerIssue'] = round(summary['modelSeconds'] / issues_found, 3)
+    return summary
@@ -0,0 +1,94 @@
+"""
+Cross-process request quota per model
+
+Workflow scripts running at the same time share one API key, so the request
+rate limit has to be shared too. Each model gets a token bucket whose state
+lives in data/.cache/quota/<model>.json and is updated under a file lock, so
+every process that calls the model (through call_scheduler) draws from the
+same bucket and the combined rate stays under the configured ceiling.
+
+Ceilings default to call_scheduler.MODEL_LIMITS and can be overridden in
+data/quota-limits.json, e.g. {"gemini-2.5-pro": {"requestsPerMinute": 100}}.
+"""
+
+import re
+import json
+import time
+
+from analysis_utils import get_data_dir
+from file_lock import locked
+
+
+def _quota_dir():
+    return get_data_dir() / ".cache" / "quota"
+
+
+def normalize_model_name(model):
+    """Bare model name, so "models/gemini-2.5-pro" and "gemini-2.5-pro" share quota"""
+    model = model or ""
+    return model[len("models/"):] if model.startswith("models/") else model
+
+
+def load_limit_overrides():
+    """Per-model limit overrides from data/quota-limits.json (empty if absent)"""
+    config_path = get_data_dir() / "quota-limits.json"
+    if not config_path.exists():
+        return {}
+    with open(config_path, 'r') as f:
+        return json.load(f)
+
+
+class SharedTokenBucket:
+    """Token bucket for one model, shared by all processes via a locked state file"""
+
+    def __init__(self, model, rate, capacity):
+        self.model = normalize_model_name(model)
+        self.rate = rate
+        self.capacity = capacity
+        self._safe_name = re.sub(r'[^\w.-]', '_', self.model)
+
+    @property
+    def state_path(self):
+        return _quota_dir() / f"{self._safe_name}.json"
+
+    @property
+    def lock_path(self):
+        return self.state_path.with_suffix(".lock")
+
+    def _read_state(self, now):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'tokens': self.capacity, 'updated': now}
+        # Refill for the time since the last update (clamped against clock steps)
+        elapsed = max(0.0, now - state['updated'])
+        return {'tokens': min(self.capacity, state['tokens'] + elapsed * self.rate), 'updated': now}
+
+    def _write_state(self, state):
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        tmp_path.replace(self.state_path)
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with locked(self.lock_path):
+                state = self._read_state(time.time())
+                if state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    self._write_state(state)
+                    return waited
+                self._write_state(state)
+                delay = (1 - state['tokens']) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Empty the bucket after a throttling error so every process backs off"""
+        with locked(self.lock_path):
+            state = self._read_state(time.time())
+            state['tokens'] = min(state['tokens'], 0.0)
+            self._write_state(state)
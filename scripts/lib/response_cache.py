@@ -0,0 +1,111 @@
+"""
+On-disk cache of model responses
+
+Responses are stored under data/.cache/responses, keyed on a SHA-256 of the
+model, the full prompt text, the hashes of attached files, the request config
+and a per-call salt. Re-running a workflow after a crash or a post-processing
+change replays identical calls from disk instead of paying for them again.
+Empty and unparseable responses are never stored (see model_calls), so they
+are asked for again rather than replayed.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from analysis_utils import get_data_dir
+
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+MAX_CACHE_AGE_SECONDS = 30 * 24 * 3600
+
+# Set from the --no-cache / --refresh command line switches
+SETTINGS = {
+    'enabled': True,
+    'refresh': False,
+}
+
+
+def _cache_dir():
+    return get_data_dir() / ".cache" / "responses"
+
+
+def _entry_path(key):
+    return _cache_dir() / key[:2] / f"{key}.json"
+
+
+def configure(enabled=True, refresh=False):
+    """Enable/disable the cache; refresh=True ignores hits but stores new responses"""
+    SETTINGS['enabled'] = enabled
+    SETTINGS['refresh'] = refresh
+    if enabled:
+        evict()
+
+
+def make_key(parts):
+    """Stable SHA-256 key for a JSON-serializable description of a call"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Return the cached entry for key, or None on a miss"""
+    if not SETTINGS['enabled'] or SETTINGS['refresh']:
+        return None
+
+    entry_path = _entry_path(key)
+    try:
+        if time.time() - entry_path.stat().st_mtime > MAX_CACHE_AGE_SECONDS:
+            return None
+        with open(entry_path, 'r') as f:
+            entry = json.load(f)
+        # Bump mtime so eviction treats the entry as recently used
+        os.utime(entry_path)
+        return entry
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def put(key, entry):
+    """Store an entry (a JSON-serializable dict) under key"""
+    if not SETTINGS['enabled']:
+        return
+
+    entry_path = _entry_path(key)
+    entry_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = entry_path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    tmp_path.replace(entry_path)
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, max_age_seconds=MAX_CACHE_AGE_SECONDS):
+    """Drop entries unused for max_age_seconds, then least recently used until under max_bytes"""
+    cache_dir = _cache_dir()
+    if not cache_dir.exists():
+        return 0
+
+    now = time.time()
+    entries = []
+    removed = 0
+    for entry_path in cache_dir.glob("*/*.json"):
+        try:
+            stat = entry_path.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > max_age_seconds:
+            entry_path.unlink(missing_ok=True)
+            removed += 1
+        else:
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        entry_path.unlink(missing_ok=True)
+        total_bytes -= size
+        removed += 1
+
+    return removed
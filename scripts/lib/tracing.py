@@ -0,0 +1,110 @@
+"""
+Stage-level tracing spans
+
+With tracing enabled (--trace), start_run attaches a Tracer to the run and
+each stage (setup_paths, upload, cache create, generate, parse, save)
+records a span. save_analysis writes the spans next to the analysis output as
+<analysis>.trace.json in Chrome trace-event format, which chrome://tracing,
+Perfetto and most OTLP converters load directly.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+SETTINGS = {
+    'enabled': False,
+}
+
+
+def configure(enabled):
+    """Turn tracing on or off for runs started after this call"""
+    SETTINGS['enabled'] = enabled
+
+
+class Tracer:
+    """Collects complete ("X") trace events for one workflow run"""
+
+    def __init__(self, name):
+        self.name = name
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _add_event(self, name, start_us, end_us, args):
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': round(start_us, 1),
+            'dur': round(end_us - start_us, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, **args):
+        """Time the enclosed block; yields the args dict so callers can annotate it"""
+        start = self._now_us()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._add_event(name, start, self._now_us(), args)
+
+    def record(self, name, started, **args):
+        """Record a span that began at perf_counter() value `started` and ends now"""
+        self._add_event(name, (started - self._origin) * 1_000_000, self._now_us(), args)
+
+    def to_json(self):
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+        thread_names = {}
+        for event in events:
+            thread_names.setdefault(event['tid'], f"worker-{len(thread_names)}")
+        metadata = [
+            {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': self.name}}
+        ] + [
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': thread_name}}
+            for tid, thread_name in thread_names.items()
+        ]
+        return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+
+    def write(self, output_path):
+        with open(output_path, 'w') as f:
+            json.dump(self.to_json(), f)
+        return output_path
+
+
+def new_tracer(name):
+    """A Tracer when tracing is enabled, else None"""
+    return Tracer(name) if SETTINGS['enabled'] else None
+
+
+def span(run, name, **args):
+    """Span on the run's tracer; a no-op context when the run is not traced"""
+    tracer = run.get('tracer') if run else None
+    if tracer is None:
+        return nullcontext(args)
+    return tracer.span(name, **args)
+
+
+def record_span(run, name, started, **args):
+    """Record an already finished span (started is a time.perf_counter() value)"""
+    tracer = run.get('tracer') if run else None
+    if tracer is not None:
+        tracer.record(name, started, **args)
+
+
+def trace_path_for(output_path):
+    """analyses/<name>.json -> analyses/<name>.trace.json"""
+    return output_path.with_name(f"{output_path.stem}.trace.json")
@@ -0,0 +1,292 @@
+"""
+Transcript ingestion: timestamped segments from transcript.pdf
+
+Segments follow the TranscriptSegment shape in src/lib/types.ts
+(startTime, endTime, speaker, text; times in seconds).
+
+Parsed segments are stored next to the PDF as transcript.segments.json plus a
+binary offset index (transcript.segments.idx), and rebuilt only when the PDF
+hash changes, so later stages load them without re-parsing the PDF.
+
+Requirements:
+    pip install pypdf
+"""
+
+import re
+import json
+import struct
+import bisect
+from pathlib import Path
+
+from analysis_utils import file_sha256
+
+SEGMENTS_FILENAME = "transcript.segments.json"
+INDEX_FILENAME = "transcript.segments.idx"
+
+# Index layout: magic, version, segment count, source PDF SHA-256, then one
+# record per segment: startTime ms, endTime ms, byte offset and byte length of
+# the segment's JSON object inside transcript.segments.json
+INDEX_MAGIC = b"TSIX"
+# Bumped when parsing changes, so artifacts from an older parser are rebuilt
+INDEX_VERSION = 3
+INDEX_HEADER = struct.Struct("<4sII32s")
+INDEX_RECORD = struct.Struct("<IIQI")
+
+# [HH:MM:SS] or [HH:MM:SS,mmm] (also accepts '.' as the millisecond separator)
+TIMESTAMP_PATTERN = re.compile(r'\[(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?\]')
+
+_TIME = r'\d{1,2}:\d{2}:\d{2}(?:[,.]\d{1,3})?'
+_RANGE_SEPARATOR = r'\s*(?:-->|-|–)\s*'
+
+# What starts a new segment: a timestamp with an optional end time
+# ("[start --> end]" or "[start] --> [end]"), then an optional "Speaker:"
+# label; the segment's text runs until the next marker. PDF extraction can
+# put several markers on one line
+SEGMENT_MARKER_PATTERN = re.compile(
+    rf'\[(?P<start>{_TIME})(?:{_RANGE_SEPARATOR}(?P<end>{_TIME}))?\]'
+    rf'(?:{_RANGE_SEPARATOR}\[(?P<bracketed_end>{_TIME})\])?'
+    r'\s*(?:(?P<speaker>[A-Za-z][\w .\'-]{0,30}?)\s*:)?'
+)
+
+SPEAKER_ALIASES = {
+    'tutor': 'Tutor',
+    'teacher': 'Tutor',
+    'student': 'Student',
+    'child': 'Student',
+    'kid': 'Student',
+    'parent': 'Parent',
+    'mom': 'Parent',
+    'mother': 'Parent',
+    'dad': 'Parent',
+    'father': 'Parent',
+}
+# Speaker for segments with no label, or one that matches no alias
+UNKNOWN_SPEAKER = "Unknown"
+
+
+def parse_timestamp_to_seconds(timestamp_str):
+    """Parse timestamp like [00:05:23,456] to seconds (0 if no timestamp found)"""
+    match = TIMESTAMP_PATTERN.search(timestamp_str)
+    if match:
+        hours, minutes, seconds = map(int, match.groups()[:3])
+        milliseconds = int((match.group(4) or "0").ljust(3, "0"))
+        total = hours * 3600 + minutes * 60 + seconds
+        return total + milliseconds / 1000 if milliseconds else total
+    return 0
+
+
+def format_timestamp(seconds):
+    """Format seconds as [HH:MM:SS,mmm], the transcript's own notation"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"[{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}]"
+
+
+def normalize_speaker(label):
+    """Map a raw speaker label onto Student/Tutor/Parent
+
+    Missing and unrecognized labels map to UNKNOWN_SPEAKER, the one fallback
+    TranscriptSegment.speaker allows.
+    """
+    lowered = (label or "").strip().lower()
+    for alias, speaker in SPEAKER_ALIASES.items():
+        if lowered.startswith(alias):
+            return speaker
+    return UNKNOWN_SPEAKER
+
+
+def extract_transcript_text(pdf_path):
+    """Extract the raw text of a transcript PDF"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("Transcript parsing requires pypdf: pip install pypdf")
+
+    reader = PdfReader(str(pdf_path))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def parse_transcript_segments(text):
+    """Split transcript text into timestamped segments
+
+    Every timestamp marker starts a segment, including several on one line.
+    Text before a line's first marker continues the previous segment (PDF
+    extraction wraps long utterances).
+    """
+    segments = []
+
+    for line in text.splitlines():
+        matches = list(SEGMENT_MARKER_PATTERN.finditer(line))
+        leading = line[:matches[0].start()] if matches else line
+        if segments and leading.strip():
+            segments[-1]['text'] = f"{segments[-1]['text']} {leading.strip()}".strip()
+
+        for match, following in zip(matches, matches[1:] + [None]):
+            end = match.group('end') or match.group('bracketed_end')
+            segments.append({
+                'startTime': parse_timestamp_to_seconds(f"[{match.group('start')}]"),
+                'endTime': parse_timestamp_to_seconds(f"[{end}]") if end else None,
+                'speaker': normalize_speaker(match.group('speaker')),
+                'text': line[match.end():following.start() if following else len(line)].strip(),
+            })
+
+    # Segments without an explicit end run until the next one starts
+    for current, following in zip(segments, segments[1:]):
+        if current['endTime'] is None:
+            current['endTime'] = following['startTime']
+    if segments and segments[-1]['endTime'] is None:
+        segments[-1]['endTime'] = segments[-1]['startTime']
+
+    return segments
+
+
+def parse_transcript_pdf(transcript_path):
+    """Parse transcript.pdf into segments"""
+    segments = parse_transcript_segments(extract_transcript_text(transcript_path))
+    if not segments:
+        raise ValueError(f"No timestamped lines found in transcript: {transcript_path}")
+    return segments
+
+
+def _artifact_paths(transcript_path):
+    transcript_path = Path(transcript_path)
+    return transcript_path.parent / SEGMENTS_FILENAME, transcript_path.parent / INDEX_FILENAME
+
+
+def build_transcript_index(transcript_path):
+    """Parse transcript.pdf and write the segments JSON and offset index beside it"""
+    return write_transcript_index(transcript_path, parse_transcript_pdf(transcript_path))
+
+
+def write_transcript_index(transcript_path, segments):
+    """Write already parsed segments as the transcript's segments JSON and offset index"""
+    segments_path, index_path = _artifact_paths(transcript_path)
+    source_sha256 = file_sha256(transcript_path)
+
+    # Write the JSON by hand so each segment's byte span is known
+    header = json.dumps({
+        'sourceSha256': source_sha256,
+        'indexVersion': INDEX_VERSION,
+        'segmentCount': len(segments),
+        'durationSeconds': transcript_duration(segments),
+    })
+    body = bytearray(header[:-1].encode('utf-8') + b', "segments": [\n')
+    records = []
+    for position, segment in enumerate(segments):
+        encoded = json.dumps(segment, ensure_ascii=False).encode('utf-8')
+        records.append(INDEX_RECORD.pack(
+            int(round(segment['startTime'] * 1000)),
+            int(round(segment['endTime'] * 1000)),
+            len(body),
+            len(encoded)
+        ))
+        body += encoded + (b",\n" if position < len(segments) - 1 else b"\n")
+    body += b"]}\n"
+
+    segments_path.write_bytes(bytes(body))
+    index_path.write_bytes(
+        INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(segments), bytes.fromhex(source_sha256))
+        + b"".join(records)
+    )
+    return segments
+
+
+def _read_index(transcript_path):
+    """Read the offset index if it matches the current PDF, else None"""
+    _, index_path = _artifact_paths(transcript_path)
+    if not index_path.exists():
+        return None
+
+    data = index_path.read_bytes()
+    if len(data) < INDEX_HEADER.size:
+        return None
+    magic, version, count, source_digest = INDEX_HEADER.unpack_from(data)
+    if (magic != INDEX_MAGIC or version != INDEX_VERSION
+            or source_digest.hex() != file_sha256(transcript_path)
+            or len(data) != INDEX_HEADER.size + count * INDEX_RECORD.size):
+        return None
+
+    return [INDEX_RECORD.unpack_from(data, INDEX_HEADER.size + i * INDEX_RECORD.size) for i in range(count)]
+
+
+def ensure_transcript_index(transcript_path):
+    """Build the transcript artifacts unless they are current; returns True if rebuilt"""
+    segments_path, _ = _artifact_paths(transcript_path)
+    if segments_path.exists() and _read_index(transcript_path) is not None:
+        return False
+    build_transcript_index(transcript_path)
+    return True
+
+
+def load_transcript_segments(transcript_path):
+    """Load the transcript's segments, re-parsing the PDF only when its hash changed"""
+    segments_path, _ = _artifact_paths(transcript_path)
+    if segments_path.exists():
+        try:
+            with open(segments_path, 'r') as f:
+                stored = json.load(f)
+            if (stored.get('sourceSha256') == file_sha256(transcript_path)
+                    and stored.get('indexVersion') == INDEX_VERSION):
+                return stored['segments']
+        except (json.JSONDecodeError, OSError, KeyError):
+            pass
+
+    return build_transcript_index(transcript_path)
+
+
+def segments_in_range(transcript_path, start_seconds, end_seconds):
+    """Segments starting in [start_seconds, end_seconds), read via the offset index"""
+    ensure_transcript_index(transcript_path)
+    records = _read_index(transcript_path)
+    segments_path, _ = _artifact_paths(transcript_path)
+
+    start_times = [record[0] for record in records]
+    first = bisect.bisect_left(start_times, int(round(start_seconds * 1000)))
+    last = bisect.bisect_left(start_times, int(round(end_seconds * 1000)))
+
+    segments = []
+    with open(segments_path, 'rb') as f:
+        for _, _, offset, length in records[first:last]:
+            f.seek(offset)
+            segments.append(json.loads(f.read(length)))
+    return segments
+
+
+def transcript_duration(segments):
+    """Duration of a transcript in seconds (end of the last segment)"""
+    return max((segment['endTime'] for segment in segments), default=0)
+
+
+def split_into_windows(segments, window_seconds, overlap_seconds=0):
+    """Group segments into consecutive fixed-length time windows
+
+    A segment belongs to the window its startTime falls in. With
+    overlap_seconds, each window also carries the first overlap_seconds of
+    the next window so moments spanning a boundary are seen in full. The
+    number of windows follows from the actual transcript duration.
+    """
+    duration = transcript_duration(segments)
+    num_windows = max(1, int(-(-duration // window_seconds)))
+
+    windows = [
+        {'startTime': index * window_seconds, 'endTime': (index + 1) * window_seconds, 'segments': []}
+        for index in range(num_windows)
+    ]
+    for segment in segments:
+        index = min(int(segment['startTime'] // window_seconds), num_windows - 1)
+        windows[index]['segments'].append(segment)
+        # Also carry the segment into the previous window's trailing overlap
+        if index > 0 and segment['startTime'] < windows[index]['startTime'] + overlap_seconds:
+            windows[index - 1]['segments'].append(segment)
+
+    return windows
+
+
+def format_segments(segments):
+    """Render segments back into timestamped transcript lines"""
+    return "\n".join(
+        f"{format_timestamp(segment['startTime'])} {segment['speaker']}: {segment['text']}"
+        for segment in segments
+    )
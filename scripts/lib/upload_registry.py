@@ -0,0 +1,126 @@
+"""
+Content-addressed registry of files uploaded to Gemini
+
+Maps each local file's SHA-256 to its remote Gemini file name and expiry in
+data/.cache/gemini-uploads.json, so live uploads are reused across passes,
+workflows and processes. A file is re-uploaded only when its hash changes or
+the remote copy has expired.
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from analysis_utils import get_data_dir, file_sha256
+from file_lock import locked
+from tracing import span
+
+# Gemini keeps uploaded files for 48 hours; treat them as expired a bit early
+# so a long run never references a file that disappears mid-pass.
+DEFAULT_FILE_LIFETIME = timedelta(hours=47)
+EXPIRY_MARGIN = timedelta(minutes=30)
+
+# Uploads already verified in this process, keyed by SHA-256
+_live_files = {}
+_upload_locks = {}
+_upload_locks_guard = threading.Lock()
+
+
+def _registry_path():
+    return get_data_dir() / ".cache" / "gemini-uploads.json"
+
+
+def _load_registry():
+    registry_path = _registry_path()
+    if not registry_path.exists():
+        return {}
+    try:
+        with open(registry_path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def _save_registry(registry):
+    registry_path = _registry_path()
+    tmp_path = registry_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(registry, f, indent=2)
+    tmp_path.replace(registry_path)
+
+
+def _is_live(expires_at):
+    return datetime.fromisoformat(expires_at) - EXPIRY_MARGIN > datetime.now(timezone.utc)
+
+
+def registered_hash(file_name_or_uri):
+    """Look up the SHA-256 of an uploaded file by its remote name or URI, if known"""
+    for sha256, (remote_file, _) in list(_live_files.items()):
+        if file_name_or_uri in (remote_file.name, getattr(remote_file, 'uri', None)):
+            return sha256
+    return None
+
+
+def get_or_upload(client, file_path, run=None):
+    """Return a live Gemini file for file_path, uploading only when needed"""
+    file_path = Path(file_path)
+    with span(run, "upload", file=file_path.name) as span_args:
+        remote_file, span_args['outcome'] = _get_or_upload(client, file_path)
+    return remote_file
+
+
+def _get_or_upload(client, file_path):
+    """get_or_upload without tracing; returns (remote_file, outcome)"""
+    sha256 = file_sha256(file_path)
+
+    with _upload_locks_guard:
+        upload_lock = _upload_locks.setdefault(sha256, threading.Lock())
+
+    # Serialize per hash so concurrent trials share one upload of the playbook
+    with upload_lock:
+        if sha256 in _live_files:
+            remote_file, expires_at = _live_files[sha256]
+            if _is_live(expires_at):
+                return remote_file, "memory"
+
+        with locked(_registry_path().with_suffix(".lock")):
+            entry = _load_registry().get(sha256)
+
+        if entry and _is_live(entry['expiresAt']):
+            try:
+                remote_file = client.files.get(name=entry['name'])
+                if str(getattr(remote_file, 'state', '')).endswith('FAILED'):
+                    raise ValueError(f"Remote file {entry['name']} is in FAILED state")
+                _live_files[sha256] = (remote_file, entry['expiresAt'])
+                print(f"  ↺ Reusing upload of {file_path.name}: {entry['name']}")
+                return remote_file, "registry"
+            except Exception as e:
+                print(f"  ⚠ Registered upload of {file_path.name} is unusable ({e}), re-uploading")
+
+        remote_file = client.files.upload(file=file_path)
+        expiration_time = getattr(remote_file, 'expiration_time', None)
+        if expiration_time is None:
+            expiration_time = datetime.now(timezone.utc) + DEFAULT_FILE_LIFETIME
+        elif expiration_time.tzinfo is None:
+            expiration_time = expiration_time.replace(tzinfo=timezone.utc)
+        expires_at = expiration_time.isoformat()
+
+        with locked(_registry_path().with_suffix(".lock")):
+            registry = _load_registry()
+            registry[sha256] = {
+                'name': remote_file.name,
+                'uri': getattr(remote_file, 'uri', None),
+                'mimeType': getattr(remote_file, 'mime_type', None),
+                'localPath': str(file_path),
+                'sizeBytes': file_path.stat().st_size,
+                'uploadedAt': datetime.now(timezone.utc).isoformat(),
+                'expiresAt': expires_at,
+            }
+            # Drop expired entries so the registry stays small
+            registry = {key: value for key, value in registry.items() if _is_live(value['expiresAt'])}
+            _save_registry(registry)
+
+        _live_files[sha256] = (remote_file, expires_at)
+        print(f"  ✓ Uploaded {file_path.name}: {remote_file.name}")
+        return remote_file, "uploaded"
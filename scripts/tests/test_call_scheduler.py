@@ -0,0 +1,83 @@
+"""
+Tests for the per-model call scheduler
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+import call_scheduler
+from call_scheduler import AIMDLimiter, RetryBudget, get_scheduler, limits_for, run_call
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+@pytest.fixture(autouse=True)
+def isolated_scheduler(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(call_scheduler, "backoff_seconds", lambda attempt: 0)
+    call_scheduler.reset()
+    yield
+    call_scheduler.reset()
+
+
+def test_resource_prefixed_model_shares_scheduler():
+    assert get_scheduler("models/gemini-2.5-pro") is get_scheduler("gemini-2.5-pro")
+    assert limits_for("models/gemini-2.5-pro") == limits_for("gemini-2.5-pro")
+
+
+def test_limiter_halves_once_per_throttle_burst():
+    limiter = AIMDLimiter(initial=8, maximum=32)
+    for _ in range(3):
+        limiter.acquire()
+    for _ in range(3):
+        limiter.release('throttled')
+    assert limiter.limit == 4
+
+
+def test_limiter_grows_one_slot_per_window_of_successes():
+    limiter = AIMDLimiter(initial=4, maximum=32)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release('success')
+    assert 4.9 < limiter.limit < 5
+
+
+def test_retry_budget_floor_and_ratio():
+    budget = RetryBudget(ratio=0.5, minimum=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_success()
+    budget.record_success()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+
+def test_run_call_retries_throttling():
+    failures = [FakeAPIError(429), FakeAPIError(503)]
+
+    def flaky():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    result, stats = run_call("gemini-2.5-pro", flaky)
+    assert result == "ok"
+    assert stats['attempts'] == 3
+
+
+def test_run_call_raises_non_retryable_errors():
+    def bad_request():
+        raise FakeAPIError(400)
+
+    with pytest.raises(FakeAPIError):
+        run_call("gemini-2.5-pro", bad_request)
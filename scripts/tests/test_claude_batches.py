@@ -0,0 +1,116 @@
+"""
+Tests for Message Batches through the response cache
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+import call_scheduler
+import response_cache
+from fake_clients import FakeAnthropicClient, ScriptedBehavior
+from issue_stream import is_complete_issue_response
+from model_calls import claude_message_batch
+
+MODEL = "claude-sonnet-4-5"
+
+
+def issues_json(quote):
+    return json.dumps([{'timestamp': "[00:01:00]", 'theme': "Warm Up", 'quote': quote}])
+
+
+def pass_calls(*names):
+    return [{'customId': name, 'label': name,
+             'params': {'model': MODEL, 'max_tokens': 100, 'messages': [{'role': "user", 'content': name}]}}
+            for name in names]
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+    response_cache.configure(enabled=True, refresh=False)
+    call_scheduler.reset()
+
+
+def run_batch(client, calls, poll_seconds=0):
+    return claude_message_batch(client, calls, poll_seconds=poll_seconds, validate=is_complete_issue_response)
+
+
+def test_batch_is_polled_until_it_ends():
+    client = FakeAnthropicClient(ScriptedBehavior([issues_json("a")], latency_seconds=0.05))
+    results = run_batch(client, pass_calls("trial-0-pass-1"), poll_seconds=0.01)
+    assert results["trial-0-pass-1"]['text'] == issues_json("a")
+    assert client.behavior.counts["messages.batches.retrieve"] >= 2
+
+
+def test_results_are_matched_by_custom_id(monkeypatch):
+    client = FakeAnthropicClient(ScriptedBehavior([issues_json("a"), issues_json("b"), issues_json("c")]))
+    batches = client.messages.batches
+    in_order = batches.results
+    monkeypatch.setattr(batches, "results", lambda batch_id, betas=None: reversed(list(in_order(batch_id))))
+
+    results = run_batch(client, pass_calls("trial-0-pass-1", "trial-1-pass-1", "trial-2-pass-1"))
+    assert [results[f"trial-{index}-pass-1"]['text'] for index in range(3)] == [
+        issues_json("a"), issues_json("b"), issues_json("c")
+    ]
+
+
+def test_cache_hits_skip_submission():
+    client = FakeAnthropicClient(ScriptedBehavior([issues_json("a"), issues_json("b")]))
+    run_batch(client, pass_calls("trial-0-pass-1"))
+    results = run_batch(client, pass_calls("trial-0-pass-1"))
+    assert results["trial-0-pass-1"]['fromCache'] is True
+    assert client.behavior.counts["messages.batches.create"] == 1
+
+    results = run_batch(client, pass_calls("trial-0-pass-1", "trial-1-pass-1"))
+    assert client.behavior.counts["messages.batch_request"] == 2
+    assert results["trial-1-pass-1"]['fromCache'] is False
+
+
+def test_errored_and_expired_requests_become_error_results(monkeypatch):
+    client = FakeAnthropicClient(ScriptedBehavior([issues_json("a"), None, issues_json("c")]))
+    batches = client.messages.batches
+    create = batches.create
+
+    def create_with_expired_last(requests, betas=None):
+        batch = create(requests, betas)
+        batches._batches[batch.id]['results'][-1].result = SimpleNamespace(type="expired")
+        return batch
+
+    monkeypatch.setattr(batches, "create", create_with_expired_last)
+    results = run_batch(client, pass_calls("ok", "errored", "expired"))
+    assert results["ok"]['text'] == issues_json("a")
+    assert results["errored"] == {'error': "errored: Simulated overloaded_error"}
+    assert results["expired"] == {'error': "expired: None"}
+
+
+def test_sonnet_batch_records_a_failed_request_as_a_pass_error(tmp_path):
+    pytest.importorskip("anthropic")
+    pytest.importorskip("dotenv")
+    pytest.importorskip("pypdf")
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from benchmark_workflows import create_fake_data_dir
+    import analyze_sonnet_shared as sonnet
+
+    trial_ids = create_fake_data_dir(tmp_path, "batch-test", num_trials=2, transcript_minutes=5,
+                                     requests_per_minute=6000)
+    # Pass 1 for both trials, then the remaining passes for the first trial only
+    texts = [issues_json("trial 0 pass 1"), None] + [
+        issues_json(f"trial 0 pass {pass_num}") for pass_num in range(2, sonnet.NUM_PASSES + 1)
+    ]
+    client = FakeAnthropicClient(ScriptedBehavior(texts))
+
+    first, second = sonnet.analyze_trials_batch(trial_ids, client=client, poll_seconds=0)
+
+    assert [detail.get('error') for detail in first['passDetails']] == [None] * sonnet.NUM_PASSES
+    assert [issue['quote'] for issue in first['issues']] == [
+        f"trial 0 pass {pass_num}" for pass_num in range(1, sonnet.NUM_PASSES + 1)
+    ]
+    assert second['passDetails'] == [{'pass': 1, 'error': "errored: Simulated overloaded_error"}]
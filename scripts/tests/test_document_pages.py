@@ -0,0 +1,97 @@
+"""
+Tests for guidebook theme page lookup
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from document_pages import find_theme_pages, select_pages
+
+
+def make_index(*page_texts):
+    """Synthetic page index with one entry per page text"""
+    return {
+        'source': "guidebook.pdf",
+        'pageCount': len(page_texts),
+        'sections': {},
+        'pages': [{'page': number, 'section': "Body", 'text': text}
+                  for number, text in enumerate(page_texts, 1)],
+    }
+
+
+def test_titled_contents_page_is_skipped():
+    index = make_index(
+        "Contents\nPacing Too Fast\nMissed Student Misconception",
+        "Introduction to the guidebook",
+        "Pacing Too Fast\nThe tutor moves on before the student is ready.",
+    )
+    assert find_theme_pages(index, "Pacing Too Fast", max_pages=1) == [3]
+
+
+def test_untitled_contents_page_of_entries_is_skipped():
+    index = make_index(
+        "Warm Up ... 3\nPacing Too Fast ... 4\nClosing ... 9\nAppendix ... 12",
+        "Introduction to the guidebook",
+        "Warm Up\nGreet the student.",
+        "Watch for a tutor who is pacing too fast through the examples.",
+    )
+    assert find_theme_pages(index, "Pacing Too Fast", max_pages=1) == [4]
+
+
+def test_heading_is_preferred_over_an_earlier_mention():
+    index = make_index(
+        "Overview: themes such as pacing too fast are covered later.",
+        "Warm Up\nGreet the student.",
+        "3.2 Pacing Too Fast\nThe tutor moves on before the student is ready.",
+    )
+    assert find_theme_pages(index, "Pacing Too Fast", max_pages=1) == [3]
+
+
+def test_mention_is_the_fallback_without_a_heading():
+    index = make_index(
+        "Warm Up\nGreet the student.",
+        "Watch for a tutor who is pacing too fast through the examples.",
+    )
+    assert find_theme_pages(index, "Pacing Too Fast", max_pages=1) == [2]
+
+
+def test_slash_split_theme_names_match_either_half():
+    index = make_index(
+        "Warm Up\nGreet the student.",
+        "Praise and Encouragement\nCelebrate effort, not only answers.",
+    )
+    assert find_theme_pages(index, "Insufficient Feedback / Praise and Encouragement", max_pages=1) == [2]
+
+
+def test_parenthetical_is_ignored_when_matching():
+    index = make_index(
+        "Warm Up\nGreet the student.",
+        "Grammatical Errors\nThe tutor's own language mistakes.",
+    )
+    assert find_theme_pages(index, "Grammatical Errors (Tutor Speech)", max_pages=1) == [2]
+
+
+def test_following_pages_are_clamped_to_the_page_count():
+    index = make_index(
+        "Warm Up\nGreet the student.",
+        "Closing\nSummarize the session.",
+        "Closing checklist",
+    )
+    assert find_theme_pages(index, "Closing", max_pages=3) == [2, 3]
+    assert find_theme_pages(index, "Warm Up", max_pages=2) == [1, 2]
+
+
+def test_theme_never_named_has_no_pages():
+    index = make_index("Contents\nWarm Up", "Warm Up\nGreet the student.")
+    assert find_theme_pages(index, "Pacing Too Fast") == []
+
+
+def test_section_selection_is_case_insensitive_and_can_be_empty():
+    index = make_index("a", "b", "c")
+    index['sections'] = {"Warm Up": [1, 2], "Closing": [3]}
+    assert select_pages(index, sections=["warm"]) == [1, 2]
+    assert select_pages(index, sections=["Assessment"]) == []
@@ -0,0 +1,50 @@
+"""
+Tests for yield-based early stopping
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from early_stopping import new_tracker_for, update_early_stop
+
+
+def make_issue(minute, theme="Warm Up"):
+    return {'timestamp': f"[00:{minute:02d}:00]", 'theme': theme, 'quote': f"Quote at minute {minute}"}
+
+
+def test_stops_after_patience_passes_without_new_issues():
+    tracker = new_tracker_for({'minNewIssues': 1, 'patience': 2})
+    details = [{'pass': n} for n in range(1, 4)]
+
+    assert update_early_stop(tracker, details[0], [make_issue(1), make_issue(2)]) is None
+    assert update_early_stop(tracker, details[1], [make_issue(1)]) is None
+    assert update_early_stop(tracker, details[2], [make_issue(2)]) is not None
+    assert [detail['newDistinctIssues'] for detail in details] == [2, 0, 0]
+    assert 'stopReason' in details[2]
+
+
+def test_a_productive_pass_resets_the_streak():
+    tracker = new_tracker_for({'minNewIssues': 1, 'patience': 2})
+    update_early_stop(tracker, {}, [make_issue(1)])
+    update_early_stop(tracker, {}, [make_issue(1)])
+    assert update_early_stop(tracker, {}, [make_issue(5)]) is None
+    assert update_early_stop(tracker, {}, []) is None
+
+
+def test_yield_tracking_leaves_the_pass_issues_untouched():
+    tracker = new_tracker_for({'minNewIssues': 1, 'patience': 2})
+    first = dict(make_issue(1), analysisPass=1)
+    update_early_stop(tracker, {}, [first])
+    update_early_stop(tracker, {}, [dict(make_issue(1), analysisPass=2)])
+    assert 'duplicateSources' not in first
+
+
+def test_disabled_early_stopping_does_nothing():
+    detail = {'pass': 1}
+    assert new_tracker_for(None) is None
+    assert update_early_stop(None, detail, [make_issue(1)]) is None
+    assert detail == {'pass': 1}
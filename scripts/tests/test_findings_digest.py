@@ -0,0 +1,48 @@
+"""
+Tests for the prior-findings digest
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from findings_digest import DIGEST_HEADER, build_findings_digest, estimate_tokens
+
+
+def make_issue(minute, quote="The tutor skipped the warm up and went straight to the worksheet"):
+    return {'timestamp': f"[00:{minute:02d}:00]", 'theme': "Warm Up", 'quote': quote,
+            'justification': "Long text that never goes into the digest"}
+
+
+def test_no_issues_give_an_empty_digest():
+    assert build_findings_digest([]) == ""
+
+
+def test_lines_are_in_transcript_order_with_quote_prefixes():
+    digest = build_findings_digest([make_issue(9), make_issue(2), {'theme': "Closing", 'quote': "Bye"}])
+    assert digest.splitlines() == [
+        DIGEST_HEADER,
+        "[00:02:00]|Warm Up|The tutor skipped the warm up and went straight to the works…",
+        "[00:09:00]|Warm Up|The tutor skipped the warm up and went straight to the works…",
+        "?|Closing|Bye",
+    ]
+    assert "justification" not in digest.lower()
+
+
+def test_quotes_shorten_before_issues_are_dropped():
+    issues = [make_issue(minute) for minute in range(10)]
+    full = build_findings_digest(issues, token_budget=10_000)
+    budget = estimate_tokens(full) - 1
+    digest = build_findings_digest(issues, token_budget=budget)
+    assert estimate_tokens(digest) <= budget
+    assert len(digest.splitlines()) == len(issues) + 1
+
+
+def test_digest_stays_within_budget_as_issues_grow():
+    issues = [make_issue(minute % 60) for minute in range(500)]
+    digest = build_findings_digest(issues, token_budget=200)
+    assert estimate_tokens(digest) <= 200
+    assert digest.splitlines()[-1].startswith("(+")
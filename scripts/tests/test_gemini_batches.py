@@ -0,0 +1,114 @@
+"""
+Tests for Gemini batch jobs through the response cache
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+import call_scheduler
+import response_cache
+from fake_clients import FakeGeminiBatchTransport, ScriptedBehavior
+from gemini_batches import BatchTransport, JOB_FAILED
+from issue_stream import is_complete_issue_response
+from model_calls import gemini_generate_batch
+
+MODEL = "gemini-2.5-pro"
+
+
+def issues_json(theme):
+    return json.dumps([{'timestamp': "[00:01:00]", 'theme': theme, 'quote': "Hi"}])
+
+
+def theme_calls(*themes):
+    return [{'customId': f"theme-{theme}", 'label': f"theme-{theme}", 'contents': [f"Review {theme}"]}
+            for theme in themes]
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+    response_cache.configure(enabled=True, refresh=False)
+    call_scheduler.reset()
+
+
+def run_batch(transport, calls):
+    return gemini_generate_batch(transport, MODEL, calls, poll_seconds=0, validate=is_complete_issue_response)
+
+
+def test_transport_interface_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        BatchTransport()
+
+
+def test_results_are_matched_to_their_requests_around_cache_hits():
+    transport = FakeGeminiBatchTransport(behavior=ScriptedBehavior(
+        [issues_json("Closing"), issues_json("Pacing"), issues_json("Warm Up")]
+    ))
+    # Cache the middle call, so only the first and last are submitted
+    run_batch(transport, theme_calls("Closing"))
+
+    results = run_batch(transport, theme_calls("Pacing", "Closing", "Warm Up"))
+    assert {custom_id: result['text'] for custom_id, result in results.items()} == {
+        "theme-Pacing": issues_json("Pacing"),
+        "theme-Closing": issues_json("Closing"),
+        "theme-Warm Up": issues_json("Warm Up"),
+    }
+    assert results["theme-Closing"]['fromCache'] is True
+    assert transport.behavior.counts["batches.request"] == 3
+
+
+def test_failed_request_becomes_an_error_result():
+    transport = FakeGeminiBatchTransport(behavior=ScriptedBehavior([issues_json("Pacing"), None]))
+    results = run_batch(transport, theme_calls("Pacing", "Closing"))
+    assert results["theme-Pacing"]['text'] == issues_json("Pacing")
+    assert results["theme-Closing"] == {'error': "Simulated RESOURCE_EXHAUSTED"}
+
+
+def test_failed_job_fails_every_pending_request():
+    class FailedJobTransport(FakeGeminiBatchTransport):
+        def state(self, job_name):
+            return JOB_FAILED
+
+    transport = FailedJobTransport(behavior=ScriptedBehavior([issues_json("Pacing"), issues_json("Closing")]))
+    results = run_batch(transport, theme_calls("Pacing", "Closing"))
+    assert all('error' in result for result in results.values())
+    assert not any('text' in result for result in results.values())
+
+
+def test_by_theme_batch_maps_results_back_to_each_trial_and_theme(tmp_path):
+    pytest.importorskip("google.genai")
+    pytest.importorskip("dotenv")
+    pytest.importorskip("pypdf")
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from benchmark_workflows import create_fake_data_dir
+    import analyze_gemini_by_theme as by_theme
+
+    trial_ids = create_fake_data_dir(tmp_path, "batch-test", num_trials=2, transcript_minutes=5,
+                                     requests_per_minute=6000)
+    themes = by_theme.THEMES
+    # Responses come back in submission order: every theme of trial 1, then of trial 2
+    texts = [json.dumps([{'timestamp': "[00:01:00]", 'theme': "Any", 'quote': f"response {number}"}])
+             for number in range(2 * len(themes))]
+    failed_number = len(themes) + 9
+    texts[failed_number] = None
+    transport = FakeGeminiBatchTransport(behavior=ScriptedBehavior(texts))
+
+    analyses = by_theme.analyze_trials_batch(trial_ids, client=transport.client, transport=transport,
+                                             poll_seconds=0)
+
+    for trial_number, analysis in enumerate(analyses):
+        for idx, (theme_info, pass_detail) in enumerate(zip(themes, analysis['passDetails']), 1):
+            number = trial_number * len(themes) + idx - 1
+            assert pass_detail['theme'] == theme_info['name']
+            if number == failed_number:
+                assert pass_detail['error'] == "Simulated RESOURCE_EXHAUSTED"
+                continue
+            issues = [issue for issue in analysis['issues'] if issue['analysisPass'] == theme_info['name']]
+            assert [issue['quote'] for issue in issues] == [f"response {number}"]
@@ -0,0 +1,92 @@
+"""
+Tests for input fingerprints and skipping unchanged trials
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from input_fingerprint import find_current_analysis, input_fingerprint
+
+WORKFLOW_ID = "gemini-chunked"
+
+
+@pytest.fixture
+def paths(tmp_path):
+    trial_paths = {'analyses_dir': tmp_path / "analyses"}
+    for name in ('transcript', 'guidebook', 'playbook'):
+        trial_paths[name] = tmp_path / f"{name}.pdf"
+        trial_paths[name].write_bytes(name.encode('utf-8'))
+    trial_paths['analyses_dir'].mkdir()
+    return trial_paths
+
+
+@pytest.fixture
+def prompt_path(tmp_path):
+    path = tmp_path / "prompt.txt"
+    path.write_text("Find the issues.")
+    return path
+
+
+def new_run():
+    return {'trialId': "trial-1", 'workflowId': WORKFLOW_ID, 'configuration': {'chunkDurationMinutes': 10}}
+
+
+def write_analysis(paths, prompt_path, **fields):
+    run = new_run()
+    fingerprint = input_fingerprint(paths, prompt_path, "gemini-2.5-pro", WORKFLOW_ID, run['configuration'])
+    analysis = {'status': "completed", 'inputFingerprint': fingerprint, **fields}
+    with open(paths['analyses_dir'] / f"{WORKFLOW_ID}-20260101-120000.json", 'w') as f:
+        json.dump(analysis, f)
+
+
+def test_unchanged_inputs_skip_the_trial(paths, prompt_path):
+    write_analysis(paths, prompt_path, passDetails=[{'pass': 1, 'issuesFound': 2}])
+    current = find_current_analysis(new_run(), paths, prompt_path, "gemini-2.5-pro")
+    assert current['skipped'] is True
+
+
+def test_changed_prompt_reruns_the_trial(paths, prompt_path):
+    write_analysis(paths, prompt_path, passDetails=[{'pass': 1, 'issuesFound': 2}])
+    prompt_path.write_text("Find every issue.")
+    assert find_current_analysis(new_run(), paths, prompt_path, "gemini-2.5-pro") is None
+
+
+def test_partially_failed_chunked_analysis_is_redone(paths, prompt_path):
+    write_analysis(paths, prompt_path, chunkDetails=[
+        {'chunk': 1, 'chunkRange': "00:00 - 10:00", 'issuesFound': 3},
+        {'chunk': 2, 'chunkRange': "10:00 - 20:00", 'error': "503 UNAVAILABLE"},
+    ])
+    assert find_current_analysis(new_run(), paths, prompt_path, "gemini-2.5-pro") is None
+
+
+def test_force_always_reruns(paths, prompt_path):
+    write_analysis(paths, prompt_path, passDetails=[{'pass': 1, 'issuesFound': 2}])
+    run = new_run()
+    assert find_current_analysis(run, paths, prompt_path, "gemini-2.5-pro", force=True) is None
+    assert 'inputFingerprint' in run
+
+
+def test_sonnet_playbook_budget_only_counts_with_sections(tmp_path, monkeypatch):
+    pytest.importorskip("anthropic")
+    pytest.importorskip("dotenv")
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from benchmark_workflows import create_fake_data_dir
+    import analyze_sonnet_shared as sonnet
+
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+    trial_id, = create_fake_data_dir(tmp_path, "fingerprint-test", num_trials=1, transcript_minutes=1,
+                                     requests_per_minute=6000)
+
+    def fingerprint_key(playbook_budget, playbook_sections=None):
+        run, _, _ = sonnet.start_trial(trial_id, playbook_budget, playbook_sections)
+        return run['inputFingerprint']['key']
+
+    assert fingerprint_key(10_000) == fingerprint_key(20_000)
+    assert fingerprint_key(10_000, ["Warm Up"]) != fingerprint_key(20_000, ["Warm Up"])
@@ -0,0 +1,74 @@
+"""
+Tests for the local issue dedupe engine
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from issue_dedupe import dedupe_issues, is_duplicate_issue, merge_boundary_duplicates
+
+# Chunks of 10 minutes with a 60 second overlap: chunk 1's overlap is [600, 660)
+WINDOWS = [{'startTime': 0, 'endTime': 600}, {'startTime': 600, 'endTime': 1200}]
+OVERLAP_SECONDS = 60
+TOLERANCE_SECONDS = 5
+
+
+def make_issue(timestamp, quote="Let's skip the warm up today", theme="Warm Up", **fields):
+    return {'timestamp': timestamp, 'theme': theme, 'quote': quote, **fields}
+
+
+def test_same_moment_same_theme_is_duplicate():
+    assert is_duplicate_issue(make_issue("[00:10:02]"), make_issue("[00:10:07]", quote="skip the warm up"),
+                              window_seconds=TOLERANCE_SECONDS)
+
+
+def test_different_theme_is_not_duplicate():
+    assert not is_duplicate_issue(make_issue("[00:10:02]"), make_issue("[00:10:02]", theme="Closing"))
+
+
+def test_timestamps_at_the_5s_tolerance_match_and_beyond_do_not():
+    kept = make_issue("[00:10:02]")
+    assert is_duplicate_issue(kept, make_issue("[00:10:07]"), window_seconds=TOLERANCE_SECONDS)
+    assert not is_duplicate_issue(kept, make_issue("[00:10:08]"), window_seconds=TOLERANCE_SECONDS)
+
+
+def test_dedupe_against_existing_issues_records_sources():
+    existing = [make_issue("[00:03:00]", analysisPass=1)]
+    unique, duplicates = dedupe_issues(
+        [make_issue("[00:03:04]", analysisPass=2), make_issue("[00:20:00]", analysisPass=2)],
+        existing=existing
+    )
+    assert duplicates == 1
+    assert [issue['timestamp'] for issue in unique] == ["[00:20:00]"]
+    assert existing[0]['duplicateSources'] == [2]
+
+
+def test_boundary_duplicates_from_adjacent_chunks_are_merged():
+    issues = [make_issue("[00:10:02]", chunkNumber=1), make_issue("[00:10:07]", chunkNumber=2)]
+    merged, duplicates = merge_boundary_duplicates(issues, WINDOWS, OVERLAP_SECONDS, TOLERANCE_SECONDS)
+    assert duplicates == 1
+    assert merged == [issues[0]]
+    assert issues[0]['alsoFoundInChunks'] == [2]
+
+
+def test_boundary_issues_past_the_tolerance_are_kept():
+    issues = [make_issue("[00:10:02]", chunkNumber=1), make_issue("[00:10:08]", chunkNumber=2)]
+    merged, duplicates = merge_boundary_duplicates(issues, WINDOWS, OVERLAP_SECONDS, TOLERANCE_SECONDS)
+    assert duplicates == 0
+    assert len(merged) == 2
+
+
+def test_same_chunk_and_outside_overlap_are_left_alone():
+    issues = [
+        make_issue("[00:10:02]", chunkNumber=1),
+        make_issue("[00:10:03]", chunkNumber=1),
+        make_issue("[00:05:00]", chunkNumber=1),
+        make_issue("[00:05:01]", chunkNumber=2),
+    ]
+    merged, duplicates = merge_boundary_duplicates(issues, WINDOWS, OVERLAP_SECONDS, TOLERANCE_SECONDS)
+    assert duplicates == 0
+    assert merged == issues
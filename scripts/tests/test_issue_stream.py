@@ -0,0 +1,80 @@
+"""
+Tests for incremental issue extraction from streamed responses
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from issue_stream import IssueArrayParser, IssueSidecar, IssueStream, parse_issues_salvaging
+
+ISSUES = [
+    {'timestamp': "[00:01:02]", 'theme': "Warm Up", 'quote': "Say \"hi\" [wave] {smile}"},
+    {'timestamp': "[00:04:10]", 'theme': "Closing", 'quote': "See you", 'tags': ["a", {"b": 1}]},
+]
+RESPONSE = "Here are the issues [see below]:\n```json\n" + json.dumps(ISSUES, indent=2) + "\n```"
+
+
+def feed_in_pieces(parser, text, size):
+    closed = []
+    for start in range(0, len(text), size):
+        closed.extend(parser.feed(text[start:start + size]))
+    return closed
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, len(RESPONSE)])
+def test_issues_close_however_the_text_is_split(size):
+    parser = IssueArrayParser()
+    assert feed_in_pieces(parser, RESPONSE, size) == ISSUES
+    assert parser.issues == ISSUES
+
+
+def test_issue_is_returned_as_soon_as_it_closes():
+    parser = IssueArrayParser()
+    first_issue = json.dumps(ISSUES[0])
+    assert parser.feed("[" + first_issue[:-1]) == []
+    assert parser.feed("}, {\"theme\": ") == [ISSUES[0]]
+    assert parser.feed("\"Closing\"") == []
+
+
+def test_bracket_at_end_of_a_piece_waits_for_the_next():
+    parser = IssueArrayParser()
+    assert parser.feed("Findings [") == []
+    assert parser.feed(json.dumps(ISSUES[0]) + "]") == [ISSUES[0]]
+
+
+def test_text_after_the_array_is_ignored():
+    parser = IssueArrayParser()
+    assert parser.feed("[]\n[{\"theme\": \"Other\"}]") == []
+
+
+def test_truncated_response_keeps_the_closed_issues():
+    cut_off = json.dumps(ISSUES)[:-20]
+    issues, truncation_error = parse_issues_salvaging(cut_off)
+    assert issues == ISSUES[:1]
+    assert truncation_error
+
+
+def test_nothing_to_salvage_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse_issues_salvaging("[{\"theme\": \"Warm")
+
+
+def test_stream_writes_each_issue_once_across_retries(tmp_path):
+    sidecar = IssueSidecar(tmp_path / "run.live.ndjson")
+    stream = IssueStream(sidecar, {'analysisPass': 2})
+    text = json.dumps(ISSUES)
+
+    stream(text[:len(text) // 2 + 10])
+    # A retry restarts the response from scratch
+    stream(None)
+    stream(text)
+
+    lines = sidecar.path.read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [dict(issue, analysisPass=2) for issue in ISSUES]
@@ -0,0 +1,60 @@
+"""
+Tests for the model call wrappers and the response cache
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+import call_scheduler
+import response_cache
+from fake_clients import FakeGeminiClient, FakeAnthropicClient, ScriptedBehavior
+from issue_stream import is_complete_issue_response
+from model_calls import gemini_generate, claude_message
+
+ISSUES_JSON = json.dumps([{'timestamp': "[00:01:00]", 'theme': "Warm Up", 'quote': "Hi"}])
+CLAUDE_MODEL = "claude-sonnet-4-5"
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+    response_cache.configure(enabled=True, refresh=False)
+    call_scheduler.reset()
+
+
+def generate(client):
+    return gemini_generate(client, "gemini-2.5-pro", contents=["Find the issues."],
+                           validate=is_complete_issue_response)
+
+
+@pytest.mark.parametrize("bad_text", ["", "   ", ISSUES_JSON[:-10], "Sorry, I can't help with that."])
+def test_incomplete_responses_are_asked_for_again(bad_text):
+    client = FakeGeminiClient(ScriptedBehavior([bad_text, ISSUES_JSON]))
+    assert generate(client)['text'] == bad_text
+    retried = generate(client)
+    assert retried['text'] == ISSUES_JSON
+    assert retried['fromCache'] is False
+
+
+def test_parsed_responses_are_replayed():
+    client = FakeGeminiClient(ScriptedBehavior([ISSUES_JSON]))
+    generate(client)
+    replayed = generate(client)
+    assert replayed['fromCache'] is True
+    assert replayed['text'] == ISSUES_JSON
+    assert client.behavior.counts["models.generate_content_stream"] == 1
+
+
+def test_claude_responses_follow_the_same_rule():
+    client = FakeAnthropicClient(ScriptedBehavior(["[{\"theme\": ", ISSUES_JSON]))
+    params = {'model': CLAUDE_MODEL, 'max_tokens': 100, 'messages': [{'role': "user", 'content': "Find the issues."}]}
+    claude_message(client, validate=is_complete_issue_response, **params)
+    assert claude_message(client, validate=is_complete_issue_response, **params)['fromCache'] is False
+    assert claude_message(client, validate=is_complete_issue_response, **params)['fromCache'] is True
@@ -0,0 +1,121 @@
+"""
+Tests for per-pass checkpoints and --resume
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+import call_scheduler
+import response_cache
+from fake_clients import FakeGeminiClient, ScriptedBehavior
+from issue_stream import is_complete_issue_response, parse_issues_salvaging
+from model_calls import gemini_generate
+from pass_journal import close_journal, completed_pass, open_journal, record_pass
+
+ISSUES = [{'timestamp': "[00:01:02]", 'theme': "Warm Up", 'quote': "Let's begin"}]
+
+
+@pytest.fixture(autouse=True)
+def trial_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+    (tmp_path / "trials" / "trial-1").mkdir(parents=True)
+    response_cache.configure(enabled=True, refresh=False)
+    call_scheduler.reset()
+
+
+def run_passes(client, journal, passes=3):
+    """Run passes the way the fresh workflow does; returns their pass details"""
+    pass_details = []
+    for pass_num in range(1, passes + 1):
+        resumed = completed_pass(journal, pass_num)
+        if resumed:
+            pass_details.append(resumed[1])
+            continue
+        response = gemini_generate(client, "gemini-2.5-pro", contents=["Find the issues."],
+                                   cache_salt=pass_num, validate=is_complete_issue_response)
+        try:
+            parsed_issues, _ = parse_issues_salvaging(response['text'])
+            pass_detail = {'pass': pass_num, 'fromCache': response['fromCache']}
+        except json.JSONDecodeError as e:
+            parsed_issues, pass_detail = [], {'pass': pass_num, 'error': str(e)}
+        record_pass(journal, pass_num, parsed_issues, pass_detail)
+        pass_details.append(pass_detail)
+    close_journal(journal, pass_details)
+    return pass_details
+
+
+def new_run(passes=3, fingerprint_key="inputs-a"):
+    return {
+        'trialId': "trial-1",
+        'workflowId': "gemini-fresh",
+        'configuration': {'passes': passes},
+        'inputFingerprint': {'key': fingerprint_key},
+    }
+
+
+def test_resume_after_a_failed_pass_redoes_only_that_pass():
+    journal = open_journal(new_run())
+    record_pass(journal, 1, ISSUES, {'pass': 1, 'issuesFound': 1})
+    record_pass(journal, 2, [], {'pass': 2, 'error': "503 UNAVAILABLE"})
+    close_journal(journal, [{'pass': 1}, {'pass': 2, 'error': "503 UNAVAILABLE"}])
+    assert journal['path'].exists()
+
+    resumed = open_journal(new_run(), resume=True)
+    issues, pass_detail = completed_pass(resumed, 1)
+    assert issues == ISSUES
+    assert pass_detail == {'pass': 1, 'issuesFound': 1, 'resumed': True}
+    assert completed_pass(resumed, 2) is None
+    assert completed_pass(resumed, 3) is None
+
+
+def test_resume_after_a_parse_failure_asks_the_model_again():
+    issues_json = json.dumps(ISSUES)
+    client = FakeGeminiClient(ScriptedBehavior([issues_json, "I could not find", issues_json, issues_json]))
+
+    first = run_passes(client, open_journal(new_run()))
+    assert ['error' in detail for detail in first] == [False, True, False]
+
+    resumed = run_passes(client, open_journal(new_run(), resume=True))
+    assert [detail.get('resumed', False) for detail in resumed] == [True, False, True]
+    assert resumed[1] == {'pass': 2, 'fromCache': False}
+    assert client.behavior.counts["models.generate_content_stream"] == 4
+
+
+def test_partial_last_line_is_dropped_on_resume():
+    journal = open_journal(new_run())
+    record_pass(journal, 1, ISSUES, {'pass': 1})
+    with open(journal['path'], 'a') as f:
+        f.write('{"pass": 2, "issues": [')
+
+    resumed = open_journal(new_run(), resume=True)
+    assert completed_pass(resumed, 2) is None
+    record_pass(resumed, 2, [], {'pass': 2})
+    assert completed_pass(open_journal(new_run(), resume=True), 2) == ([], {'pass': 2, 'resumed': True})
+
+
+def test_other_configuration_or_inputs_do_not_resume():
+    journal = open_journal(new_run())
+    record_pass(journal, 1, ISSUES, {'pass': 1})
+    assert completed_pass(open_journal(new_run(passes=5), resume=True), 1) is None
+    assert completed_pass(open_journal(new_run(fingerprint_key="inputs-b"), resume=True), 1) is None
+
+
+def test_run_without_resume_discards_the_old_journal():
+    journal = open_journal(new_run())
+    record_pass(journal, 1, ISSUES, {'pass': 1})
+    open_journal(new_run())
+    assert completed_pass(open_journal(new_run(), resume=True), 1) is None
+
+
+def test_successful_run_removes_the_journal():
+    journal = open_journal(new_run())
+    record_pass(journal, 1, ISSUES, {'pass': 1})
+    close_journal(journal, [{'pass': 1}])
+    assert not journal['path'].exists()
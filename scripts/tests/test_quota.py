@@ -0,0 +1,41 @@
+"""
+Tests for the cross-process token bucket
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from quota import SharedTokenBucket
+
+
+@pytest.fixture(autouse=True)
+def isolated_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_DATA_DIR", str(tmp_path))
+
+
+def test_resource_prefixed_model_uses_the_same_bucket():
+    prefixed = SharedTokenBucket("models/gemini-2.5-pro", rate=1, capacity=1)
+    bare = SharedTokenBucket("gemini-2.5-pro", rate=1, capacity=1)
+    assert prefixed.state_path == bare.state_path
+    assert prefixed.state_path.name == "gemini-2.5-pro.json"
+
+
+def test_buckets_share_state_through_the_file():
+    first = SharedTokenBucket("gemini-2.5-pro", rate=20, capacity=2)
+    second = SharedTokenBucket("gemini-2.5-pro", rate=20, capacity=2)
+    assert first.acquire() == 0
+    assert second.acquire() == 0
+    # Both tokens are spent, so the next caller has to wait for a refill
+    assert first.acquire() > 0
+
+
+def test_drain_empties_the_bucket():
+    bucket = SharedTokenBucket("claude-sonnet-4-5", rate=20, capacity=4)
+    bucket.drain()
+    assert bucket.acquire() > 0
@@ -0,0 +1,63 @@
+"""
+Tests for transcript segment parsing
+
+Run from scripts/:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
+from transcript import parse_transcript_segments
+
+
+def test_one_segment_per_line():
+    segments = parse_transcript_segments(
+        "[00:01:18] Parent: Is she ready?\n"
+        "[00:01:22] Tutor: Yes, let's start.\n"
+    )
+    assert [(s['startTime'], s['endTime'], s['speaker'], s['text']) for s in segments] == [
+        (78, 82, "Parent", "Is she ready?"),
+        (82, 82, "Tutor", "Yes, let's start."),
+    ]
+
+
+def test_several_markers_on_one_line():
+    segments = parse_transcript_segments(
+        "[00:01:18] Parent: Is she ready? [00:01:22] Tutor: Yes, let's start. [00:01:25] Student: Okay."
+    )
+    assert [(s['startTime'], s['speaker'], s['text']) for s in segments] == [
+        (78, "Parent", "Is she ready?"),
+        (82, "Tutor", "Yes, let's start."),
+        (85, "Student", "Okay."),
+    ]
+    assert [s['endTime'] for s in segments] == [82, 85, 85]
+
+
+def test_wrapped_text_continues_previous_segment():
+    segments = parse_transcript_segments(
+        "[00:00:05] Tutor: Today we will look at\n"
+        "fractions and decimals. [00:00:09] Student: Okay.\n"
+    )
+    assert [(s['speaker'], s['text']) for s in segments] == [
+        ("Tutor", "Today we will look at fractions and decimals."),
+        ("Student", "Okay."),
+    ]
+
+
+def test_explicit_end_times():
+    segments = parse_transcript_segments(
+        "[00:00:01,500 --> 00:00:03,000] Tutor: Hi! [00:00:03] --> [00:00:04] Student: Hello."
+    )
+    assert [(s['startTime'], s['endTime'], s['speaker']) for s in segments] == [
+        (1.5, 3, "Tutor"),
+        (3, 4, "Student"),
+    ]
+
+
+def test_unrecognized_speakers_fall_back_to_unknown():
+    segments = parse_transcript_segments(
+        "[00:00:01] Mom: Hello! [00:00:02] Grandpa: Hi there. [00:00:03] no label here\n"
+    )
+    assert [s['speaker'] for s in segments] == ["Parent", "Unknown", "Unknown"]
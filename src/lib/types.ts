@@ -17,7 +17,7 @@ export interface Trial {
 export interface TranscriptSegment {
   startTime: number;
   endTime: number;
-  speaker: 'Student' | 'Tutor' | 'Parent';
+  speaker: 'Student' | 'Tutor' | 'Parent' | 'Unknown'; // 'Unknown' when the transcript has no recognizable label
   text: string;
 }
 